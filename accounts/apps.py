@@ -4,4 +4,7 @@ from django.apps import AppConfig
 class AccountsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'accounts'
-    verbose_name = 'アカウント管理'
\ No newline at end of file
+    verbose_name = 'アカウント管理'
+
+    def ready(self):
+        from . import downloads, signals  # noqa: F401
@@ -0,0 +1,304 @@
+import datetime
+import io
+import json
+import time
+import zipfile
+from django.contrib.auth import get_user_model
+from django.core.files import File
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, transaction
+from django.utils import timezone
+from core import images
+from core.cache import bump_version
+from core.storage import blob_storage, retain
+from customers import counters, search
+from customers.models import Customer, Document
+from expenses import rollups
+from expenses.models import ExpenseCategory, PaymentMethod, Expense, RecurringExpense
+from schedules.models import Schedule
+from tasks.models import Task
+from . import usage
+
+
+FORMAT_VERSION = 1
+MANIFEST = 'manifest.json'
+# ZIPの出力を取り出す単位・ファイルを読む単位
+BLOCK_SIZE = 64 * 1024
+BATCH_SIZE = 500
+
+# (ファイル名, モデル, 所有ユーザーへのパス)。外部キーの参照先が先になる順に並べる
+SECTIONS = [
+    ('expense_categories', ExpenseCategory, 'created_by'),
+    ('payment_methods', PaymentMethod, 'created_by'),
+    ('customers', Customer, 'created_by'),
+    ('documents', Document, 'customer__created_by'),
+    ('tasks', Task, 'owner'),
+    ('schedules', Schedule, 'owner'),
+    ('recurring_expenses', RecurringExpense, 'created_by'),
+    ('expenses', Expense, 'created_by'),
+]
+# 復元先に同名の行があれば新しく作らずに使う
+MATCH_BY_NAME = (ExpenseCategory, PaymentMethod)
+# 復元後に作り直す値
+DERIVED_FIELDS = {'document_count'}
+CACHE_SCOPES = ('customers', 'tasks', 'schedules', 'expenses')
+
+
+class RestoreError(Exception):
+    """バックアップを復元できない場合のエラー"""
+
+
+class _Encoder(DjangoJSONEncoder):
+    """日時はマイクロ秒まで残す（DjangoJSONEncoder はミリ秒に丸める）"""
+
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def exported_fields(model):
+    """書き出す列（所有ユーザーと再計算する値を除く）"""
+    user_model = get_user_model()
+    return [
+        field for field in model._meta.concrete_fields
+        if field.name not in DERIVED_FIELDS and not (field.is_relation and field.related_model is user_model)
+    ]
+
+
+def timestamp_fields(fields):
+    return [field.attname for field in fields if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)]
+
+
+def file_fields(model):
+    return [field for field in model._meta.concrete_fields if isinstance(field, models.FileField)]
+
+
+class _Output:
+    """ZipFile の書き込み先。書かれたバイト列を溜め、ジェネレーターから少しずつ取り出す
+
+    seek できないので、ZipFile は各ファイルの後ろにサイズを書く形式で出力する
+    """
+
+    def __init__(self):
+        self.chunks = []
+        self.size = 0
+        self.position = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.size += len(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        self.size = 0
+        return data
+
+
+def export_account(user):
+    """ユーザーのデータをZIP（モデルごとのJSON Lines + ファイル）として少しずつ返すジェネレーター"""
+    output = _Output()
+    counts = {}
+    media = set()
+    missing = []
+
+    with zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for name, model, owner in SECTIONS:
+            fields = exported_fields(model)
+            names = [field.attname for field in fields]
+            paths = [field.attname for field in file_fields(model)]
+            rows = model._default_manager.filter(**{owner: user}).values(*names).order_by('pk')
+            counts[name] = 0
+            with archive.open(f'data/{name}.jsonl', 'w', force_zip64=True) as member:
+                for row in rows.iterator(chunk_size=1000):
+                    member.write(json.dumps(row, cls=_Encoder, ensure_ascii=False).encode() + b'\n')
+                    media.update(row[path] for path in paths if row[path])
+                    counts[name] += 1
+                    if output.size >= BLOCK_SIZE:
+                        yield output.take()
+            yield output.take()
+
+        for name in sorted(media):
+            try:
+                info = zipfile.ZipInfo(f'media/{name}', date_time=time.localtime()[:6])
+                info.compress_type = zipfile.ZIP_STORED
+                info.file_size = blob_storage.size(name)
+                source = blob_storage.open(name, 'rb')
+            except OSError:
+                missing.append(name)
+                continue
+            with source, archive.open(info, 'w') as member:
+                for data in iter(lambda: source.read(BLOCK_SIZE), b''):
+                    member.write(data)
+                    yield output.take()
+
+        archive.writestr(MANIFEST, json.dumps({
+            'format': FORMAT_VERSION,
+            'username': user.username,
+            'exported_at': timezone.now().isoformat(),
+            'counts': counts,
+            'missing_media': missing,
+        }, ensure_ascii=False, indent=2))
+    yield output.take()
+
+
+class AccountRestorer:
+    """export_account() のZIPをユーザーのデータとして追加する
+
+    モデルごとに bulk_create し、書き出し時のIDから新しいIDへの対応で外部キーを付け替える。
+    bulk_create はシグナルを送らないので、検索インデックス・集計・利用量は最後に作り直す
+    """
+
+    def __init__(self, user, archive):
+        self.user = user
+        self.archive = archive
+        self.ids = {model: {} for _, model, _ in SECTIONS}
+        self.media = {}
+        self.created = {}
+        self.missing_media = 0
+        # bulk_create ではアップロード時の派生画像作成が動かないので、復元後にまとめて作る
+        self.images = []
+
+    def read_manifest(self):
+        try:
+            manifest = json.loads(self.archive.read(MANIFEST))
+        except (KeyError, ValueError):
+            raise RestoreError('manifest.json が見つかりません')
+        if manifest.get('format') != FORMAT_VERSION:
+            raise RestoreError(f"対応していない形式です: {manifest.get('format')}")
+        return manifest
+
+    def iter_rows(self, name):
+        try:
+            member = self.archive.open(f'data/{name}.jsonl')
+        except KeyError:
+            return
+        with member, io.TextIOWrapper(member, encoding='utf-8') as lines:
+            for line in lines:
+                if line.strip():
+                    yield json.loads(line)
+
+    def store_media(self, name):
+        """ファイルを保存し直して新しいパスを返す（同じファイルは2回目から参照数だけ増やす）"""
+        if name in self.media:
+            stored = self.media[name]
+            retain(stored)
+            return stored
+        try:
+            member = self.archive.open(f'media/{name}')
+        except KeyError:
+            self.missing_media += 1
+            return ''
+        with member:
+            stored = blob_storage.save(name, File(member, name=name))
+        self.media[name] = stored
+        return stored
+
+    def build(self, model, row, fields):
+        values = {}
+        for field in fields:
+            value = row.get(field.attname)
+            if field.primary_key:
+                continue
+            if field.is_relation:
+                if value is not None:
+                    value = self.ids[field.related_model].get(value)
+                    if value is None and not field.null:
+                        raise RestoreError(f'{model._meta.label} {row.get("id")} の参照先がありません')
+            elif isinstance(field, models.FileField):
+                value = self.store_media(value) if value else ''
+            else:
+                value = field.to_python(value)
+            values[field.attname] = value
+        # 所有ユーザーは復元先のユーザーにする
+        for field in model._meta.concrete_fields:
+            if field.is_relation and field.related_model is get_user_model():
+                values[field.attname] = self.user.pk
+        instance = model(**values)
+        for image_model, field_names, condition in images.registered:
+            if image_model is model and (condition is None or condition(instance)):
+                self.images.extend(
+                    getattr(instance, name) for name in field_names if images.is_image_name(values.get(name))
+                )
+        return instance
+
+    def generate_derivatives(self):
+        for field_file in self.images:
+            missing = images.missing_derivatives(field_file)
+            if missing:
+                images.generate_derivatives(field_file, missing)
+
+    def existing_by_name(self, model):
+        if model not in MATCH_BY_NAME:
+            return {}
+        return dict(model._default_manager.filter(created_by=self.user).values_list('name', 'pk'))
+
+    def restore_section(self, name, model):
+        fields = exported_fields(model)
+        timestamps = timestamp_fields(fields)
+        existing = self.existing_by_name(model)
+        ids = self.ids[model]
+        batch, old_ids, stamps = [], [], []
+        self.created[name] = 0
+
+        def flush():
+            created = model._default_manager.bulk_create(batch)
+            # auto_now_add / auto_now の列は bulk_create で現在時刻になるので、書き出し時の値に戻す
+            if timestamps:
+                for instance, values in zip(created, stamps):
+                    for attname, value in values.items():
+                        setattr(instance, attname, value)
+                model._default_manager.bulk_update(created, timestamps)
+            for old_id, instance in zip(old_ids, created):
+                ids[old_id] = instance.pk
+            self.created[name] += len(created)
+            batch.clear()
+            old_ids.clear()
+            stamps.clear()
+
+        for row in self.iter_rows(name):
+            if row.get('name') in existing:
+                ids[row['id']] = existing[row['name']]
+                continue
+            instance = self.build(model, row, fields)
+            batch.append(instance)
+            old_ids.append(row['id'])
+            stamps.append({attname: getattr(instance, attname) for attname in timestamps})
+            if len(batch) >= BATCH_SIZE:
+                flush()
+        if batch:
+            flush()
+
+    def run(self):
+        self.read_manifest()
+        user_ids = [self.user.pk]
+        with transaction.atomic():
+            for name, model, _ in SECTIONS:
+                self.restore_section(name, model)
+            search.rebuild_index(user_ids=user_ids)
+            rollups.rebuild_rollups(user_ids=user_ids)
+            counters.rebuild_document_counts(user_ids=user_ids)
+            usage.reconcile(user_ids=user_ids)
+            for scope in CACHE_SCOPES:
+                bump_version(scope, self.user.pk)
+        self.generate_derivatives()
+        return {'created': self.created, 'missing_media': self.missing_media}
+
+
+def restore_account(user, file):
+    """アップロードされたZIP（またはファイルパス）を復元し、作成件数を返す"""
+    try:
+        archive = zipfile.ZipFile(file)
+    except zipfile.BadZipFile:
+        raise RestoreError('ZIPファイルではありません')
+    with archive:
+        return AccountRestorer(user, archive).run()
@@ -0,0 +1,12 @@
+from core import downloads
+from .models import User
+
+
+def resolve_avatar(owner_id, pk):
+    user = User.objects.filter(pk=pk).only('avatar').first()
+    if user is None or user.pk != owner_id:
+        return None
+    return {'file': user.avatar}
+
+
+downloads.register('avatar', resolve_avatar)
@@ -0,0 +1,24 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from accounts.backup import export_account
+
+
+class Command(BaseCommand):
+    help = 'ユーザーのデータ（ファイルを含む）をZIPに書き出します'
+
+    def add_arguments(self, parser):
+        parser.add_argument('username', help='対象ユーザー名')
+        parser.add_argument('output', help='書き出すZIPファイルのパス')
+
+    def handle(self, *args, **options):
+        try:
+            user = get_user_model().objects.get(username=options['username'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"ユーザーが見つかりません: {options['username']}")
+
+        size = 0
+        with open(options['output'], 'wb') as output:
+            for data in export_account(user):
+                output.write(data)
+                size += len(data)
+        self.stdout.write(self.style.SUCCESS(f"{options['output']} に書き出しました（{size / 1024 ** 2:.1f}MB）"))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from accounts.usage import reconcile
+from customers.counters import rebuild_document_counts
+
+
+class Command(BaseCommand):
+    help = '保存容量・件数（StorageUsage）と顧客ごとの書類数を実際のデータから作り直します'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            type=int,
+            action='append',
+            dest='user_ids',
+            help='対象ユーザーID（複数指定可、省略時は全ユーザー）'
+        )
+
+    def handle(self, *args, **options):
+        users = reconcile(user_ids=options['user_ids'])
+        customers = rebuild_document_counts(user_ids=options['user_ids'])
+        self.stdout.write(self.style.SUCCESS(f'{users}人の利用量と{customers}件の顧客の書類数を更新しました'))
@@ -0,0 +1,25 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from accounts.backup import RestoreError, restore_account
+
+
+class Command(BaseCommand):
+    help = 'export_account で書き出したZIPをユーザーのデータとして復元します'
+
+    def add_arguments(self, parser):
+        parser.add_argument('username', help='復元先のユーザー名')
+        parser.add_argument('archive', help='ZIPファイルのパス')
+
+    def handle(self, *args, **options):
+        try:
+            user = get_user_model().objects.get(username=options['username'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"ユーザーが見つかりません: {options['username']}")
+
+        try:
+            result = restore_account(user, options['archive'])
+        except RestoreError as e:
+            raise CommandError(str(e))
+
+        created = ', '.join(f'{name}: {count}' for name, count in result['created'].items())
+        self.stdout.write(self.style.SUCCESS(f'復元しました（{created}、ファイルなし: {result["missing_media"]}件）'))
@@ -0,0 +1,66 @@
+# Generated by Django 5.2.3 on 2026-10-17 13:12
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def create_usage(apps, schema_editor):
+    """件数と書類の容量を集計して作成（画像の容量は reconcile_storage_usage で計算する）"""
+    User = apps.get_model('accounts', 'User')
+    StorageUsage = apps.get_model('accounts', 'StorageUsage')
+    Customer = apps.get_model('customers', 'Customer')
+    Document = apps.get_model('customers', 'Document')
+    Expense = apps.get_model('expenses', 'Expense')
+    Task = apps.get_model('tasks', 'Task')
+
+    usage = {pk: {} for pk in User.objects.values_list('pk', flat=True)}
+    for model, owner, field in (
+        (Customer, 'created_by_id', 'customer_count'),
+        (Document, 'customer__created_by_id', 'document_count'),
+        (Expense, 'created_by_id', 'expense_count'),
+        (Task, 'owner_id', 'task_count'),
+    ):
+        for row in model.objects.values(owner).annotate(count=Count('pk')).order_by():
+            usage[row[owner]][field] = row['count']
+    for row in Document.objects.values('customer__created_by_id').annotate(total=Sum('size')).order_by():
+        usage[row['customer__created_by_id']]['document_bytes'] = row['total'] or 0
+
+    StorageUsage.objects.bulk_create(
+        [StorageUsage(user_id=pk, **values) for pk, values in usage.items()],
+        batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+        ('customers', '0008_customer_document_count'),
+        ('expenses', '0005_receipt_blob_storage'),
+        ('tasks', '0003_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StorageUsage',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='storage_usage', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='ユーザー')),
+                ('document_bytes', models.BigIntegerField(default=0, verbose_name='書類（バイト）')),
+                ('receipt_bytes', models.BigIntegerField(default=0, verbose_name='レシート画像（バイト）')),
+                ('business_card_bytes', models.BigIntegerField(default=0, verbose_name='名刺画像（バイト）')),
+                ('avatar_bytes', models.BigIntegerField(default=0, verbose_name='プロフィール画像（バイト）')),
+                ('document_count', models.IntegerField(default=0, verbose_name='書類数')),
+                ('customer_count', models.IntegerField(default=0, verbose_name='顧客数')),
+                ('expense_count', models.IntegerField(default=0, verbose_name='支出数')),
+                ('task_count', models.IntegerField(default=0, verbose_name='タスク数')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新日')),
+            ],
+            options={
+                'verbose_name': '保存容量',
+                'verbose_name_plural': '保存容量',
+            },
+        ),
+        migrations.RunPython(create_usage, migrations.RunPython.noop),
+    ]
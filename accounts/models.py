@@ -1,4 +1,5 @@
 from django.contrib.auth.models import AbstractUser
+from django.conf import settings
 from django.db import models
 
 
@@ -19,4 +20,34 @@ class User(AbstractUser):
         verbose_name_plural = 'ユーザー'
 
     def __str__(self):
-        return self.get_full_name() or self.username
\ No newline at end of file
+        return self.get_full_name() or self.username
+
+class StorageUsage(models.Model):
+    """ユーザーごとの保存容量と件数（保存・削除のたびに差分で更新）"""
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='storage_usage',
+        verbose_name='ユーザー'
+    )
+    document_bytes = models.BigIntegerField('書類（バイト）', default=0)
+    receipt_bytes = models.BigIntegerField('レシート画像（バイト）', default=0)
+    business_card_bytes = models.BigIntegerField('名刺画像（バイト）', default=0)
+    avatar_bytes = models.BigIntegerField('プロフィール画像（バイト）', default=0)
+    document_count = models.IntegerField('書類数', default=0)
+    customer_count = models.IntegerField('顧客数', default=0)
+    expense_count = models.IntegerField('支出数', default=0)
+    task_count = models.IntegerField('タスク数', default=0)
+    updated_at = models.DateTimeField('更新日', auto_now=True)
+
+    class Meta:
+        verbose_name = '保存容量'
+        verbose_name_plural = '保存容量'
+
+    def __str__(self):
+        return f'{self.user_id}: {self.total_bytes}'
+
+    @property
+    def total_bytes(self):
+        return self.document_bytes + self.receipt_bytes + self.business_card_bytes + self.avatar_bytes
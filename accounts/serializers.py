@@ -1,6 +1,9 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model, authenticate
 from django.contrib.auth.password_validation import validate_password
+from core import downloads
+from .models import StorageUsage
+from .usage import QUOTA_BYTES
 
 User = get_user_model()
 
@@ -8,18 +11,44 @@ User = get_user_model()
 class UserSerializer(serializers.ModelSerializer):
     """ユーザー情報シリアライザー"""
     full_name = serializers.SerializerMethodField()
+    avatar_url = serializers.SerializerMethodField()
+    avatar_urls = serializers.SerializerMethodField()
     
     class Meta:
         model = User
         fields = [
             'id', 'username', 'email', 'first_name', 'last_name', 'full_name',
-            'department', 'position', 'phone', 'avatar',
+            'department', 'position', 'phone', 'avatar', 'avatar_url', 'avatar_urls',
             'date_joined', 'last_login'
         ]
         read_only_fields = ['id', 'username', 'date_joined', 'last_login']
+        # プロフィール画像は署名付きの avatar_url / avatar_urls で返す
+        extra_kwargs = {'avatar': {'write_only': True}}
     
     def get_full_name(self, obj):
         return obj.get_full_name() or obj.username
+    
+    def get_avatar_url(self, obj):
+        if obj.avatar:
+            return downloads.signed_url('avatar', obj.pk, obj.pk, self.context.get('request'))
+        return None
+
+    def get_avatar_urls(self, obj):
+        """サイズ別（thumb/medium）のプロフィール画像URL"""
+        return downloads.derivative_urls('avatar', obj.pk, obj.pk, obj.avatar.name, self.context.get('request'))
+
+
+class StorageUsageSerializer(serializers.ModelSerializer):
+    """保存容量・件数シリアライザー"""
+    total_bytes = serializers.ReadOnlyField()
+    quota_bytes = serializers.SerializerMethodField()
+
+    class Meta:
+        model = StorageUsage
+        exclude = ['user']
+
+    def get_quota_bytes(self, obj):
+        return QUOTA_BYTES
 
 
 class UserUpdateSerializer(serializers.ModelSerializer):
@@ -31,6 +60,7 @@ class UserUpdateSerializer(serializers.ModelSerializer):
             'email', 'first_name', 'last_name',
             'department', 'position', 'phone', 'avatar'
         ]
+        extra_kwargs = {'avatar': {'write_only': True}}
 
 
 class PasswordChangeSerializer(serializers.Serializer):
@@ -0,0 +1,18 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from core import images
+from .models import StorageUsage
+from . import usage
+
+User = get_user_model()
+
+images.register(User, 'avatar')
+usage.register_files(User, owner='pk', avatar='avatar_bytes')
+
+
+@receiver(post_save, sender=User)
+def create_storage_usage(sender, instance, created=False, raw=False, **kwargs):
+    """ユーザー登録時に利用量の行を作成"""
+    if created and not raw:
+        StorageUsage.objects.get_or_create(user=instance)
@@ -1,3 +1,151 @@
-from django.test import TestCase
+import shutil
+import tempfile
+import io
+import zipfile
+from datetime import date
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from customers.models import Customer, Document
+from expenses.models import Expense, ExpenseCategory
+from schedules.models import Schedule
+from tasks.models import Task
+from .models import StorageUsage, User
+from . import usage
 
-# Create your tests here.
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class StorageUsageTests(TestCase):
+    """保存容量・件数が作成・差し替え・削除で更新され、数え直しと一致すること"""
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('owner', 'owner@example.com', 'password')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def usage(self):
+        return StorageUsage.objects.get(user=self.user)
+
+    def upload(self, customer, content, name='資料.pdf'):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/documents/', {
+                'customer': customer.pk,
+                'title': name,
+                'file': SimpleUploadedFile(name, content),
+            }, format='multipart')
+        self.assertEqual(response.status_code, 201)
+        return response.json()['id']
+
+    def test_counters_follow_changes(self):
+        customer = Customer.objects.create(created_by=self.user, name='顧客')
+        first = self.upload(customer, b'a' * 100)
+        self.upload(customer, b'b' * 50)
+        Expense.objects.create(created_by=self.user, date=date(2026, 1, 1), amount=1000, description='x')
+        Task.objects.create(owner=self.user, title='t')
+
+        usage_row = self.usage()
+        self.assertEqual(usage_row.document_bytes, 150)
+        self.assertEqual(
+            (usage_row.customer_count, usage_row.document_count, usage_row.expense_count, usage_row.task_count),
+            (1, 2, 1, 1)
+        )
+        customer.refresh_from_db()
+        self.assertEqual(customer.document_count, 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(f'/api/documents/{first}/')
+        self.assertEqual(response.status_code, 204)
+        customer.refresh_from_db()
+        self.assertEqual((self.usage().document_bytes, self.usage().document_count), (50, 1))
+        self.assertEqual(customer.document_count, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(f'/api/customers/{customer.pk}/')
+        self.assertEqual(response.status_code, 204)
+        usage_row = self.usage()
+        self.assertEqual((usage_row.document_bytes, usage_row.document_count, usage_row.customer_count), (0, 0, 0))
+
+    def test_reconcile_repairs_drift(self):
+        customer = Customer.objects.create(created_by=self.user, name='顧客')
+        self.upload(customer, b'a' * 100)
+        expected = self.client.get('/api/accounts/me/usage/').json()
+        expected.pop('updated_at')
+
+        StorageUsage.objects.filter(user=self.user).update(document_bytes=0, document_count=9, customer_count=0)
+        usage.reconcile(user_ids=[self.user.pk])
+        reconciled = self.client.get('/api/accounts/me/usage/').json()
+        reconciled.pop('updated_at')
+        self.assertEqual(reconciled, expected)
+        self.assertEqual(expected['total_bytes'], 100)
+
+    def test_cascade_delete_reads_owner_once(self):
+        def customer_reads(documents, delete):
+            customer = Customer.objects.create(created_by=self.user, name='顧客')
+            for i in range(documents):
+                self.upload(customer, b'a' * 10, name=f'{i}.pdf')
+            with CaptureQueriesContext(connection) as queries:
+                delete(customer)
+            self.assertEqual((self.usage().document_bytes, self.usage().document_count), (0, 0))
+            return [
+                query['sql'] for query in queries.captured_queries
+                if query['sql'].startswith('SELECT') and 'FROM "customers_customer"' in query['sql']
+            ]
+
+        # 書類の数によらず、顧客（所有者）を書類ごとに読み直さない
+        for delete in (lambda customer: customer.delete(),
+                       lambda customer: Customer.objects.filter(pk=customer.pk).delete()):
+            self.assertEqual(len(customer_reads(3, delete)), len(customer_reads(1, delete)))
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class AccountBackupTests(TestCase):
+    """書き出したZIPを別のユーザーに復元すると、参照を付け替えて同じデータになること"""
+
+    def setUp(self):
+        cache.clear()
+        self.source = User.objects.create_user('source', 'source@example.com', 'password')
+        self.target = User.objects.create_user('target', 'target@example.com', 'password')
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def test_export_and_restore(self):
+        customer = Customer.objects.create(created_by=self.source, name='山田')
+        Document.objects.create(customer=customer, title='見積', file=SimpleUploadedFile('見積.pdf', b'%PDF'))
+        category = ExpenseCategory.objects.create(created_by=self.source, name='食費')
+        Expense.objects.create(created_by=self.source, date=date(2026, 1, 5), amount=800, category=category, description='昼食')
+        Schedule.objects.create(owner=self.source, title='訪問', date=date(2026, 1, 6), customer=customer)
+        existing = ExpenseCategory.objects.create(created_by=self.target, name='食費')
+
+        response = self.client_for(self.source).get('/api/accounts/me/export/')
+        archive = b''.join(response.streaming_content)
+        self.assertIn('media/' + Document.objects.get().file.name, zipfile.ZipFile(io.BytesIO(archive)).namelist())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client_for(self.target).post('/api/accounts/me/import/', {
+                'file': SimpleUploadedFile('backup.zip', archive, content_type='application/zip'),
+            }, format='multipart')
+        self.assertEqual(response.status_code, 201)
+
+        restored = Customer.objects.get(created_by=self.target)
+        self.assertEqual(restored.document_count, 1)
+        self.assertEqual(restored.documents.get().file.read(), b'%PDF')
+        self.assertEqual(Schedule.objects.get(owner=self.target).customer, restored)
+        self.assertEqual(Expense.objects.get(created_by=self.target).category, existing)
+        self.assertEqual(StorageUsage.objects.get(user=self.target).document_bytes, 4)
+        names = [item['name'] for item in self.client_for(self.target).get('/api/customers/', {'search': '山田'}).json()]
+        self.assertEqual(names, ['山田'])
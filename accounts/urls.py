@@ -6,6 +6,9 @@ urlpatterns = [
     path('logout/', views.LogoutView.as_view(), name='logout'),
     path('register/', views.RegisterView.as_view(), name='register'),
     path('me/', views.CurrentUserView.as_view(), name='current_user'),
+    path('me/usage/', views.StorageUsageView.as_view(), name='storage_usage'),
+    path('me/export/', views.AccountExportView.as_view(), name='account_export'),
+    path('me/import/', views.AccountImportView.as_view(), name='account_import'),
     path('me/update/', views.UserUpdateView.as_view(), name='user_update'),
     path('me/password/', views.PasswordChangeView.as_view(), name='password_change'),
     path('check/', views.CheckAuthView.as_view(), name='check_auth'),
@@ -0,0 +1,186 @@
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.utils import timezone
+from core.models import Blob
+from core.storage import is_blob_name
+from .models import StorageUsage
+
+
+BYTE_FIELDS = ('document_bytes', 'receipt_bytes', 'business_card_bytes', 'avatar_bytes')
+COUNT_FIELDS = ('document_count', 'customer_count', 'expense_count', 'task_count')
+# ユーザーごとの保存容量の上限（バイト、Noneなら無制限）
+QUOTA_BYTES = getattr(settings, 'STORAGE_QUOTA_BYTES', None)
+
+# reconcile() で使う登録内容
+_counters = []
+_files = []
+
+
+def add(user_id, **deltas):
+    """利用量に差分を加算（呼び出し側のトランザクション内で実行）"""
+    deltas = {field: delta for field, delta in deltas.items() if delta}
+    if user_id is None or not deltas:
+        return
+    rows = StorageUsage.objects.filter(user_id=user_id)
+    changes = {field: F(field) + delta for field, delta in deltas.items()}
+    if rows.update(updated_at=timezone.now(), **changes):
+        return
+    if any(delta < 0 for delta in deltas.values()):
+        # 行が無い（ユーザーの削除中など）場合の減算は reconcile に任せる
+        return
+    try:
+        with transaction.atomic():
+            StorageUsage.objects.create(user_id=user_id, **deltas)
+    except IntegrityError:
+        # 同時に作成された場合は加算でやり直す
+        rows.update(updated_at=timezone.now(), **changes)
+
+
+def get_usage(user):
+    usage, _ = StorageUsage.objects.get_or_create(user=user)
+    return usage
+
+
+def has_room(user, size):
+    """size バイトを追加しても上限を超えないか（行を1件読むだけ）"""
+    if QUOTA_BYTES is None:
+        return True
+    return get_usage(user).total_bytes + size <= QUOTA_BYTES
+
+
+def stored_size(name, storage):
+    """保存済みファイルのサイズ（ハッシュ名の実体はBlobの記録を使い、stat しない）"""
+    if not name:
+        return 0
+    if is_blob_name(name):
+        size = Blob.objects.filter(name=name).values_list('size', flat=True).first()
+        if size is not None:
+            return size
+    try:
+        return storage.size(name)
+    except (OSError, NotImplementedError):
+        return 0
+
+
+def owner_id(instance, path, origin=None):
+    """'customer__created_by_id' のようなパスをたどって所有ユーザーIDを取得
+
+    削除の連鎖中（origin が削除の起点）は、親が起点そのものならその行を使い、
+    それ以外の親も起点ごとに1回だけ読む（子の件数分のクエリにしない）
+    """
+    value = instance
+    for name in path.split('__'):
+        field = None if origin is None or name == 'pk' else value._meta.get_field(name)
+        if field is None or not field.many_to_one or field.is_cached(value):
+            value = getattr(value, name)
+            continue
+        key = getattr(value, field.attname)
+        if key is None:
+            return None
+        if isinstance(origin, field.related_model) and origin.pk == key:
+            parent = origin
+        else:
+            parents = origin.__dict__.setdefault('_usage_parents', {})
+            parent = parents.get((field.related_model, key))
+            if parent is None:
+                parent = parents[(field.related_model, key)] = getattr(value, name)
+        field.set_cached_value(value, parent)
+        value = parent
+    return value
+
+
+def register_count(model, counter, owner='created_by_id'):
+    """作成・削除で件数を増減する（owner は所有ユーザーIDへのパス）"""
+
+    def after_save(sender, instance, created=False, raw=False, **kwargs):
+        if created and not raw:
+            add(owner_id(instance, owner), **{counter: 1})
+
+    def after_delete(sender, instance, origin=None, **kwargs):
+        add(owner_id(instance, owner, origin), **{counter: -1})
+
+    _counters.append((model, counter, owner))
+    uid = f'{model._meta.label}.usage.{counter}'
+    post_save.connect(after_save, sender=model, weak=False, dispatch_uid=uid)
+    post_delete.connect(after_delete, sender=model, weak=False, dispatch_uid=uid)
+
+
+def register_files(model, owner='created_by_id', **counters):
+    """ファイルの追加・差し替え・削除で容量を増減する（counters はフィールド名→容量の列名）"""
+    field_names = list(counters)
+
+    def before_save(sender, instance, raw=False, **kwargs):
+        instance._usage_names_before = None
+        if raw or instance._state.adding or instance.pk is None:
+            return
+        instance._usage_names_before = sender._default_manager.filter(pk=instance.pk).values(*field_names).first()
+
+    def after_save(sender, instance, raw=False, **kwargs):
+        if raw:
+            return
+        before = getattr(instance, '_usage_names_before', None) or {}
+        instance._usage_names_before = None
+        deltas = {}
+        for field_name, counter in counters.items():
+            field_file = getattr(instance, field_name)
+            old_name = before.get(field_name)
+            if (field_file.name or None) == (old_name or None):
+                continue
+            delta = stored_size(field_file.name, field_file.storage) - stored_size(old_name, field_file.storage)
+            deltas[counter] = deltas.get(counter, 0) + delta
+        add(owner_id(instance, owner), **deltas)
+
+    def after_delete(sender, instance, origin=None, **kwargs):
+        deltas = {}
+        for field_name, counter in counters.items():
+            field_file = getattr(instance, field_name)
+            deltas[counter] = deltas.get(counter, 0) - stored_size(field_file.name, field_file.storage)
+        add(owner_id(instance, owner, origin), **deltas)
+
+    _files.append((model, owner, counters))
+    uid = f'{model._meta.label}.usage.files'
+    pre_save.connect(before_save, sender=model, weak=False, dispatch_uid=uid)
+    post_save.connect(after_save, sender=model, weak=False, dispatch_uid=uid)
+    post_delete.connect(after_delete, sender=model, weak=False, dispatch_uid=uid)
+
+
+def reconcile(user_ids=None):
+    """DBの行とファイルの記録から利用量を作り直し、ユーザー数を返す"""
+    from django.contrib.auth import get_user_model
+
+    totals = {}
+
+    def total(user_id):
+        return totals.setdefault(user_id, dict.fromkeys(BYTE_FIELDS + COUNT_FIELDS, 0))
+
+    def rows_for(model, path):
+        rows = model._default_manager.all()
+        if user_ids is not None:
+            rows = rows.filter(**{f'{path}__in': user_ids})
+        return rows
+
+    users = get_user_model().objects.all()
+    if user_ids is not None:
+        users = users.filter(pk__in=user_ids)
+    for user_id in users.values_list('pk', flat=True).iterator():
+        total(user_id)
+
+    for model, counter, path in _counters:
+        for row in rows_for(model, path).values(path).annotate(count=Count('pk')).order_by():
+            total(row[path])[counter] += row['count']
+
+    blob_sizes = dict(Blob.objects.values_list('name', 'size').iterator())
+    for model, path, counters in _files:
+        for field_name, counter in counters.items():
+            storage = model._meta.get_field(field_name).storage
+            names = rows_for(model, path).exclude(**{field_name: ''}).exclude(**{f'{field_name}__isnull': True})
+            for user_id, name in names.values_list(path, field_name).iterator(chunk_size=2000):
+                size = blob_sizes.get(name)
+                total(user_id)[counter] += stored_size(name, storage) if size is None else size
+
+    with transaction.atomic():
+        for user_id, values in totals.items():
+            StorageUsage.objects.update_or_create(user_id=user_id, defaults=values)
+    return len(totals)
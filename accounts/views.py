@@ -2,15 +2,21 @@ from rest_framework import status, generics
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.authtoken.models import Token
 from django.contrib.auth import login, logout, get_user_model
+from django.db import transaction
+from django.http import StreamingHttpResponse
+from django.utils import timezone
 from .serializers import (
     UserSerializer, 
     UserUpdateSerializer,
     PasswordChangeSerializer,
     LoginSerializer,
-    RegisterSerializer
+    RegisterSerializer,
+    StorageUsageSerializer
 )
+from . import backup, usage
 
 User = get_user_model()
 
@@ -84,6 +90,42 @@ class CurrentUserView(APIView):
         return Response(serializer.data)
 
 
+class StorageUsageView(APIView):
+    """保存容量・件数の取得API"""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        serializer = StorageUsageSerializer(usage.get_usage(request.user))
+        return Response(serializer.data)
+
+
+class AccountExportView(APIView):
+    """アカウントのデータをZIPで書き出すAPI（メモリに溜めずに送信する）"""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        response = StreamingHttpResponse(backup.export_account(request.user), content_type='application/zip')
+        filename = f'reang-net_{request.user.username}_{timezone.localdate():%Y%m%d}.zip'
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+
+class AccountImportView(APIView):
+    """書き出したZIPを現在のアカウントに復元するAPI"""
+    permission_classes = [IsAuthenticated]
+    parser_classes = [MultiPartParser, FormParser]
+
+    def post(self, request):
+        upload = request.FILES.get('file')
+        if not upload:
+            return Response({'error': 'file is required'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            result = backup.restore_account(request.user, upload)
+        except backup.RestoreError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(result, status=status.HTTP_201_CREATED)
+
+
 class UserUpdateView(APIView):
     """ユーザー情報更新API"""
     permission_classes = [IsAuthenticated]
@@ -91,7 +133,8 @@ class UserUpdateView(APIView):
     def put(self, request):
         serializer = UserUpdateSerializer(request.user, data=request.data, partial=True)
         serializer.is_valid(raise_exception=True)
-        serializer.save()
+        with transaction.atomic():
+            serializer.save()
         
         return Response({
             'user': UserSerializer(request.user).data,
@@ -50,6 +50,7 @@ INSTALLED_APPS = [
     'schedules',
     'accounts',
     'expenses',
+    'core',
 ]
 
 MIDDLEWARE = [
@@ -98,6 +99,26 @@ DATABASES = {
 }
 
 
+# Cache
+# ローカルメモリキャッシュはプロセスごとに別なので、複数ワーカーで動かす場合は
+# CACHE_DIR を指定してファイルキャッシュ（全プロセスで共有）を使う
+if os.environ.get('CACHE_DIR'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ.get('CACHE_DIR'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'reang-net',
+            'OPTIONS': {'MAX_ENTRIES': 5000},
+        }
+    }
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -167,5 +188,8 @@ REST_FRAMEWORK = {
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
-    ]
+    ],
+    # ?cursor= / ?page_size= を指定した一覧だけキーセットでページ分割する
+    'DEFAULT_PAGINATION_CLASS': 'core.pagination.KeysetPagination',
+    'PAGE_SIZE': int(os.environ.get('API_PAGE_SIZE', '50')),
 }
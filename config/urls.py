@@ -17,8 +17,6 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 from django.http import JsonResponse
-from django.conf import settings
-from django.conf.urls.static import static
 
 def hello_api(request):
     return JsonResponse({"message": "Hello, world!", "status": "success"})
@@ -31,8 +29,7 @@ urlpatterns = [
     path('api/', include('schedules.urls')),
     path('api/accounts/', include('accounts.urls')),
     path('api/expenses/', include('expenses.urls')),
+    # アップロードファイルは署名付きURL（core.downloads）でだけ配信し、MEDIA_URL は公開しない
+    path('api/', include('core.urls')),
     
 ]
-
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -0,0 +1,108 @@
+import hashlib
+import time
+from functools import wraps
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from rest_framework.response import Response
+
+
+RESPONSE_CACHE_TIMEOUT = 60 * 60
+
+
+def _version_key(scope, user_id):
+    return f'data-version:{scope}:{user_id}'
+
+
+def get_versions(scopes, user_id):
+    """ユーザー・スコープごとのデータバージョンを取得（無ければ新しく採番）"""
+    keys = {scope: _version_key(scope, user_id) for scope in scopes}
+    found = cache.get_many(keys.values())
+    versions = {}
+    for scope, key in keys.items():
+        version = found.get(key)
+        if version is None:
+            # 消えたバージョンを1から振り直すと古いキャッシュと衝突するため時刻で採番
+            version = time.time_ns()
+            cache.add(key, version, timeout=None)
+            version = cache.get(key, version)
+        versions[scope] = version
+    return versions
+
+
+def bump_version(scope, user_id):
+    """データ変更時にバージョンを進め、そのユーザーの既存キャッシュを無効にする"""
+    key = _version_key(scope, user_id)
+
+    def bump():
+        # incr はファイルキャッシュでは原子的でないため、毎回新しい値で上書きする
+        cache.set(key, time.time_ns(), timeout=None)
+
+    # コミット前に進めると、その間の読み込みが古いデータを新しいバージョンで保存してしまう
+    transaction.on_commit(bump)
+
+
+def register(model, owner_field='created_by_id', scope=None):
+    """モデルの保存・削除でユーザーのデータバージョン（既定はアプリ単位）を進める"""
+    scope = scope or model._meta.app_label
+
+    def changed(sender, instance, raw=False, **kwargs):
+        user_id = getattr(instance, owner_field, None)
+        if raw or user_id is None:
+            return
+        bump_version(scope, user_id)
+
+    uid = f'{model._meta.label}.cache'
+    post_save.connect(changed, sender=model, weak=False, dispatch_uid=uid)
+    post_delete.connect(changed, sender=model, weak=False, dispatch_uid=uid)
+
+
+def response_cache_key(request, name, scopes):
+    versions = get_versions(scopes, request.user.pk)
+    params = sorted((key, tuple(values)) for key, values in request.query_params.lists())
+    # 年月の省略時は「今日」が基準になるため日付もキーに含める
+    raw = repr((params, timezone.localdate().isoformat(), sorted(versions.items())))
+    digest = hashlib.sha1(raw.encode('utf-8')).hexdigest()
+    return f'response:{name}:{request.user.pk}:{digest}'
+
+
+def response_etag(request, key):
+    """キャッシュキー（ユーザー・パラメーター・データバージョンを含む）から作るETag"""
+    renderer = getattr(getattr(request, 'accepted_renderer', None), 'format', None)
+    return '"%s"' % hashlib.sha1(f'{key}:{renderer}'.encode('utf-8')).hexdigest()
+
+
+def cached_response(*scopes, timeout=RESPONSE_CACHE_TIMEOUT):
+    """ViewSetのactionの結果をユーザー・データバージョン単位でキャッシュする
+
+    キーにバージョンを含めるので、書き込み後に古い結果が返ることはない。
+    ETagも同じキーから作るので、再検証はDBを読まずに304を返せる
+    """
+
+    def decorator(func):
+        name = func.__qualname__
+
+        @wraps(func)
+        def wrapper(self, request, *args, **kwargs):
+            key = response_cache_key(request, name, scopes)
+            etag = response_etag(request, key)
+            response = get_conditional_response(request, etag=etag)
+            if response is None:
+                data = cache.get(key)
+                if data is not None:
+                    response = Response(data)
+                else:
+                    response = func(self, request, *args, **kwargs)
+                    if response.status_code == 200 and isinstance(response, Response):
+                        cache.set(key, response.data, timeout)
+            if response.status_code in (200, 304):
+                response['ETag'] = etag
+                # ブラウザに毎回再検証させる（一致すれば304で本文は送られない）
+                patch_cache_control(response, private=True, no_cache=True)
+            return response
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,66 @@
+import hashlib
+from functools import wraps
+from django.db.models import Count, Max
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from .downloads import url_period
+
+
+def watermark(queryset, field='updated_at'):
+    """(最終更新日時, 件数) を1回の集計クエリで取得"""
+    row = queryset.order_by().aggregate(last=Max(field), count=Count('pk'))
+    return row['last'], row['count']
+
+
+def make_etag(request, name, marks):
+    params = sorted((key, tuple(values)) for key, values in request.query_params.lists())
+    renderer = getattr(getattr(request, 'accepted_renderer', None), 'format', None)
+    raw = repr((
+        name,
+        request.user.pk,
+        renderer,
+        params,
+        # 年月を省略したリクエストは「今日」で結果が変わる
+        timezone.localdate().isoformat(),
+        # 本文に含む署名付きURLは区間ごとに作り直す
+        url_period(),
+        [(last.isoformat() if last else None, count) for last, count in marks],
+    ))
+    return '"%s"' % hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def conditional(querysets):
+    """ViewSetのGETにETag / Last-Modifiedを付け、変更が無ければシリアライズ前に304を返す
+
+    querysets(view, request, *args, **kwargs) はレスポンスの元になるクエリセットのリスト。
+    件数も検証子に含めるので、最終更新日時が変わらない削除も検出できる
+    """
+
+    def decorator(func):
+        name = func.__qualname__
+
+        @wraps(func)
+        def wrapper(self, request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return func(self, request, *args, **kwargs)
+
+            marks = [watermark(queryset) for queryset in querysets(self, request, *args, **kwargs)]
+            etag = make_etag(request, name, marks)
+            last_modified = max((last for last, _ in marks if last), default=None)
+
+            # 削除は最終更新日時に現れないため、If-Modified-Since では判定しない（ETagのみ）
+            response = get_conditional_response(request, etag=etag)
+            if response is None:
+                response = func(self, request, *args, **kwargs)
+            if response.status_code in (200, 304):
+                response['ETag'] = etag
+                if last_modified:
+                    response['Last-Modified'] = http_date(last_modified.timestamp())
+                # ブラウザに毎回再検証させる（一致すれば304で本文は送られない）
+                patch_cache_control(response, private=True, no_cache=True)
+            return response
+
+        return wrapper
+
+    return decorator
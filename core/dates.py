@@ -0,0 +1,54 @@
+from datetime import date, datetime, time
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+
+def _to_int(value, name):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValidationError({name: f'{name} must be an integer'})
+
+
+def month_bounds(year, month=None):
+    """年（・月）を半開区間 [start, end) の日付に変換
+
+    date__year / date__month と違い、(所有者, 日付) のインデックスで範囲検索できる
+    """
+    year = _to_int(year, 'year')
+    if month is None:
+        return date(year, 1, 1), date(year + 1, 1, 1)
+
+    month = _to_int(month, 'month')
+    if not 1 <= month <= 12:
+        raise ValidationError({'month': 'month must be between 1 and 12'})
+    start = date(year, month, 1)
+    end = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+    return start, end
+
+
+def years_bounds(start_year, end_year):
+    """開始年〜終了年（両端含む）を半開区間の日付に変換"""
+    start, _ = month_bounds(start_year)
+    _, end = month_bounds(end_year)
+    return start, end
+
+
+def local_datetime_bounds(year, month=None):
+    """年（・月）を現地時間の半開区間 [start, end) のaware datetimeに変換
+
+    created_at__year などはDB側でタイムゾーン変換が入りインデックスが効かないため、
+    境界を先に計算して範囲検索にする
+    """
+    start, end = month_bounds(year, month)
+    tz = timezone.get_current_timezone()
+    return (
+        timezone.make_aware(datetime.combine(start, time.min), tz),
+        timezone.make_aware(datetime.combine(end, time.min), tz),
+    )
+
+
+def date_range_filter(field, year, month=None):
+    """filter() に渡す {field__gte, field__lt} を作る"""
+    start, end = month_bounds(year, month)
+    return {f'{field}__gte': start, f'{field}__lt': end}
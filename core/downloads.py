@@ -0,0 +1,247 @@
+import mimetypes
+import re
+import time
+from urllib.parse import quote
+from django.conf import settings
+from django.core import signing
+from django.http import FileResponse, Http404, HttpResponse
+from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe
+from django.views.decorators.http import require_safe
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+from .images import DERIVATIVE_SIZES, derivative_name, generate_derivatives, is_image_name
+
+
+# 署名付きURLの発行区間（時間）。同じ区間のうちは同じURLになり、次の区間の終わりまで使える
+URL_VALID_HOURS = getattr(settings, 'FILE_URL_VALID_HOURS', 6)
+# 'nginx'（X-Accel-Redirect）/ 'sendfile'（X-Sendfile）/ ''（Djangoで返す）
+OFFLOAD = getattr(settings, 'FILE_DOWNLOAD_OFFLOAD', '')
+# nginx の internal location（MEDIA_ROOT を alias したもの）
+ACCEL_PREFIX = getattr(settings, 'FILE_DOWNLOAD_ACCEL_PREFIX', '/protected-media/')
+
+# ブラウザ内で開いてよい種類（HTML・SVGなどスクリプトを実行できるものは常にダウンロードさせる）
+INLINE_CONTENT_TYPES = {
+    'image/jpeg', 'image/png', 'image/gif', 'image/webp', 'image/bmp', 'image/tiff', 'application/pdf',
+}
+
+SALT = 'core.downloads'
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+BLOCK_SIZE = 64 * 1024
+
+_resolvers = {}
+
+
+def register(kind, resolver):
+    """ダウンロード対象を登録する
+
+    resolver(user_id, pk) は所有者の確認を含めて1クエリで対象を探し、
+    {'file', 'filename', 'content_type', 'sha256'} のdict（無ければNone）を返す
+    """
+    _resolvers[kind] = resolver
+
+
+def url_period():
+    """署名付きURLの発行区間の番号（一覧のETagにも含め、区間が変われば新しいURLを返す）"""
+    return int(time.time() // (URL_VALID_HOURS * 3600))
+
+
+def signed_url(kind, pk, owner_id, request=None, size=None):
+    """所有者に紐づけた署名付きのダウンロードURL（imgタグなど認証ヘッダーを送れない場合用）
+
+    URLを持っていれば誰でも開ける（bearer）ので、期限は URL_VALID_HOURS の1〜2倍と短くする。
+    同じ区間のうちは同じURLになりブラウザのキャッシュが効く。
+    size を指定すると派生画像（thumb/medium）のURLになる
+    """
+    payload = [kind, pk, owner_id, url_period() + 1]
+    if size:
+        payload.append(size)
+    token = signing.Signer(salt=SALT).sign_object(payload)
+    url = reverse('file-download', kwargs={'token': token})
+    return request.build_absolute_uri(url) if request else url
+
+
+def derivative_urls(kind, pk, owner_id, name, request=None):
+    """サイズごとの派生画像の署名付きURL（画像でなければNone）
+
+    派生画像はアップロード時（既存ファイルは generate_image_derivatives コマンド）に作成し、
+    無いものは開かれたときに作るので、ここではURLを組み立てるだけでストレージの確認はしない
+    """
+    if not is_image_name(name):
+        return None
+    return {size: signed_url(kind, pk, owner_id, request, size=size) for size in DERIVATIVE_SIZES}
+
+
+class RangeFile:
+    """ファイルの一部だけを読み出すラッパー"""
+
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range(header, size):
+    """単一の bytes 範囲を (開始, 終了) に変換。解釈できなければNone、範囲外なら ValueError"""
+    match = RANGE.match(header.strip())
+    if not match or not any(match.groups()):
+        return None
+    start, end = match.groups()
+    if not start:
+        # bytes=-500 は末尾500バイト
+        length = int(end)
+        if not length:
+            raise ValueError
+        return max(0, size - length), size - 1
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start > end:
+        raise ValueError
+    return start, end
+
+
+def range_applies(request, etag, last_modified):
+    """If-Range が現在のファイルと一致する場合だけ Range を使う"""
+    if_range = request.headers.get('If-Range')
+    if not if_range:
+        return True
+    if if_range.startswith('"') or if_range.startswith('W/'):
+        return if_range == etag
+    return last_modified is not None and parse_http_date_safe(if_range) == int(last_modified)
+
+
+def serve_file(request, field_file, filename=None, content_type=None, sha256='', as_attachment=False):
+    """ファイルを返す。設定があればフロントのプロキシに転送を任せる
+
+    Content-Type はアップロード時の申告に基づくので、画像・PDF以外は添付ファイルとして返し、
+    nosniff と CSP sandbox で API のオリジンでスクリプトが動かないようにする
+    """
+    storage = field_file.storage
+    filename = filename or field_file.name.rsplit('/', 1)[-1]
+    content_type = content_type or mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    if content_type.split(';')[0].strip().lower() not in INLINE_CONTENT_TYPES:
+        as_attachment = True
+
+    try:
+        size = storage.size(field_file.name)
+        last_modified = storage.get_modified_time(field_file.name).timestamp()
+    except (FileNotFoundError, NotImplementedError):
+        raise Http404
+    etag = f'"{sha256}"' if sha256 else f'"{size:x}-{int(last_modified):x}"'
+
+    response = get_conditional_response(request, etag=etag, last_modified=int(last_modified))
+    if response is None:
+        response = _file_response(request, field_file, size, etag, last_modified, content_type)
+        if response.status_code in (200, 206):
+            response['Content-Disposition'] = content_disposition_header(as_attachment, filename)
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['X-Content-Type-Options'] = 'nosniff'
+    response['Content-Security-Policy'] = 'sandbox'
+    patch_cache_control(response, private=True, max_age=0)
+    return response
+
+
+def _file_response(request, field_file, size, etag, last_modified, content_type):
+    storage = field_file.storage
+    if OFFLOAD == 'nginx':
+        # Range や送信はnginxが処理する
+        response = HttpResponse(content_type=content_type)
+        # 移行前の日本語のパスもそのまま送るとRFC 2047形式にされてnginxが解決できない
+        response['X-Accel-Redirect'] = ACCEL_PREFIX + quote(field_file.name)
+        return response
+    if OFFLOAD == 'sendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = storage.path(field_file.name)
+        return response
+
+    byte_range = None
+    if 'Range' in request.headers and range_applies(request, etag, last_modified):
+        try:
+            byte_range = parse_range(request.headers['Range'], size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+    file = storage.open(field_file.name, 'rb')
+    if byte_range is None:
+        response = FileResponse(file, content_type=content_type)
+    else:
+        start, end = byte_range
+        response = FileResponse(RangeFile(file, start, end - start + 1), status=206, content_type=content_type)
+        response['Content-Length'] = end - start + 1
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response.block_size = BLOCK_SIZE
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+
+def _request_user_id(request):
+    """セッションかトークンで認証されていればそのユーザーID（無ければNone）"""
+    if request.user.is_authenticated:
+        return request.user.pk
+    try:
+        authenticated = TokenAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        raise Http404
+    return authenticated[0].pk if authenticated else None
+
+
+@require_safe
+def download(request, token):
+    """署名付きURLのダウンロード（所有者の確認は対象ごとのresolverで1クエリ）
+
+    imgタグから開けるよう未認証のリクエストはURLだけで許可する。
+    認証されている場合は、URLの所有者と同じユーザーでなければ返さない
+    """
+    try:
+        kind, pk, owner_id, expires, *size = signing.Signer(salt=SALT).unsign_object(token)
+        resolver = _resolvers[kind]
+    except (signing.BadSignature, ValueError, KeyError, TypeError):
+        raise Http404
+    if expires < url_period() or (size and size[0] not in DERIVATIVE_SIZES):
+        raise Http404
+    user_id = _request_user_id(request)
+    if user_id is not None and user_id != owner_id:
+        raise Http404
+
+    target = resolver(owner_id, pk)
+    if not target or not target['file']:
+        raise Http404
+    if size:
+        return serve_derivative(request, target['file'], size[0])
+    return serve_file(
+        request,
+        target['file'],
+        filename=target.get('filename'),
+        content_type=target.get('content_type'),
+        sha256=target.get('sha256', ''),
+        as_attachment=request.GET.get('download') == '1',
+    )
+
+
+def serve_derivative(request, field_file, size):
+    """派生画像を返す。無ければ（作成の失敗・移行前のファイルなど）その場で作り、作れなければ元画像を返す"""
+    if not is_image_name(field_file.name):
+        raise Http404
+    name = derivative_name(field_file.name, size)
+    try:
+        field_file.storage.size(name)
+    except FileNotFoundError:
+        name = generate_derivatives(field_file, [size]).get(size)
+        if name is None:
+            return serve_file(request, field_file)
+    derivative = field_file.field.attr_class(field_file.instance, field_file.field, name)
+    return serve_file(request, derivative)
@@ -0,0 +1,48 @@
+import hashlib
+import mimetypes
+from PIL import Image, UnidentifiedImageError
+from .images import is_image_name
+from .storage import remember_digest
+
+
+DEFAULT_CONTENT_TYPE = 'application/octet-stream'
+
+
+def file_metadata(file, name=None):
+    """サイズ・Content-Type・SHA-256・（画像なら）縦横を1回の読み込みで取得"""
+    name = name or file.name
+    digest = hashlib.sha256()
+    size = 0
+    file.seek(0)
+    for chunk in file.chunks():
+        digest.update(chunk)
+        size += len(chunk)
+    file.seek(0)
+
+    # FieldFileの場合はアップロードされたファイル本体の Content-Type を見る
+    content_type = (
+        getattr(getattr(file, 'file', file), 'content_type', None)
+        or mimetypes.guess_type(name)[0]
+        or DEFAULT_CONTENT_TYPE
+    )
+    width = height = None
+    if is_image_name(name) or content_type.startswith('image/'):
+        try:
+            # ヘッダーだけ読むので画像全体はデコードしない
+            with Image.open(file) as image:
+                width, height = image.size
+                content_type = Image.MIME.get(image.format, content_type)
+        except (UnidentifiedImageError, OSError, ValueError):
+            pass
+        finally:
+            file.seek(0)
+
+    # 保存時（BlobStorage）に同じファイルを再度ハッシュしないよう、アップロード本体に残す
+    remember_digest(getattr(file, 'file', file), digest.hexdigest(), size)
+    return {
+        'size': size,
+        'content_type': content_type[:100],
+        'sha256': digest.hexdigest(),
+        'width': width,
+        'height': height,
+    }
@@ -0,0 +1,120 @@
+import io
+import logging
+import os
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db.models.signals import pre_save, post_save
+from PIL import Image, ImageOps, UnidentifiedImageError, features
+from PIL.ExifTags import Base as ExifBase
+
+logger = logging.getLogger(__name__)
+
+# 派生画像のサイズ（長辺の上限px）
+DERIVATIVE_SIZES = getattr(settings, 'IMAGE_DERIVATIVE_SIZES', {
+    'thumb': 320,
+    'medium': 1280,
+})
+DERIVATIVE_DIR = 'derivatives'
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp', '.tif', '.tiff')
+
+if features.check('webp'):
+    DERIVATIVE_FORMAT, DERIVATIVE_EXTENSION = 'WEBP', 'webp'
+else:
+    DERIVATIVE_FORMAT, DERIVATIVE_EXTENSION = 'JPEG', 'jpg'
+
+
+def is_image_name(name):
+    return bool(name) and os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS
+
+
+def derivative_name(name, size):
+    """元画像のパスから派生画像のパスを作る"""
+    return f'{DERIVATIVE_DIR}/{name}.{size}.{DERIVATIVE_EXTENSION}'
+
+
+def normalize_orientation(field_file):
+    """アップロード直後の画像をEXIFの向きに合わせて回転（回転不要なら何もしない）"""
+    upload = field_file.file
+    try:
+        upload.seek(0)
+        image = Image.open(upload)
+        orientation = image.getexif().get(ExifBase.Orientation, 1)
+        if orientation == 1:
+            return
+        image_format = image.format
+        rotated = ImageOps.exif_transpose(image)
+    except (UnidentifiedImageError, OSError, ValueError):
+        logger.warning('画像の向きを補正できませんでした: %s', field_file.name)
+        return
+    finally:
+        upload.seek(0)
+
+    buffer = io.BytesIO()
+    save_kwargs = {'quality': 90} if image_format == 'JPEG' else {}
+    rotated.save(buffer, format=image_format, **save_kwargs)
+    field_file.file = ContentFile(buffer.getvalue(), name=os.path.basename(field_file.name))
+
+
+def generate_derivatives(field_file, sizes=None):
+    """派生画像（thumb/medium）を作成して保存。作成できたパスのdictを返す"""
+    storage = field_file.storage
+    created = {}
+    try:
+        with storage.open(field_file.name, 'rb') as original:
+            image = ImageOps.exif_transpose(Image.open(original))
+            image.load()
+    except (UnidentifiedImageError, OSError, ValueError):
+        logger.warning('派生画像を作成できませんでした: %s', field_file.name)
+        return created
+
+    if DERIVATIVE_FORMAT == 'JPEG' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+
+    for size in sizes or DERIVATIVE_SIZES:
+        name = derivative_name(field_file.name, size)
+        resized = image.copy()
+        resized.thumbnail((DERIVATIVE_SIZES[size], DERIVATIVE_SIZES[size]), Image.LANCZOS)
+        buffer = io.BytesIO()
+        resized.save(buffer, format=DERIVATIVE_FORMAT, quality=80)
+        if storage.exists(name):
+            storage.delete(name)
+        storage.save(name, ContentFile(buffer.getvalue()))
+        created[size] = name
+    return created
+
+
+def missing_derivatives(field_file):
+    """まだ作成されていないサイズ（既存ファイルの作成用。一覧などの読み出しでは使わない）"""
+    storage = field_file.storage
+    return [size for size in DERIVATIVE_SIZES if not storage.exists(derivative_name(field_file.name, size))]
+
+
+# register() したモデル・フィールド・条件（既存ファイルの派生画像作成で使う）
+registered = []
+
+
+def register(model, *field_names, condition=None):
+    """モデルの画像フィールドをアップロード時の向き補正・派生画像作成の対象にする"""
+
+    def applies(instance):
+        return condition is None or condition(instance)
+
+    def before_save(sender, instance, raw=False, **kwargs):
+        instance._uploaded_image_fields = []
+        if raw or not applies(instance):
+            return
+        for field_name in field_names:
+            field_file = getattr(instance, field_name)
+            if field_file and not field_file._committed and is_image_name(field_file.name):
+                normalize_orientation(field_file)
+                instance._uploaded_image_fields.append(field_name)
+
+    def after_save(sender, instance, raw=False, **kwargs):
+        for field_name in getattr(instance, '_uploaded_image_fields', []):
+            generate_derivatives(getattr(instance, field_name))
+        instance._uploaded_image_fields = []
+
+    registered.append((model, field_names, condition))
+    uid = f'{model._meta.label}.images'
+    pre_save.connect(before_save, sender=model, weak=False, dispatch_uid=uid)
+    post_save.connect(after_save, sender=model, weak=False, dispatch_uid=uid)
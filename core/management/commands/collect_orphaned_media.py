@@ -0,0 +1,65 @@
+from django.core.management.base import BaseCommand
+from core.orphans import OrphanCollector
+
+
+class Command(BaseCommand):
+    help = 'どのレコードからも参照されていないメディアファイルを削除（または隔離）します'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace-hours',
+            type=float,
+            default=24,
+            help='この時間より新しいファイルは残す（既定: 24）'
+        )
+        parser.add_argument(
+            '--quarantine',
+            metavar='DIR',
+            help='削除せずにこのディレクトリへ移動する'
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            help='1回に調べるファイル数の上限（続きは次回の実行で再開）'
+        )
+        parser.add_argument(
+            '--rate',
+            type=float,
+            help='1秒あたりに削除するファイル数の上限'
+        )
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help='前回の途中の位置を捨てて最初から走査する'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='対象のファイルを表示するだけで削除しない'
+        )
+
+    def handle(self, *args, **options):
+        collector = OrphanCollector(
+            grace_seconds=options['grace_hours'] * 3600,
+            quarantine=options['quarantine'],
+            dry_run=options['dry_run'],
+            limit=options['limit'],
+            rate=options['rate'],
+            stdout=self.stdout if options['verbosity'] > 1 else None,
+        )
+        if options['restart']:
+            collector.clear_checkpoint()
+        finished = collector.run()
+
+        stats = collector.stats
+        if options['dry_run']:
+            verb = 'が対象です'
+        else:
+            verb = 'を隔離しました' if options['quarantine'] else 'を削除しました'
+        message = (
+            f"{stats['examined']}件を調べ、{stats['orphaned']}件（{stats['bytes'] / 1024 ** 2:.1f}MB）{verb}"
+            f"（猶予期間内: {stats['skipped']}件）"
+        )
+        if not finished:
+            message += '。続きは次回の実行で再開します'
+        self.stdout.write(self.style.SUCCESS(message))
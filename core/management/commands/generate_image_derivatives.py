@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from core import images
+
+
+class Command(BaseCommand):
+    help = '派生画像（サムネイル等）が無い既存の画像について作成します'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='対象の件数だけ表示する'
+        )
+
+    def handle(self, *args, **options):
+        generated = failed = 0
+        for model, field_names, condition in images.registered:
+            for field_name in field_names:
+                rows = model._default_manager.exclude(**{field_name: ''}).exclude(**{f'{field_name}__isnull': True})
+                for row in rows.iterator(chunk_size=200):
+                    field_file = getattr(row, field_name)
+                    if not images.is_image_name(field_file.name) or (condition and not condition(row)):
+                        continue
+                    missing = images.missing_derivatives(field_file)
+                    if not missing:
+                        continue
+                    if options['dry_run']:
+                        generated += 1
+                        continue
+                    if images.generate_derivatives(field_file, missing):
+                        generated += 1
+                    else:
+                        failed += 1
+
+        verb = '対象' if options['dry_run'] else '作成しました'
+        self.stdout.write(self.style.SUCCESS(f'{generated}件を{verb}（作成できない画像: {failed}件）'))
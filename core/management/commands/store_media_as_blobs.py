@@ -0,0 +1,49 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from core import storage
+
+
+class Command(BaseCommand):
+    help = '既存のアップロードファイルを内容のハッシュ名で保存し直し、重複を1つにまとめます'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='対象の件数だけ表示する'
+        )
+
+    def handle(self, *args, **options):
+        moved = missing = 0
+        for model, field_names in storage.registered:
+            for field_name in field_names:
+                rows = model._default_manager.exclude(**{field_name: ''}).exclude(
+                    **{f'{field_name}__isnull': True}
+                ).exclude(**{f'{field_name}__startswith': f'{storage.BLOB_DIR}/'})
+                if options['dry_run']:
+                    moved += rows.count()
+                    continue
+
+                for row in rows.only(field_name).iterator(chunk_size=200):
+                    field_file = getattr(row, field_name)
+                    old_name = field_file.name
+                    try:
+                        with transaction.atomic():
+                            with field_file.open('rb') as original:
+                                name = storage.blob_storage.save(old_name, original)
+                            # 更新日時を変えず、シグナルも送らないよう update() で書き込む
+                            model._default_manager.filter(pk=row.pk).update(**{field_name: name})
+                    except (FileNotFoundError, OSError):
+                        missing += 1
+                        self.stderr.write(f'ファイルが見つかりません: {model._meta.label} {row.pk} {old_name}')
+                        continue
+                    # 旧パスのファイルは行ごとに別名なので、そのまま削除してよい
+                    storage.FileSystemStorage.delete(storage.blob_storage, old_name)
+                    moved += 1
+
+        verb = '対象' if options['dry_run'] else '移行しました'
+        self.stdout.write(self.style.SUCCESS(f'{moved}件を{verb}（ファイルなし: {missing}件）'))
+        if moved and not options['dry_run']:
+            # 派生画像のパスは実体のパスから決まるので、新しいパスの分を作り直す
+            call_command('generate_image_derivatives', stdout=self.stdout, stderr=self.stderr)
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.3 on 2026-10-17 13:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Blob',
+            fields=[
+                ('name', models.CharField(max_length=100, primary_key=True, serialize=False, verbose_name='パス')),
+                ('sha256', models.CharField(max_length=64, verbose_name='SHA-256')),
+                ('size', models.BigIntegerField(verbose_name='サイズ')),
+                ('refcount', models.PositiveIntegerField(default=0, verbose_name='参照数')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='作成日')),
+            ],
+            options={
+                'verbose_name': 'ファイル実体',
+                'verbose_name_plural': 'ファイル実体',
+            },
+        ),
+    ]
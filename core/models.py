@@ -0,0 +1,17 @@
+from django.db import models
+
+
+class Blob(models.Model):
+    """内容のSHA-256で保存したファイル（同じ内容は1つだけ保存し、参照数で管理）"""
+    name = models.CharField('パス', max_length=100, primary_key=True)
+    sha256 = models.CharField('SHA-256', max_length=64)
+    size = models.BigIntegerField('サイズ')
+    refcount = models.PositiveIntegerField('参照数', default=0)
+    created_at = models.DateTimeField('作成日', auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'ファイル実体'
+        verbose_name_plural = 'ファイル実体'
+
+    def __str__(self):
+        return self.name
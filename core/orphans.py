@@ -0,0 +1,208 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+from django.apps import apps
+from django.conf import settings
+from django.db import models, transaction
+from .images import DERIVATIVE_DIR, DERIVATIVE_SIZES
+from .storage import BlobStorage, is_blob_name
+
+
+# 途中で止めた場所（次回はここから再開する）
+STATE_FILE = getattr(
+    settings, 'MEDIA_GC_STATE_FILE', os.path.join(tempfile.gettempdir(), 'reang-net-media-gc.json')
+)
+# チェックポイントを書き出す間隔（調べたファイル数）
+CHECKPOINT_EVERY = 500
+
+# MEDIA_ROOT 以外で掃除する一時ディレクトリ: [(パス, 使用中のファイル名の集合を返す関数)]
+_directories = []
+
+
+def register_directory(path, live_names):
+    """MEDIA_ROOT の外の一時ディレクトリを掃除の対象にする"""
+    _directories.append((path, live_names))
+
+
+def file_fields():
+    """全モデルの FileField / ImageField"""
+    for model in apps.get_models():
+        for field in model._meta.concrete_fields:
+            if isinstance(field, models.FileField):
+                yield model, field
+
+
+def referenced_names(chunk_size=2000):
+    """DBから参照されているパスの集合（1列だけを少しずつ読む）"""
+    names = set()
+    for model, field in file_fields():
+        rows = model._default_manager.exclude(**{field.attname: ''}).exclude(**{f'{field.attname}__isnull': True})
+        names.update(rows.values_list(field.attname, flat=True).order_by().iterator(chunk_size=chunk_size))
+    return names
+
+
+def is_referenced(name):
+    """削除直前の確認（マークの後に参照された場合に備えて、DBを直接見る）
+
+    実体（blobs/）は保存時に Blob の参照数が増えるので、Blob の行で判定する（collect()）。
+    ここでは BlobStorage 以外のフィールドだけを見る
+    """
+    for model, field in file_fields():
+        if isinstance(field.storage, BlobStorage):
+            continue
+        if model._default_manager.filter(**{field.attname: name}).exists():
+            return True
+    return False
+
+
+def original_name(name):
+    """派生画像のパスなら元画像のパスを返す"""
+    prefix = f'{DERIVATIVE_DIR}/'
+    if not name.startswith(prefix):
+        return name
+    base, size, _ = (name[len(prefix):].rsplit('.', 2) + ['', ''])[:3]
+    return base if size in DERIVATIVE_SIZES else name
+
+
+class OrphanCollector:
+    """参照されていないメディアファイルを探して削除（または隔離）する
+
+    DBの参照をマークしてから MEDIA_ROOT を名前順に走査する。
+    猶予期間より新しいファイルは、保存処理の途中かもしれないので残す
+    """
+
+    def __init__(self, grace_seconds, quarantine=None, dry_run=False, limit=None, rate=None, stdout=None):
+        self.root = os.path.realpath(settings.MEDIA_ROOT)
+        self.state_file = os.path.realpath(STATE_FILE)
+        self.cutoff = time.time() - grace_seconds
+        self.quarantine = os.path.realpath(quarantine) if quarantine else None
+        self.dry_run = dry_run
+        self.limit = limit
+        self.interval = 1 / rate if rate else 0
+        self.stdout = stdout
+        self.stats = {'examined': 0, 'orphaned': 0, 'bytes': 0, 'skipped': 0}
+
+    def load_checkpoint(self):
+        try:
+            with open(STATE_FILE) as state:
+                return tuple(json.load(state)['checkpoint'])
+        except (FileNotFoundError, ValueError, KeyError):
+            return ()
+
+    def save_checkpoint(self, parts):
+        if self.dry_run:
+            return
+        with open(STATE_FILE, 'w') as state:
+            json.dump({'checkpoint': list(parts)}, state)
+
+    def clear_checkpoint(self):
+        if os.path.exists(STATE_FILE) and not self.dry_run:
+            os.remove(STATE_FILE)
+
+    def walk(self, directory, prefix, checkpoint):
+        """(相対パスの要素, DirEntry) を名前順に返す。チェックポイント以前は読み飛ばす"""
+        try:
+            with os.scandir(directory) as scanner:
+                entries = sorted(scanner, key=lambda entry: entry.name)
+        except FileNotFoundError:
+            return
+        for entry in entries:
+            parts = prefix + (entry.name,)
+            if entry.is_dir(follow_symlinks=False):
+                if parts < checkpoint[:len(parts)] or os.path.realpath(entry.path) == self.quarantine:
+                    continue
+                yield from self.walk(entry.path, parts, checkpoint)
+            elif entry.is_file(follow_symlinks=False):
+                if parts > checkpoint and entry.path != self.state_file:
+                    yield parts, entry
+
+    def run(self):
+        """MEDIA_ROOT を走査する。limit に達したら途中の位置を保存して False を返す"""
+        referenced = referenced_names()
+        checkpoint = self.load_checkpoint()
+        last = None
+        for parts, entry in self.walk(self.root, (), checkpoint):
+            if self.limit is not None and self.stats['examined'] >= self.limit:
+                # 1件も調べていなければ前回の位置をそのまま残す
+                if last is not None:
+                    self.save_checkpoint(last)
+                return False
+            self.stats['examined'] += 1
+            last = parts
+            name = '/'.join(parts)
+            if original_name(name) not in referenced:
+                self.collect(name, entry)
+            if self.stats['examined'] % CHECKPOINT_EVERY == 0:
+                self.save_checkpoint(last)
+
+        for path, live_names in _directories:
+            self.collect_directory(path, live_names())
+        self.clear_checkpoint()
+        return True
+
+    def collect(self, name, entry):
+        stat = entry.stat(follow_symlinks=False)
+        if stat.st_mtime > self.cutoff:
+            self.stats['skipped'] += 1
+            return
+        self.stats['orphaned'] += 1
+        if self.dry_run:
+            self.report(name, stat.st_size)
+            return
+        original = original_name(name)
+        with transaction.atomic():
+            if is_blob_name(original):
+                from .models import Blob
+                # 保存と同じ行ロックを取り、その間に参照された実体（とその派生画像）は残す
+                if Blob.objects.select_for_update().filter(name=original, refcount__gt=0).exists():
+                    return
+                if name == original:
+                    Blob.objects.filter(name=name).delete()
+            elif is_referenced(original):
+                return
+            self.remove(entry.path, name)
+        self.report(name, stat.st_size)
+        self.throttle()
+
+    def collect_directory(self, path, live_names):
+        try:
+            with os.scandir(path) as scanner:
+                entries = [entry for entry in scanner if entry.is_file(follow_symlinks=False)]
+        except FileNotFoundError:
+            return
+        for entry in entries:
+            self.stats['examined'] += 1
+            if entry.name in live_names:
+                continue
+            stat = entry.stat(follow_symlinks=False)
+            if stat.st_mtime > self.cutoff:
+                self.stats['skipped'] += 1
+                continue
+            self.stats['orphaned'] += 1
+            if not self.dry_run:
+                self.remove(entry.path, os.path.join(os.path.basename(path), entry.name))
+            self.report(entry.path, stat.st_size)
+            self.throttle()
+
+    def remove(self, path, name):
+        if self.quarantine:
+            target = os.path.join(self.quarantine, name)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.move(path, target)
+        else:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def throttle(self):
+        # 稼働中のサーバーのディスクI/Oを圧迫しないよう、削除の間隔を空ける
+        if self.interval and not self.dry_run:
+            time.sleep(self.interval)
+
+    def report(self, name, size):
+        self.stats['bytes'] += size
+        if self.stdout:
+            self.stdout.write(name)
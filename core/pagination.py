@@ -0,0 +1,130 @@
+import base64
+import binascii
+import json
+from collections import OrderedDict
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """Meta.ordering + id をキーにしたカーソル（キーセット）ページネーション
+
+    OFFSETを使わず「前ページ最後の行より後」を条件に検索するため、深いページでも
+    1ページ目と同じコストで取得できる。cursor か page_size を指定したリクエストだけ
+    ページ分割し、指定が無い場合は従来通り全件を配列で返す。
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    page_size = api_settings.PAGE_SIZE or 50
+    max_page_size = 500
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_ordering(self, queryset, view):
+        """(フィールド名, 降順か) のタプル列。ビューの keyset_ordering を優先"""
+        ordering = getattr(view, 'keyset_ordering', None) or queryset.model._meta.ordering
+        ordering = list(ordering)
+        if not any(field.lstrip('-') in ('id', 'pk') for field in ordering):
+            ordering.append('id')
+        return [(field.lstrip('-'), field.startswith('-')) for field in ordering]
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(page_size, self.max_page_size))
+
+    def decode_cursor(self, encoded):
+        try:
+            return json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+        except (TypeError, ValueError, UnicodeError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, values):
+        data = json.dumps(values, separators=(',', ':'), default=str)
+        return base64.urlsafe_b64encode(data.encode('utf-8')).decode('ascii')
+
+    def after_cursor(self, ordering, values):
+        """カーソル位置より後ろの行を表す条件（NULLは常に末尾に並べる）"""
+        condition = Q(pk__in=[])
+        equal = Q()
+        for (field, descending), value in zip(ordering, values):
+            if value is None:
+                after = Q(pk__in=[])
+                same = Q(**{f'{field}__isnull': True})
+            else:
+                lookup = 'lt' if descending else 'gt'
+                after = Q(**{f'{field}__{lookup}': value}) | Q(**{f'{field}__isnull': True})
+                same = Q(**{field: value})
+            condition |= equal & after
+            equal &= same
+        return condition
+
+    def paginate_queryset(self, queryset, request, view=None):
+        params = request.query_params
+        if self.cursor_query_param not in params and self.page_size_query_param not in params:
+            return None
+
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        ordering = self.get_ordering(queryset, view)
+
+        queryset = queryset.order_by(*[
+            F(field).desc(nulls_last=True) if descending else F(field).asc(nulls_last=True)
+            for field, descending in ordering
+        ])
+
+        encoded = params.get(self.cursor_query_param)
+        if encoded:
+            values = self.decode_cursor(encoded)
+            if not isinstance(values, list) or len(values) != len(ordering):
+                raise NotFound(self.invalid_cursor_message)
+            queryset = queryset.filter(self.after_cursor(ordering, values))
+
+        results = list(queryset[:self.page_size + 1])
+        self.has_next = len(results) > self.page_size
+        results = results[:self.page_size]
+
+        self.next_cursor = None
+        if self.has_next:
+            last = results[-1]
+            self.next_cursor = self.encode_cursor([
+                self._cursor_value(last[field] if isinstance(last, dict) else getattr(last, field))
+                for field, _ in ordering
+            ])
+        return results
+
+    def _cursor_value(self, value):
+        if value is None or isinstance(value, (int, str)):
+            return value
+        if hasattr(value, 'pk'):
+            return value.pk
+        if hasattr(value, 'isoformat'):
+            return value.isoformat()
+        return str(value)
+
+    def get_next_link(self):
+        if not self.next_cursor:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
@@ -0,0 +1,145 @@
+import hashlib
+import os
+import re
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.utils.deconstruct import deconstructible
+from .images import DERIVATIVE_DIR, DERIVATIVE_SIZES, derivative_name
+
+
+BLOB_DIR = 'blobs'
+EXTENSION = re.compile(r'^\.[a-z0-9]{1,10}$')
+
+# register() したモデルとフィールド（既存ファイルの移行で使う）
+registered = []
+
+
+def blob_name(sha256, filename):
+    """blobs/ab/cd/<sha256>.<拡張子> の形のパス（拡張子は派生画像・Content-Typeの判定用に残す）"""
+    extension = os.path.splitext(filename or '')[1].lower()
+    if not EXTENSION.match(extension):
+        extension = ''
+    return f'{BLOB_DIR}/{sha256[:2]}/{sha256[2:4]}/{sha256}{extension}'
+
+
+def is_blob_name(name):
+    return bool(name) and name.startswith(f'{BLOB_DIR}/')
+
+
+def remember_digest(content, sha256, size):
+    """計算済みのハッシュを保存時に使い回す（同じ内容をもう一度読まない）"""
+    content._blob_digest = (sha256, size)
+
+
+def content_digest(content):
+    if getattr(content, '_blob_digest', None):
+        return content._blob_digest
+    digest = hashlib.sha256()
+    size = 0
+    content.seek(0)
+    for chunk in content.chunks():
+        digest.update(chunk)
+        size += len(chunk)
+    content.seek(0)
+    return digest.hexdigest(), size
+
+
+@deconstructible
+class BlobStorage(FileSystemStorage):
+    """内容のSHA-256をパスにして保存するストレージ
+
+    同じ内容のファイルは書き込まずに既存のパスを返し、保存のたびに参照数を1つ増やす。
+    派生画像（derivatives/）は通常どおり指定のパスに保存する
+    """
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if name.startswith(f'{DERIVATIVE_DIR}/'):
+            return super().save(name, content, max_length=max_length)
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+
+        from .models import Blob
+        sha256, size = content_digest(content)
+        name = blob_name(sha256, name)
+        with transaction.atomic():
+            Blob.objects.select_for_update().get_or_create(name=name, defaults={'sha256': sha256, 'size': size})
+            if not self.exists(name):
+                self._save(name, content)
+            Blob.objects.filter(name=name).update(refcount=F('refcount') + 1)
+        return name
+
+    def delete(self, name):
+        # 他から参照されている実体は消さない（参照の解除は release() で行う）
+        if is_blob_name(name):
+            from .models import Blob
+            if Blob.objects.filter(name=name, refcount__gt=0).exists():
+                return
+        super().delete(name)
+
+
+blob_storage = BlobStorage()
+
+
+def retain(name):
+    """保存済みの実体を別の行からも参照する場合に参照数を1つ増やす"""
+    if is_blob_name(name):
+        from .models import Blob
+        Blob.objects.filter(name=name).update(refcount=F('refcount') + 1)
+
+
+def release(name):
+    """参照を1つ外す。参照が無くなった実体はコミット後に削除する"""
+    if not is_blob_name(name):
+        return
+    from .models import Blob
+    if Blob.objects.filter(name=name, refcount__gt=0).update(refcount=F('refcount') - 1):
+        transaction.on_commit(lambda: purge(name))
+
+
+def purge(name):
+    """参照数が0の実体と派生画像を削除（行ロック中に消すので同時の保存と競合しない）"""
+    from .models import Blob
+    with transaction.atomic():
+        deleted, _ = Blob.objects.filter(name=name, refcount=0).delete()
+        if not deleted:
+            return
+        for path in [name] + [derivative_name(name, size) for size in DERIVATIVE_SIZES]:
+            FileSystemStorage.delete(blob_storage, path)
+
+
+def register(model, *field_names):
+    """ファイルの差し替え・削除で、元の実体の参照を外す
+
+    参照数はストレージへの保存時に増えるので、保存済みのパスを別の行に
+    直接代入する場合は retain() で数える
+    """
+
+    def before_save(sender, instance, raw=False, **kwargs):
+        instance._blob_names_before = None
+        if raw or instance._state.adding or instance.pk is None:
+            return
+        instance._blob_names_before = sender._default_manager.filter(pk=instance.pk).values(*field_names).first()
+
+    def after_save(sender, instance, raw=False, **kwargs):
+        before = getattr(instance, '_blob_names_before', None)
+        instance._blob_names_before = None
+        if raw or not before:
+            return
+        for field_name in field_names:
+            if before[field_name] and before[field_name] != getattr(instance, field_name).name:
+                release(before[field_name])
+
+    def after_delete(sender, instance, **kwargs):
+        for field_name in field_names:
+            release(getattr(instance, field_name).name)
+
+    registered.append((model, field_names))
+    uid = f'{model._meta.label}.blobs'
+    pre_save.connect(before_save, sender=model, weak=False, dispatch_uid=uid)
+    post_save.connect(after_save, sender=model, weak=False, dispatch_uid=uid)
+    post_delete.connect(after_delete, sender=model, weak=False, dispatch_uid=uid)
@@ -0,0 +1,259 @@
+import io
+import os
+import shutil
+import tempfile
+import time
+from datetime import date, datetime, timezone as dt_timezone
+from unittest import mock
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db import transaction
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APIClient
+from accounts.models import User
+from customers.models import Customer, Document
+from tasks.models import Task
+from .cache import get_versions
+from .dates import date_range_filter, local_datetime_bounds, month_bounds, years_bounds
+from .images import derivative_name
+from .models import Blob
+from .orphans import OrphanCollector, original_name
+
+
+class ResponseCacheTests(TestCase):
+    """保存・削除のコミットでそのユーザーのキャッシュだけが無効になり、ロールバックでは進まないこと"""
+
+    URL = '/api/tasks/stats/monthly/'
+    PARAMS = {'year': 2026, 'month': 1}
+
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user('owner', 'owner@example.com', 'password')
+        self.other = User.objects.create_user('other', 'other@example.com', 'password')
+
+    def total(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client.get(self.URL, self.PARAMS).json()['total']
+
+    def version(self, user):
+        return get_versions(['tasks'], user.pk)['tasks']
+
+    def add_task(self, user):
+        with self.captureOnCommitCallbacks(execute=True):
+            task = Task.objects.create(owner=user, title='t')
+        # 作成日時を集計対象の月に移す（update() はシグナルを送らない）
+        Task.objects.filter(pk=task.pk).update(created_at='2026-01-10T00:00:00+09:00')
+        return task
+
+    def test_save_and_delete_invalidate_only_that_user(self):
+        Task.objects.create(owner=self.other, title='t')
+        Task.objects.filter(owner=self.other).update(created_at='2026-01-10T00:00:00+09:00')
+        self.assertEqual((self.total(self.owner), self.total(self.other)), (0, 1))
+        other_version = self.version(self.other)
+
+        task = self.add_task(self.owner)
+        self.assertEqual(self.total(self.owner), 1)
+        self.assertEqual(self.version(self.other), other_version)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            task.delete()
+        self.assertEqual(self.total(self.owner), 0)
+        self.assertEqual(self.version(self.other), other_version)
+        # シグナルを送らない update() で変えた他のユーザーの結果は、キャッシュから返り続ける
+        Task.objects.filter(owner=self.other).update(created_at='2025-06-01T00:00:00+09:00')
+        self.assertEqual(self.total(self.other), 1)
+
+    def test_rollback_does_not_bump(self):
+        self.total(self.owner)
+        version = self.version(self.owner)
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            try:
+                with transaction.atomic():
+                    Task.objects.create(owner=self.owner, title='t')
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertEqual(callbacks, [])
+        self.assertEqual(self.version(self.owner), version)
+
+    def test_etag_revalidates_without_queries(self):
+        client = APIClient()
+        client.force_authenticate(self.owner)
+        etag = client.get(self.URL, self.PARAMS)['ETag']
+        with self.assertNumQueries(0):
+            response = client.get(self.URL, self.PARAMS, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        self.add_task(self.owner)
+        response = client.get(self.URL, self.PARAMS, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class DateBoundsTests(SimpleTestCase):
+    """年・月を半開区間に変換するヘルパー（年末の繰り上がり・現地時間の境界・複数年）"""
+
+    def test_month_bounds(self):
+        self.assertEqual(month_bounds(2025, 12), (date(2025, 12, 1), date(2026, 1, 1)))
+        self.assertEqual(month_bounds('2026', '1'), (date(2026, 1, 1), date(2026, 2, 1)))
+        self.assertEqual(month_bounds(2024, 2), (date(2024, 2, 1), date(2024, 3, 1)))
+        self.assertEqual(month_bounds(2026), (date(2026, 1, 1), date(2027, 1, 1)))
+        for year, month in (('x', 1), (2026, 13), (2026, 0), (2026, 'x')):
+            with self.assertRaises(ValidationError):
+                month_bounds(year, month)
+
+    def test_years_bounds(self):
+        self.assertEqual(years_bounds(2024, 2026), (date(2024, 1, 1), date(2027, 1, 1)))
+        self.assertEqual(years_bounds('2025', '2025'), (date(2025, 1, 1), date(2026, 1, 1)))
+
+    def test_date_range_filter(self):
+        self.assertEqual(
+            date_range_filter('date', 2025, 12),
+            {'date__gte': date(2025, 12, 1), 'date__lt': date(2026, 1, 1)},
+        )
+
+    def test_local_datetime_bounds(self):
+        start, end = local_datetime_bounds(2025, 12)
+        # 日本時間の1月1日0時はUTCでは前日の15時
+        self.assertEqual(start, datetime(2025, 11, 30, 15, tzinfo=dt_timezone.utc))
+        self.assertEqual(end, datetime(2025, 12, 31, 15, tzinfo=dt_timezone.utc))
+        with override_settings(TIME_ZONE='UTC'):
+            self.assertEqual(local_datetime_bounds(2025)[1], datetime(2026, 1, 1, tzinfo=dt_timezone.utc))
+        with override_settings(TIME_ZONE='America/New_York'):
+            self.assertEqual(local_datetime_bounds(2026, 1)[0], datetime(2026, 1, 1, 5, tzinfo=dt_timezone.utc))
+
+
+class LocalBoundaryFilterTests(TestCase):
+    """現地時間の境界で範囲検索すると、UTCでは前月の行が今月に入ること"""
+
+    def test_created_at_near_midnight(self):
+        user = User.objects.create_user('owner', 'owner@example.com', 'password')
+        task = Task.objects.create(owner=user, title='t')
+        # 2026-02-01 00:30 (JST)
+        Task.objects.filter(pk=task.pk).update(created_at=datetime(2026, 1, 31, 15, 30, tzinfo=dt_timezone.utc))
+
+        def count(year, month):
+            start, end = local_datetime_bounds(year, month)
+            return Task.objects.filter(created_at__gte=start, created_at__lt=end).count()
+
+        self.assertEqual((count(2026, 1), count(2026, 2)), (0, 1))
+        with override_settings(TIME_ZONE='UTC'):
+            self.assertEqual((count(2026, 1), count(2026, 2)), (1, 0))
+
+
+class OrphanCollectorTests(TestCase):
+    """参照されていないメディアだけを、猶予期間・隔離・途中再開を守って削除すること"""
+
+    DAY = 24 * 3600
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=self.root))
+        self.enterContext(mock.patch('core.orphans.STATE_FILE', os.path.join(self.root, 'gc.json')))
+        # 実際の一時ディレクトリ（分割アップロード）は対象にしない
+        self.enterContext(mock.patch('core.orphans._directories', []))
+        self.user = User.objects.create_user('owner', 'owner@example.com', 'password')
+        self.customer = Customer.objects.create(created_by=self.user, name='顧客')
+
+    def write(self, name, age=DAY * 2):
+        path = os.path.join(self.root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as file:
+            file.write(b'x' * 10)
+        past = time.time() - age
+        os.utime(path, (past, past))
+        return path
+
+    def exists(self, name):
+        return os.path.exists(os.path.join(self.root, name))
+
+    def add_document(self):
+        document = Document.objects.create(customer=self.customer, title='t', file=ContentFile(b'%PDF', name='a.pdf'))
+        path = os.path.join(self.root, document.file.name)
+        past = time.time() - self.DAY * 2
+        os.utime(path, (past, past))
+        return document.file.name
+
+    def collect(self, **kwargs):
+        collector = OrphanCollector(grace_seconds=self.DAY, **kwargs)
+        return collector.run(), collector.stats
+
+    def test_grace_period(self):
+        self.write('old/orphan.pdf')
+        self.write('new/orphan.pdf', age=60)
+        kept = self.add_document()
+
+        finished, stats = self.collect()
+        self.assertTrue(finished)
+        self.assertFalse(self.exists('old/orphan.pdf'))
+        self.assertTrue(self.exists('new/orphan.pdf'))
+        self.assertTrue(self.exists(kept))
+        self.assertEqual((stats['orphaned'], stats['skipped']), (1, 1))
+
+    def test_quarantine(self):
+        quarantine = os.path.join(self.root, 'quarantine')
+        self.write('avatars/old.png')
+        self.collect(quarantine=quarantine)
+        self.assertFalse(self.exists('avatars/old.png'))
+        self.assertTrue(os.path.exists(os.path.join(quarantine, 'avatars/old.png')))
+        # 隔離先は次の走査の対象にしない
+        finished, stats = self.collect(quarantine=quarantine)
+        self.assertEqual(stats['examined'], 0)
+
+    def test_checkpoint_resume(self):
+        for i in range(5):
+            self.write(f'old/{i}.pdf')
+        finished, _ = self.collect(limit=0)
+        self.assertFalse(finished)
+        self.assertFalse(self.exists('gc.json'))
+
+        finished, stats = self.collect(limit=2)
+        self.assertFalse(finished)
+        self.assertEqual(sorted(os.listdir(os.path.join(self.root, 'old'))), ['2.pdf', '3.pdf', '4.pdf'])
+        # 途中で新しく置かれたファイルより前の位置から再開し、調べ直さない
+        self.write('old/0.pdf')
+        finished, stats = self.collect(limit=2)
+        self.assertEqual((finished, stats['examined']), (False, 2))
+        finished, stats = self.collect()
+        self.assertTrue(finished)
+        self.assertEqual(os.listdir(os.path.join(self.root, 'old')), ['0.pdf'])
+        self.assertFalse(self.exists('gc.json'))
+
+    def test_derivatives_follow_their_original(self):
+        kept = self.add_document()
+        self.assertEqual(original_name(derivative_name(kept, 'thumb')), kept)
+        self.write(derivative_name(kept, 'thumb'))
+        self.write(derivative_name('blobs/ab/cd/gone.png', 'thumb'))
+        self.write('derivatives/blobs/ab/cd/gone.png.huge.webp')
+
+        self.collect()
+        self.assertTrue(self.exists(derivative_name(kept, 'thumb')))
+        self.assertFalse(self.exists(derivative_name('blobs/ab/cd/gone.png', 'thumb')))
+        # 派生画像の形でない名前はそのままのパスで判定する
+        self.assertFalse(self.exists('derivatives/blobs/ab/cd/gone.png.huge.webp'))
+
+    def test_reference_after_mark_phase_is_kept(self):
+        blob = self.add_document()
+        self.write('avatars/me.png')
+        User.objects.filter(pk=self.user.pk).update(avatar='avatars/me.png')
+        orphan = self.write('blobs/ff/ff/unreferenced.pdf')
+        Blob.objects.create(name='blobs/ff/ff/unreferenced.pdf', sha256='f' * 64, size=10, refcount=0)
+
+        # マークの時点ではどれも参照されていなかったことにする
+        with mock.patch('core.orphans.referenced_names', return_value=set()):
+            self.collect()
+        self.assertTrue(self.exists(blob))
+        self.assertTrue(self.exists('avatars/me.png'))
+        self.assertFalse(os.path.exists(orphan))
+        self.assertFalse(Blob.objects.filter(name='blobs/ff/ff/unreferenced.pdf').exists())
+
+    def test_command_dry_run(self):
+        self.write('old/orphan.pdf')
+        out = io.StringIO()
+        call_command('collect_orphaned_media', '--dry-run', stdout=out)
+        self.assertTrue(self.exists('old/orphan.pdf'))
+        self.assertIn('1件', out.getvalue())
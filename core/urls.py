@@ -0,0 +1,6 @@
+from django.urls import path
+from . import downloads
+
+urlpatterns = [
+    path('files/<str:token>/', downloads.download, name='file-download'),
+]
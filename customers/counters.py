@@ -0,0 +1,20 @@
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from .models import Customer, Document
+
+
+def adjust_document_count(customer_id, delta):
+    """顧客の書類数に差分を加算（呼び出し側のトランザクション内で実行）"""
+    if customer_id and delta:
+        Customer.objects.filter(pk=customer_id).update(document_count=F('document_count') + delta)
+
+
+def rebuild_document_counts(user_ids=None):
+    """書類テーブルから顧客ごとの書類数を数え直し、更新した顧客数を返す"""
+    counts = Document.objects.filter(customer=OuterRef('pk')).values('customer').annotate(
+        count=Count('pk')
+    ).values('count')
+    customers = Customer.objects.all()
+    if user_ids is not None:
+        customers = customers.filter(created_by_id__in=user_ids)
+    return customers.update(document_count=Coalesce(Subquery(counts), 0))
@@ -0,0 +1,30 @@
+from core import downloads
+from .models import Customer, Document
+
+
+def resolve_document(owner_id, pk):
+    document = Document.objects.filter(
+        pk=pk, customer__created_by_id=owner_id
+    ).only('file', 'original_filename', 'content_type', 'sha256').first()
+    if document is None:
+        return None
+    return {
+        'file': document.file,
+        'filename': document.filename,
+        'content_type': document.content_type,
+        'sha256': document.sha256,
+    }
+
+
+def business_card_resolver(field_name):
+    def resolve(owner_id, pk):
+        customer = Customer.objects.filter(pk=pk, created_by_id=owner_id).only(field_name).first()
+        if customer is None:
+            return None
+        return {'file': getattr(customer, field_name)}
+    return resolve
+
+
+downloads.register('document', resolve_document)
+downloads.register('business-card-front', business_card_resolver('business_card_front'))
+downloads.register('business-card-back', business_card_resolver('business_card_back'))
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from customers.models import Document
+
+
+class Command(BaseCommand):
+    help = '既存の書類ファイルのサイズ・Content-Type・SHA-256・画像サイズを記録します'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='記録済みの書類も計算し直す'
+        )
+
+    def handle(self, *args, **options):
+        documents = Document.objects.exclude(file='')
+        if not options['all']:
+            documents = documents.filter(sha256='')
+
+        updated = missing = 0
+        for document in documents.iterator(chunk_size=200):
+            try:
+                with document.file.open('rb'):
+                    document.set_file_metadata()
+            except (FileNotFoundError, OSError):
+                missing += 1
+                self.stderr.write(f'ファイルが見つかりません: {document.pk} {document.file.name}')
+                continue
+            # 更新日時を変えないよう update() で書き込む
+            Document.objects.filter(pk=document.pk).update(
+                size=document.size,
+                content_type=document.content_type,
+                sha256=document.sha256,
+                width=document.width,
+                height=document.height,
+            )
+            updated += 1
+
+        self.stdout.write(self.style.SUCCESS(f'{updated}件を記録しました（ファイルなし: {missing}件）'))
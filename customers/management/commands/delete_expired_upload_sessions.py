@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from customers.uploads import delete_expired_sessions
+
+
+class Command(BaseCommand):
+    help = '期限切れの分割アップロードのセッションと一時ファイルを削除します'
+
+    def handle(self, *args, **options):
+        count = delete_expired_sessions()
+        self.stdout.write(self.style.SUCCESS(f'{count}件のセッションを削除しました'))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from customers.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = '顧客の検索インデックス（正規化テキスト・n-gram）を作り直します'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            type=int,
+            action='append',
+            dest='user_ids',
+            help='対象ユーザーID（複数指定可、省略時は全ユーザー）'
+        )
+
+    def handle(self, *args, **options):
+        count = rebuild_index(user_ids=options['user_ids'])
+        self.stdout.write(self.style.SUCCESS(f'{count}件の顧客のインデックスを作成しました'))
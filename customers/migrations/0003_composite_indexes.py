@@ -0,0 +1,23 @@
+# Generated by Django 5.2.3 on 2026-10-17 12:46
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0002_customer_created_by'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['created_by', 'created_at'], name='customer_user_created_at'),
+        ),
+        migrations.AddIndex(
+            model_name='document',
+            index=models.Index(fields=['customer', 'created_at'], name='document_customer_created_at'),
+        ),
+    ]
@@ -0,0 +1,106 @@
+# Generated by Django 5.2.3 on 2026-10-17 12:58
+
+import re
+import unicodedata
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+# 作成時点の正規化を写したもの（以後 customers/search.py を変えてもこのマイグレーションは変わらない）
+NAME_FIELDS = ('name', 'name_kana')
+TEXT_FIELDS = ('company_name', 'email')
+PHONE_FIELDS = ('phone', 'mobile')
+WHITESPACE = re.compile(r'\s+')
+NON_DIGIT = re.compile(r'\D')
+KANA_FOLD = {code: code - 0x60 for code in range(ord('ァ'), ord('ヶ') + 1)}
+BATCH_SIZE = 500
+
+
+def normalize(text):
+    text = unicodedata.normalize('NFKC', text or '').lower().translate(KANA_FOLD)
+    return WHITESPACE.sub('', text)
+
+
+def phone_digits(text):
+    return NON_DIGIT.sub('', unicodedata.normalize('NFKC', text or ''))
+
+
+def grams(text):
+    return {text[i:i + n] for n in (1, 2) for i in range(len(text) - n + 1)}
+
+
+def index_values(customer):
+    names = [normalize(getattr(customer, field)) for field in NAME_FIELDS]
+    values = names + [normalize(getattr(customer, field)) for field in TEXT_FIELDS]
+    values += [phone_digits(getattr(customer, field)) for field in PHONE_FIELDS]
+    values = [value for value in values if value]
+    return '\n'.join(names), '\n'.join(values), set().union(*map(grams, values))
+
+
+def build_search_index(apps, schema_editor):
+    """既存の顧客から検索インデックスを作成（顧客 BATCH_SIZE 件ごとに書き込む）"""
+    Customer = apps.get_model('customers', 'Customer')
+    CustomerSearchIndex = apps.get_model('customers', 'CustomerSearchIndex')
+    CustomerSearchGram = apps.get_model('customers', 'CustomerSearchGram')
+
+    def flush(indexes, grams):
+        CustomerSearchIndex.objects.bulk_create(indexes)
+        CustomerSearchGram.objects.bulk_create(grams, batch_size=1000)
+        indexes.clear()
+        grams.clear()
+
+    indexes, batch_grams = [], []
+    fields = ('pk', 'created_by_id') + NAME_FIELDS + TEXT_FIELDS + PHONE_FIELDS
+    for customer in Customer.objects.only(*fields).iterator(chunk_size=BATCH_SIZE):
+        name_text, text, customer_grams = index_values(customer)
+        indexes.append(CustomerSearchIndex(
+            customer_id=customer.pk, created_by_id=customer.created_by_id, name_text=name_text, text=text
+        ))
+        batch_grams.extend(
+            CustomerSearchGram(customer_id=customer.pk, created_by_id=customer.created_by_id, gram=gram)
+            for gram in customer_grams
+        )
+        if len(indexes) >= BATCH_SIZE:
+            flush(indexes, batch_grams)
+    flush(indexes, batch_grams)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0003_composite_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerSearchIndex',
+            fields=[
+                ('customer', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_index', serialize=False, to='customers.customer', verbose_name='顧客')),
+                ('name_text', models.TextField(blank=True, verbose_name='氏名（正規化）')),
+                ('text', models.TextField(blank=True, verbose_name='検索テキスト（正規化）')),
+                ('created_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='作成者')),
+            ],
+            options={
+                'verbose_name': '顧客検索インデックス',
+                'verbose_name_plural': '顧客検索インデックス',
+            },
+        ),
+        migrations.CreateModel(
+            name='CustomerSearchGram',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('gram', models.CharField(max_length=2, verbose_name='n-gram')),
+                ('created_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='作成者')),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_grams', to='customers.customer', verbose_name='顧客')),
+            ],
+            options={
+                'verbose_name': '顧客検索n-gram',
+                'verbose_name_plural': '顧客検索n-gram',
+                'indexes': [models.Index(fields=['created_by', 'gram'], name='customer_search_gram')],
+                'constraints': [models.UniqueConstraint(fields=('customer', 'gram'), name='unique_customer_search_gram')],
+            },
+        ),
+        migrations.RunPython(build_search_index, migrations.RunPython.noop),
+    ]
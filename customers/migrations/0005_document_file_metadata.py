@@ -0,0 +1,38 @@
+# Generated by Django 5.2.3 on 2026-10-17 13:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0004_customer_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='content_type',
+            field=models.CharField(blank=True, max_length=100, verbose_name='Content-Type'),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='height',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='高さ'),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='sha256',
+            field=models.CharField(blank=True, max_length=64, verbose_name='SHA-256'),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='size',
+            field=models.BigIntegerField(blank=True, null=True, verbose_name='サイズ'),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='width',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='幅'),
+        ),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 5.2.3 on 2026-10-17 13:03
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0005_document_file_metadata'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadSession',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('category', models.CharField(choices=[('estimate', '見積書'), ('proposal', '提案書'), ('invoice', '請求書'), ('contract', '契約書'), ('web_data', 'Webサイトデータ'), ('photo', '写真'), ('other', 'その他')], default='other', max_length=20, verbose_name='カテゴリ')),
+                ('title', models.CharField(max_length=200, verbose_name='タイトル')),
+                ('description', models.TextField(blank=True, verbose_name='説明')),
+                ('filename', models.CharField(max_length=255, verbose_name='ファイル名')),
+                ('total_size', models.BigIntegerField(verbose_name='サイズ')),
+                ('chunk_size', models.PositiveIntegerField(verbose_name='チャンクサイズ')),
+                ('sha256', models.CharField(blank=True, max_length=64, verbose_name='SHA-256')),
+                ('status', models.CharField(choices=[('open', '受付中'), ('committed', '登録済み')], default='open', max_length=20, verbose_name='状態')),
+                ('expires_at', models.DateTimeField(verbose_name='有効期限')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='作成日')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新日')),
+                ('created_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='upload_sessions', to=settings.AUTH_USER_MODEL, verbose_name='作成者')),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='upload_sessions', to='customers.customer', verbose_name='顧客')),
+                ('document', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='customers.document', verbose_name='書類')),
+            ],
+            options={
+                'verbose_name': 'アップロードセッション',
+                'verbose_name_plural': 'アップロードセッション',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='UploadChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('index', models.PositiveIntegerField(verbose_name='番号')),
+                ('size', models.PositiveIntegerField(verbose_name='サイズ')),
+                ('sha256', models.CharField(max_length=64, verbose_name='SHA-256')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='受信日')),
+                ('session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chunks', to='customers.uploadsession', verbose_name='セッション')),
+            ],
+            options={
+                'verbose_name': 'アップロードチャンク',
+                'verbose_name_plural': 'アップロードチャンク',
+                'ordering': ['index'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='uploadsession',
+            index=models.Index(fields=['expires_at'], name='upload_session_expires_at'),
+        ),
+        migrations.AddConstraint(
+            model_name='uploadchunk',
+            constraint=models.UniqueConstraint(fields=('session', 'index'), name='unique_upload_chunk'),
+        ),
+    ]
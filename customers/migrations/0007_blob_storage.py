@@ -0,0 +1,47 @@
+# Generated by Django 5.2.3 on 2026-10-17 13:08
+
+import core.storage
+import customers.models
+import os
+from django.db import migrations, models
+
+
+def fill_original_filename(apps, schema_editor):
+    """既存の書類は保存済みのファイル名を元のファイル名として残す"""
+    Document = apps.get_model('customers', 'Document')
+    for document in Document.objects.exclude(file='').only('file').iterator(chunk_size=500):
+        Document.objects.filter(pk=document.pk).update(
+            original_filename=os.path.basename(document.file.name)[:255]
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+        ('customers', '0006_upload_sessions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='original_filename',
+            field=models.CharField(blank=True, max_length=255, verbose_name='元のファイル名'),
+        ),
+        migrations.AlterField(
+            model_name='customer',
+            name='business_card_back',
+            field=models.ImageField(blank=True, null=True, storage=core.storage.BlobStorage(), upload_to=customers.models.business_card_path, verbose_name='名刺（裏）'),
+        ),
+        migrations.AlterField(
+            model_name='customer',
+            name='business_card_front',
+            field=models.ImageField(blank=True, null=True, storage=core.storage.BlobStorage(), upload_to=customers.models.business_card_path, verbose_name='名刺（表）'),
+        ),
+        migrations.AlterField(
+            model_name='document',
+            name='file',
+            field=models.FileField(storage=core.storage.BlobStorage(), upload_to=customers.models.customer_directory_path, verbose_name='ファイル'),
+        ),
+        migrations.RunPython(fill_original_filename, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.3 on 2026-10-17 13:12
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_documents(apps, schema_editor):
+    Customer = apps.get_model('customers', 'Customer')
+    Document = apps.get_model('customers', 'Document')
+    counts = Document.objects.filter(customer=OuterRef('pk')).values('customer').annotate(
+        count=Count('pk')
+    ).values('count')
+    Customer.objects.update(document_count=Coalesce(Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0007_blob_storage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customer',
+            name='document_count',
+            field=models.IntegerField(default=0, editable=False, verbose_name='書類数'),
+        ),
+        migrations.RunPython(count_documents, migrations.RunPython.noop),
+    ]
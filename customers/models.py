@@ -1,6 +1,9 @@
 from django.db import models
 from django.conf import settings
 import os
+import uuid
+from core.files import file_metadata
+from core.storage import blob_storage
 
 def customer_directory_path(instance, filename):
     """顧客ごとのフォルダにファイルを保存"""
@@ -41,8 +44,10 @@ class Customer(models.Model):
     website = models.URLField('Webサイト', blank=True)
     
     # 名刺画像
-    business_card_front = models.ImageField('名刺（表）', upload_to=business_card_path, blank=True, null=True)
-    business_card_back = models.ImageField('名刺（裏）', upload_to=business_card_path, blank=True, null=True)
+    business_card_front = models.ImageField('名刺（表）', upload_to=business_card_path, storage=blob_storage, blank=True, null=True)
+    business_card_back = models.ImageField('名刺（裏）', upload_to=business_card_path, storage=blob_storage, blank=True, null=True)
+    # 書類の作成・削除で更新する件数（一覧で COUNT しないため）
+    document_count = models.IntegerField('書類数', default=0, editable=False)
     
     # メモ
     notes = models.TextField('メモ', blank=True)
@@ -55,6 +60,9 @@ class Customer(models.Model):
         verbose_name = '顧客'
         verbose_name_plural = '顧客'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_by', 'created_at'], name='customer_user_created_at'),
+        ]
 
     def __str__(self):
         if self.company_name:
@@ -82,8 +90,17 @@ class Document(models.Model):
     )
     category = models.CharField('カテゴリ', max_length=20, choices=CATEGORY_CHOICES, default='other')
     title = models.CharField('タイトル', max_length=200)
-    file = models.FileField('ファイル', upload_to=customer_directory_path)
+    file = models.FileField('ファイル', upload_to=customer_directory_path, storage=blob_storage)
+    original_filename = models.CharField('元のファイル名', max_length=255, blank=True)
     description = models.TextField('説明', blank=True)
+
+    # ファイル情報（アップロード時に記録）
+    size = models.BigIntegerField('サイズ', null=True, blank=True)
+    content_type = models.CharField('Content-Type', max_length=100, blank=True)
+    sha256 = models.CharField('SHA-256', max_length=64, blank=True)
+    width = models.PositiveIntegerField('幅', null=True, blank=True)
+    height = models.PositiveIntegerField('高さ', null=True, blank=True)
+
     created_at = models.DateTimeField('登録日', auto_now_add=True)
     updated_at = models.DateTimeField('更新日', auto_now=True)
 
@@ -91,17 +108,165 @@ class Document(models.Model):
         verbose_name = '書類'
         verbose_name_plural = '書類'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['customer', 'created_at'], name='document_customer_created_at'),
+        ]
 
     def __str__(self):
         return f'{self.customer.name} - {self.title}'
     
     @property
     def filename(self):
-        return os.path.basename(self.file.name)
+        # ファイルは内容のハッシュ名で保存されるので、アップロード時の名前を返す
+        return self.original_filename or os.path.basename(self.file.name)
     
     @property
     def file_size(self):
+        # 記録済みのサイズを使い、未記録の古い書類だけストレージに問い合わせる
+        if self.size is not None:
+            return self.size
         try:
             return self.file.size
         except:
-            return 0
\ No newline at end of file
+            return 0
+
+    def set_file_metadata(self):
+        """ファイルのサイズ・Content-Type・SHA-256・画像サイズを記録"""
+        for field, value in file_metadata(self.file).items():
+            setattr(self, field, value)
+
+class CustomerSearchIndex(models.Model):
+    """顧客検索用の正規化済みテキスト（顧客の保存時に更新）"""
+    customer = models.OneToOneField(
+        Customer,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='search_index',
+        verbose_name='顧客'
+    )
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='作成者'
+    )
+    name_text = models.TextField('氏名（正規化）', blank=True)
+    text = models.TextField('検索テキスト（正規化）', blank=True)
+
+    class Meta:
+        verbose_name = '顧客検索インデックス'
+        verbose_name_plural = '顧客検索インデックス'
+
+
+class CustomerSearchGram(models.Model):
+    """顧客検索用のn-gram（1・2文字）"""
+    customer = models.ForeignKey(
+        Customer,
+        on_delete=models.CASCADE,
+        related_name='search_grams',
+        verbose_name='顧客'
+    )
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='作成者'
+    )
+    gram = models.CharField('n-gram', max_length=2)
+
+    class Meta:
+        verbose_name = '顧客検索n-gram'
+        verbose_name_plural = '顧客検索n-gram'
+        constraints = [
+            models.UniqueConstraint(fields=['customer', 'gram'], name='unique_customer_search_gram'),
+        ]
+        indexes = [
+            models.Index(fields=['created_by', 'gram'], name='customer_search_gram'),
+        ]
+
+
+class UploadSession(models.Model):
+    """分割アップロードのセッション（全チャンクが揃ったら書類として登録）"""
+    STATUS_CHOICES = [
+        ('open', '受付中'),
+        ('committed', '登録済み'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='upload_sessions',
+        verbose_name='作成者'
+    )
+
+    # 登録先の書類情報
+    customer = models.ForeignKey(
+        Customer,
+        on_delete=models.CASCADE,
+        related_name='upload_sessions',
+        verbose_name='顧客'
+    )
+    category = models.CharField('カテゴリ', max_length=20, choices=Document.CATEGORY_CHOICES, default='other')
+    title = models.CharField('タイトル', max_length=200)
+    description = models.TextField('説明', blank=True)
+    filename = models.CharField('ファイル名', max_length=255)
+
+    # ファイル全体
+    total_size = models.BigIntegerField('サイズ')
+    chunk_size = models.PositiveIntegerField('チャンクサイズ')
+    sha256 = models.CharField('SHA-256', max_length=64, blank=True)
+
+    status = models.CharField('状態', max_length=20, choices=STATUS_CHOICES, default='open')
+    document = models.ForeignKey(
+        Document,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name='書類'
+    )
+    expires_at = models.DateTimeField('有効期限')
+    created_at = models.DateTimeField('作成日', auto_now_add=True)
+    updated_at = models.DateTimeField('更新日', auto_now=True)
+
+    class Meta:
+        verbose_name = 'アップロードセッション'
+        verbose_name_plural = 'アップロードセッション'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['expires_at'], name='upload_session_expires_at'),
+        ]
+
+    def __str__(self):
+        return f'{self.filename} ({self.get_status_display()})'
+
+    @property
+    def chunk_count(self):
+        return max(1, -(-self.total_size // self.chunk_size))
+
+    def chunk_length(self, index):
+        """index番目のチャンクのバイト数（最後のチャンクは端数）"""
+        return min(self.chunk_size, self.total_size - index * self.chunk_size)
+
+
+class UploadChunk(models.Model):
+    """受信済みのチャンク"""
+    session = models.ForeignKey(
+        UploadSession,
+        on_delete=models.CASCADE,
+        related_name='chunks',
+        verbose_name='セッション'
+    )
+    index = models.PositiveIntegerField('番号')
+    size = models.PositiveIntegerField('サイズ')
+    sha256 = models.CharField('SHA-256', max_length=64)
+    created_at = models.DateTimeField('受信日', auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'アップロードチャンク'
+        verbose_name_plural = 'アップロードチャンク'
+        ordering = ['index']
+        constraints = [
+            models.UniqueConstraint(fields=['session', 'index'], name='unique_upload_chunk'),
+        ]
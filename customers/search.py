@@ -0,0 +1,112 @@
+import re
+import unicodedata
+from django.db import transaction
+from django.db.models import Case, Count, IntegerField, Q, Subquery, Value, When
+from .models import Customer, CustomerSearchIndex, CustomerSearchGram
+
+
+# 検索対象（先頭2つは氏名として順位付けに使う）
+NAME_FIELDS = ('name', 'name_kana')
+TEXT_FIELDS = ('company_name', 'email')
+PHONE_FIELDS = ('phone', 'mobile')
+
+PHONE_QUERY = re.compile(r'[\d\-()+.]*\d[\d\-()+.]*')
+WHITESPACE = re.compile(r'\s+')
+NON_DIGIT = re.compile(r'\D')
+
+# カタカナ（ァ〜ヶ）をひらがなに寄せる
+KANA_FOLD = {code: code - 0x60 for code in range(ord('ァ'), ord('ヶ') + 1)}
+
+
+def normalize(text):
+    """NFKC（全角英数・半角カナの統一）、小文字化、カタカナ→ひらがな、空白除去"""
+    text = unicodedata.normalize('NFKC', text or '').lower().translate(KANA_FOLD)
+    return WHITESPACE.sub('', text)
+
+
+def phone_digits(text):
+    return NON_DIGIT.sub('', unicodedata.normalize('NFKC', text or ''))
+
+
+def query_terms(query):
+    """検索語を空白で区切って正規化（電話番号らしい語は数字だけにする）"""
+    terms = []
+    for word in unicodedata.normalize('NFKC', query or '').split():
+        term = phone_digits(word) if PHONE_QUERY.fullmatch(word) else normalize(word)
+        if term and term not in terms:
+            terms.append(term)
+    return terms
+
+
+def grams(text):
+    """1文字・2文字のn-gram"""
+    return {text[i:i + n] for n in (1, 2) for i in range(len(text) - n + 1)}
+
+
+def index_values(customer):
+    """(氏名部分, 全文, n-gramの集合) を作る。フィールドをまたぐn-gramは作らない"""
+    names = [normalize(getattr(customer, field)) for field in NAME_FIELDS]
+    values = names + [normalize(getattr(customer, field)) for field in TEXT_FIELDS]
+    values += [phone_digits(getattr(customer, field)) for field in PHONE_FIELDS]
+    values = [value for value in values if value]
+    return '\n'.join(names), '\n'.join(values), set().union(*map(grams, values))
+
+
+def update_index(customer):
+    """顧客1件の検索インデックスを作り直す"""
+    name_text, text, customer_grams = index_values(customer)
+    with transaction.atomic():
+        CustomerSearchIndex.objects.update_or_create(
+            customer_id=customer.pk,
+            defaults={'created_by_id': customer.created_by_id, 'name_text': name_text, 'text': text}
+        )
+        CustomerSearchGram.objects.filter(customer_id=customer.pk).delete()
+        CustomerSearchGram.objects.bulk_create([
+            CustomerSearchGram(customer_id=customer.pk, created_by_id=customer.created_by_id, gram=gram)
+            for gram in customer_grams
+        ])
+
+
+def rebuild_index(user_ids=None):
+    """検索インデックスを全件（または指定ユーザー分）作り直し、件数を返す"""
+    customers = Customer.objects.all()
+    if user_ids:
+        customers = customers.filter(created_by_id__in=user_ids)
+    count = 0
+    for customer in customers.iterator(chunk_size=500):
+        update_index(customer)
+        count += 1
+    return count
+
+
+def search(queryset, user, query):
+    """正規化した検索語をすべて含む顧客を、氏名の一致度順に返す
+
+    n-gramのインデックスで候補を絞ってから、正規化済みの全文で語順を確認する
+    """
+    terms = query_terms(query)
+    if not terms:
+        return queryset
+
+    query_grams = set()
+    for term in terms:
+        query_grams |= grams(term) if len(term) < 2 else {term[i:i + 2] for i in range(len(term) - 1)}
+    candidates = CustomerSearchGram.objects.filter(
+        created_by=user, gram__in=query_grams
+    ).values('customer_id').annotate(hits=Count('gram')).filter(hits=len(query_grams))
+
+    queryset = queryset.filter(pk__in=Subquery(candidates.values('customer_id')))
+    rank = Value(0)
+    for term in terms:
+        queryset = queryset.filter(search_index__text__contains=term)
+        rank = rank + Case(
+            # 氏名・カナのどちらかの先頭に一致（name_text は1行1項目）
+            When(
+                Q(search_index__name_text__startswith=term) | Q(search_index__name_text__contains='\n' + term),
+                then=Value(3)
+            ),
+            When(search_index__name_text__contains=term, then=Value(2)),
+            default=Value(1),
+            output_field=IntegerField()
+        )
+    return queryset.annotate(search_rank=rank).order_by('-search_rank', '-created_at')
@@ -1,24 +1,45 @@
 from rest_framework import serializers
-from .models import Customer, Document
+from accounts import usage
+from core import downloads
+from .models import Customer, Document, UploadSession
+from .uploads import MAX_UPLOAD_SIZE, DEFAULT_CHUNK_SIZE, MIN_CHUNK_SIZE, MAX_CHUNK_SIZE
 
 
 class DocumentSerializer(serializers.ModelSerializer):
     filename = serializers.ReadOnlyField()
     file_size = serializers.ReadOnlyField()
     file_url = serializers.SerializerMethodField()
+    image_urls = serializers.SerializerMethodField()
     customer = serializers.PrimaryKeyRelatedField(queryset=Customer.objects.none())
 
     class Meta:
         model = Document
         fields = '__all__'
-        read_only_fields = ('created_at', 'updated_at')
+        read_only_fields = ('size', 'content_type', 'sha256', 'width', 'height', 'created_at', 'updated_at')
+        # ファイルは署名付きの file_url / image_urls で返す（MEDIA_URL は公開しない）
+        extra_kwargs = {'file': {'write_only': True}}
 
     def get_file_url(self, obj):
+        """所有者だけが開ける署名付きのダウンロードURL"""
         request = self.context.get('request')
         if obj.file and request:
-            return request.build_absolute_uri(obj.file.url)
+            # 書類は常にリクエストしたユーザーの顧客のものに絞り込まれている
+            return downloads.signed_url('document', obj.pk, request.user.pk, request)
         return None
 
+    def validate_file(self, value):
+        request = self.context.get('request')
+        if request and not usage.has_room(request.user, value.size):
+            raise serializers.ValidationError('保存容量の上限を超えています')
+        return value
+
+    def get_image_urls(self, obj):
+        """写真のサイズ別URL（写真以外はNone）"""
+        request = self.context.get('request')
+        if obj.category != 'photo' or not request:
+            return None
+        return downloads.derivative_urls('document', obj.pk, request.user.pk, obj.file.name, request)
+
     def __init__(self, *args, **kwargs):
         # Restrict customer choices to those owned by the requesting user
         request = kwargs.get('context', {}).get('request')
@@ -29,8 +50,8 @@ class DocumentSerializer(serializers.ModelSerializer):
 
 class CustomerListSerializer(serializers.ModelSerializer):
     """一覧用（軽量）"""
-    document_count = serializers.SerializerMethodField()
-    created_by = serializers.ReadOnlyField(source='created_by.id')
+    document_count = serializers.ReadOnlyField()
+    created_by = serializers.ReadOnlyField(source='created_by_id')
 
     class Meta:
         model = Customer
@@ -40,30 +61,92 @@ class CustomerListSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ('created_at', 'updated_at')
 
-    def get_document_count(self, obj):
-        return obj.documents.count()
-
 
 class CustomerDetailSerializer(serializers.ModelSerializer):
     """詳細用（書類含む）"""
     documents = DocumentSerializer(many=True, read_only=True)
     business_card_front_url = serializers.SerializerMethodField()
     business_card_back_url = serializers.SerializerMethodField()
-    created_by = serializers.ReadOnlyField(source='created_by.id')
+    business_card_front_urls = serializers.SerializerMethodField()
+    business_card_back_urls = serializers.SerializerMethodField()
+    created_by = serializers.ReadOnlyField(source='created_by_id')
 
     class Meta:
         model = Customer
         fields = '__all__'
         read_only_fields = ('created_by', 'created_at', 'updated_at')
+        # 名刺画像は署名付きの *_url / *_urls で返す
+        extra_kwargs = {
+            'business_card_front': {'write_only': True},
+            'business_card_back': {'write_only': True},
+        }
 
     def get_business_card_front_url(self, obj):
         request = self.context.get('request')
         if obj.business_card_front and request:
-            return request.build_absolute_uri(obj.business_card_front.url)
+            return downloads.signed_url('business-card-front', obj.pk, obj.created_by_id, request)
         return None
 
     def get_business_card_back_url(self, obj):
         request = self.context.get('request')
         if obj.business_card_back and request:
-            return request.build_absolute_uri(obj.business_card_back.url)
-        return None
\ No newline at end of file
+            return downloads.signed_url('business-card-back', obj.pk, obj.created_by_id, request)
+        return None
+
+    def get_business_card_front_urls(self, obj):
+        return downloads.derivative_urls(
+            'business-card-front', obj.pk, obj.created_by_id, obj.business_card_front.name, self.context.get('request')
+        )
+
+    def get_business_card_back_urls(self, obj):
+        return downloads.derivative_urls(
+            'business-card-back', obj.pk, obj.created_by_id, obj.business_card_back.name, self.context.get('request')
+        )
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    """分割アップロードのセッション"""
+    customer = serializers.PrimaryKeyRelatedField(queryset=Customer.objects.none())
+    chunk_size = serializers.IntegerField(
+        min_value=MIN_CHUNK_SIZE, max_value=MAX_CHUNK_SIZE, default=DEFAULT_CHUNK_SIZE
+    )
+    total_size = serializers.IntegerField(min_value=1, max_value=MAX_UPLOAD_SIZE)
+    chunk_count = serializers.ReadOnlyField()
+    received_chunks = serializers.SerializerMethodField()
+
+    class Meta:
+        model = UploadSession
+        fields = [
+            'id', 'customer', 'category', 'title', 'description', 'filename',
+            'total_size', 'chunk_size', 'sha256', 'chunk_count', 'received_chunks',
+            'status', 'document', 'expires_at', 'created_at'
+        ]
+        read_only_fields = ('status', 'document', 'expires_at', 'created_at')
+
+    def __init__(self, *args, **kwargs):
+        request = kwargs.get('context', {}).get('request')
+        super().__init__(*args, **kwargs)
+        if request:
+            self.fields['customer'].queryset = Customer.objects.filter(created_by=request.user)
+
+    def get_received_chunks(self, obj):
+        return list(obj.chunks.values_list('index', flat=True))
+
+    def validate_filename(self, value):
+        # パス区切りを含む名前はファイル名部分だけ使う
+        value = value.replace('\\', '/').rsplit('/', 1)[-1]
+        if not value:
+            raise serializers.ValidationError('filename is required')
+        return value
+
+    def validate_total_size(self, value):
+        request = self.context.get('request')
+        if request and not usage.has_room(request.user, value):
+            raise serializers.ValidationError('保存容量の上限を超えています')
+        return value
+
+    def validate_sha256(self, value):
+        value = value.lower()
+        if value and (len(value) != 64 or any(c not in '0123456789abcdef' for c in value)):
+            raise serializers.ValidationError('sha256 must be 64 hex characters')
+        return value
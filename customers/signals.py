@@ -0,0 +1,66 @@
+import os
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from accounts import usage
+from core import cache, images, orphans, storage
+from .models import Customer, Document
+from . import counters, search, uploads
+
+
+images.register(Customer, 'business_card_front', 'business_card_back')
+images.register(Document, 'file', condition=lambda document: document.category == 'photo')
+
+cache.register(Customer)
+# 容量の計算で元のファイルのサイズを使うので、参照の解除（storage）より先に登録する
+usage.register_count(Customer, 'customer_count')
+usage.register_count(Document, 'document_count', owner='customer__created_by_id')
+usage.register_files(Customer, business_card_front='business_card_bytes', business_card_back='business_card_bytes')
+usage.register_files(Document, owner='customer__created_by_id', file='document_bytes')
+storage.register(Customer, 'business_card_front', 'business_card_back')
+storage.register(Document, 'file')
+orphans.register_directory(uploads.UPLOAD_SESSION_DIR, uploads.live_session_files)
+
+
+@receiver(post_save, sender=Customer)
+def update_search_index(sender, instance, raw=False, **kwargs):
+    """顧客の保存時に検索インデックスを更新"""
+    if raw:
+        return
+    search.update_index(instance)
+
+
+@receiver(pre_save, sender=Document)
+def record_file_metadata(sender, instance, raw=False, **kwargs):
+    """アップロードされたファイルの情報を保存前に記録（画像の向き補正の後）"""
+    if raw or not instance.file or instance.file._committed:
+        return
+    instance.original_filename = os.path.basename(instance.file.name)[:255]
+    instance.set_file_metadata()
+
+
+@receiver(pre_save, sender=Document)
+def remember_document_customer(sender, instance, raw=False, **kwargs):
+    """顧客の付け替えに備えて更新前の顧客を保持"""
+    instance._customer_before = None
+    if raw or instance._state.adding or instance.pk is None:
+        return
+    instance._customer_before = Document.objects.filter(pk=instance.pk).values_list('customer_id', flat=True).first()
+
+
+@receiver(post_save, sender=Document)
+def update_document_count_on_save(sender, instance, created=False, raw=False, **kwargs):
+    """顧客ごとの書類数に書類の作成・付け替えを反映"""
+    if raw:
+        return
+    before = getattr(instance, '_customer_before', None)
+    if created:
+        counters.adjust_document_count(instance.customer_id, 1)
+    elif before and before != instance.customer_id:
+        counters.adjust_document_count(before, -1)
+        counters.adjust_document_count(instance.customer_id, 1)
+
+
+@receiver(post_delete, sender=Document)
+def update_document_count_on_delete(sender, instance, **kwargs):
+    """顧客ごとの書類数に書類の削除を反映"""
+    counters.adjust_document_count(instance.customer_id, -1)
@@ -1,3 +1,381 @@
-from django.test import TestCase
+import hashlib
+import io
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+from unittest import mock
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from accounts.models import User
+from core import downloads
+from .models import Customer, Document, UploadSession
+from . import search
 
-# Create your tests here.
+
+class CustomerQueryCountTests(TestCase):
+    """一覧・詳細のクエリ数が件数に依存しないこと"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('owner', 'owner@example.com', 'password')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def add_customers(self, count):
+        with self.captureOnCommitCallbacks(execute=True):
+            for i in range(count):
+                customer = Customer.objects.create(created_by=self.user, name=f'顧客{i}')
+                for j in range(3):
+                    Document.objects.create(customer=customer, title=f'書類{j}', file=f'customers/{customer.id}/{j}.pdf')
+        return customer
+
+    def count_queries(self, url, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response.json()
+
+    def test_list_query_count_is_constant(self):
+        self.add_customers(2)
+        few, data = self.count_queries('/api/customers/')
+        self.assertEqual([item['document_count'] for item in data], [3, 3])
+
+        self.add_customers(10)
+        many, data = self.count_queries('/api/customers/')
+        self.assertEqual(len(data), 12)
+        self.assertEqual(few, many)
+
+    def test_search_query_count_is_constant(self):
+        self.add_customers(2)
+        few, _ = self.count_queries('/api/customers/', search='顧客')
+        self.add_customers(10)
+        many, data = self.count_queries('/api/customers/', search='顧客')
+        self.assertEqual(len(data), 12)
+        self.assertEqual(few, many)
+
+    def test_detail_query_count_is_constant(self):
+        customer = self.add_customers(1)
+        few, _ = self.count_queries(f'/api/customers/{customer.id}/')
+        with self.captureOnCommitCallbacks(execute=True):
+            for j in range(10):
+                Document.objects.create(customer=customer, title=f'追加{j}', file=f'customers/{customer.id}/x{j}.pdf')
+        many, data = self.count_queries(f'/api/customers/{customer.id}/')
+        self.assertEqual(len(data['documents']), 13)
+        self.assertEqual(few, many)
+
+
+class CustomerSearchTests(TestCase):
+    """表記ゆれ（カナ・全角半角・電話番号の区切り）を吸収し、氏名の先頭一致を上位にすること"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('owner', 'owner@example.com', 'password')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def add(self, name, **fields):
+        return Customer.objects.create(created_by=self.user, name=name, **fields)
+
+    def names(self, query):
+        response = self.client.get('/api/customers/', {'search': query})
+        self.assertEqual(response.status_code, 200)
+        return [item['name'] for item in response.json()]
+
+    def test_normalize(self):
+        self.assertEqual(search.normalize('ヤマダ　タロウ'), 'やまだたろう')
+        self.assertEqual(search.normalize('ﾔﾏﾀﾞ'), 'やまだ')
+        self.assertEqual(search.normalize('ＡＢＣ商事'), 'abc商事')
+        self.assertEqual(search.phone_digits('０９０-1234-5678'), '09012345678')
+        self.assertEqual(search.query_terms('090-1234-5678 ヤマダ'), ['09012345678', 'やまだ'])
+
+    def test_spelling_variants(self):
+        self.add('山田 太郎', name_kana='ヤマダ タロウ', company_name='ＡＢＣ商事', phone='090-1234-5678')
+        self.add('鈴木 花子', name_kana='すずき はなこ', company_name='XYZ Inc.', mobile='03(1234)0000')
+        self.add('佐藤 一郎')
+
+        self.assertEqual(self.names('やまだ'), ['山田 太郎'])
+        self.assertEqual(self.names('スズキ'), ['鈴木 花子'])
+        self.assertEqual(self.names('ｽｽﾞｷ'), ['鈴木 花子'])
+        self.assertEqual(self.names('abc'), ['山田 太郎'])
+        self.assertEqual(self.names('ｘｙｚ'), ['鈴木 花子'])
+        self.assertEqual(self.names('09012345678'), ['山田 太郎'])
+        self.assertEqual(self.names('090-1234-5678'), ['山田 太郎'])
+        self.assertEqual(self.names('0312340000'), ['鈴木 花子'])
+        self.assertEqual(self.names('やまだ 090'), ['山田 太郎'])
+        self.assertEqual(self.names('やまだ すずき'), [])
+
+    def test_name_prefix_ranks_first(self):
+        # 作成が新しい順より一致度を優先する
+        self.add('田中 一郎', name_kana='タナカ イチロウ')
+        self.add('本田中 次郎', name_kana='キタナカ ジロウ')
+        self.add('佐藤 三郎', company_name='たなか商店')
+
+        self.assertEqual(self.names('田中'), ['田中 一郎', '本田中 次郎'])
+        # カナの先頭一致も氏名と同じ扱い
+        self.assertEqual(self.names('たなか'), ['田中 一郎', '本田中 次郎', '佐藤 三郎'])
+        self.assertEqual(self.names('タナカ'), ['田中 一郎', '本田中 次郎', '佐藤 三郎'])
+
+
+MEDIA_ROOT = tempfile.mkdtemp()
+UPLOAD_SESSION_DIR = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+@mock.patch('customers.uploads.UPLOAD_SESSION_DIR', UPLOAD_SESSION_DIR)
+class UploadSessionTests(TestCase):
+    """分割アップロード（順不同・再送・チェックサム・欠けたチャンク・期限切れ）"""
+
+    CHUNK_SIZE = 256 * 1024
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        shutil.rmtree(UPLOAD_SESSION_DIR, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('owner', 'owner@example.com', 'password')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.customer = Customer.objects.create(created_by=self.user, name='顧客')
+        self.content = bytes(range(256)) * 2500
+        self.chunks = [
+            self.content[i:i + self.CHUNK_SIZE] for i in range(0, len(self.content), self.CHUNK_SIZE)
+        ]
+
+    def create_session(self, sha256=None):
+        response = self.client.post('/api/upload-sessions/', {
+            'customer': self.customer.pk,
+            'title': '図面',
+            'filename': 'drawing.pdf',
+            'total_size': len(self.content),
+            'chunk_size': self.CHUNK_SIZE,
+            'sha256': sha256 or hashlib.sha256(self.content).hexdigest(),
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['chunk_count'], len(self.chunks))
+        return response.json()['id']
+
+    def put(self, session_id, index, data, **headers):
+        return self.client.put(
+            f'/api/upload-sessions/{session_id}/chunks/{index}/', data,
+            content_type='application/octet-stream', **headers
+        )
+
+    def commit(self, session_id):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(f'/api/upload-sessions/{session_id}/commit/')
+
+    def test_out_of_order_and_resent_chunks(self):
+        session_id = self.create_session()
+        self.assertEqual(self.put(session_id, 2, self.chunks[2]).status_code, 200)
+        self.assertEqual(self.put(session_id, 0, b'x' * self.CHUNK_SIZE).status_code, 200)
+        self.assertEqual(self.put(session_id, 1, self.chunks[1]).status_code, 200)
+        # 壊れた内容で届いたチャンクは再送で上書きする
+        response = self.put(session_id, 0, self.chunks[0])
+        self.assertEqual(response.json()['received'], 3)
+
+        response = self.commit(session_id)
+        self.assertEqual(response.status_code, 201)
+        document = Document.objects.get(pk=response.json()['id'])
+        with document.file.open('rb') as stored:
+            self.assertEqual(stored.read(), self.content)
+        # 登録済みのセッションをもう一度commitしても同じ書類を返す
+        self.assertEqual(self.commit(session_id).json()['id'], document.pk)
+
+    def test_chunk_checksum_mismatch(self):
+        session_id = self.create_session()
+        response = self.put(session_id, 0, self.chunks[0], HTTP_X_CHUNK_SHA256='0' * 64)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get(f'/api/upload-sessions/{session_id}/').json()['received_chunks'], [])
+
+        # 最後のチャンクは端数の長さでなければならない
+        response = self.put(session_id, len(self.chunks) - 1, self.chunks[0])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('bytes', response.json()['error'])
+
+    def test_file_checksum_mismatch(self):
+        session_id = self.create_session(sha256='f' * 64)
+        for index, chunk in enumerate(self.chunks):
+            self.put(session_id, index, chunk)
+        response = self.commit(session_id)
+        self.assertEqual((response.status_code, response.json()['error']), (400, 'file checksum mismatch'))
+        self.assertFalse(Document.objects.exists())
+
+    def test_commit_with_missing_chunks(self):
+        session_id = self.create_session()
+        self.put(session_id, 0, self.chunks[0])
+        response = self.commit(session_id)
+        self.assertEqual((response.status_code, response.json()['error']), (400, '2 chunks are missing'))
+
+    def test_expired_session_is_rejected(self):
+        session_id = self.create_session()
+        for index, chunk in enumerate(self.chunks[:-1]):
+            self.put(session_id, index, chunk)
+        UploadSession.objects.filter(pk=session_id).update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        self.assertEqual(self.put(session_id, len(self.chunks) - 1, self.chunks[-1]).status_code, 410)
+        self.assertEqual(self.commit(session_id).status_code, 410)
+        self.assertFalse(Document.objects.exists())
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class DocumentDownloadTests(TestCase):
+    """署名付きURLでの書類のダウンロード（添付の強制・セキュリティヘッダー・Range）"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('owner', 'owner@example.com', 'password')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.customer = Customer.objects.create(created_by=self.user, name='顧客')
+
+    def upload(self, name, content, content_type):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/documents/', {
+                'customer': self.customer.pk,
+                'title': name,
+                'file': SimpleUploadedFile(name, content, content_type=content_type),
+            }, format='multipart')
+        self.assertEqual(response.status_code, 201)
+        self.assertNotIn('file', response.json())
+        return response.json()['file_url']
+
+    def download(self, url, **headers):
+        response = APIClient().get(url, **headers)
+        body = b''.join(response.streaming_content) if response.streaming else response.content
+        return response, body
+
+    def test_active_content_is_always_an_attachment(self):
+        for name, content_type in (('page.html', 'text/html'), ('icon.svg', 'image/svg+xml')):
+            response, body = self.download(self.upload(name, b'<script>alert(1)</script>', content_type))
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response['Content-Disposition'].startswith('attachment'))
+            self.assertEqual(response['X-Content-Type-Options'], 'nosniff')
+            self.assertEqual(response['Content-Security-Policy'], 'sandbox')
+
+    def test_pdf_is_inline_and_supports_ranges(self):
+        url = self.upload('見積.pdf', b'%PDF-1.4 0123456789', 'application/pdf')
+        response, body = self.download(url)
+        self.assertTrue(response['Content-Disposition'].startswith('inline'))
+        self.assertEqual(body, b'%PDF-1.4 0123456789')
+
+        response, body = self.download(url, HTTP_RANGE='bytes=-4')
+        self.assertEqual((response.status_code, body, response['Content-Range']), (206, b'6789', 'bytes 15-18/19'))
+
+        # 所有者の確認とファイル名の取得は1クエリ
+        with self.assertNumQueries(1):
+            response, _ = self.download(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.download(url.replace('/api/files/', '/api/files/x'))[0].status_code, 404)
+
+    def test_upload_is_hashed_once(self):
+        # 保存時（BlobStorage）はpre_saveで記録したハッシュを使い、もう一度読まない
+        with mock.patch('core.storage.hashlib') as storage_hashlib:
+            storage_hashlib.sha256.side_effect = AssertionError('hashed twice')
+            self.upload('見積.pdf', b'%PDF-1.4', 'application/pdf')
+        document = Document.objects.get()
+        self.assertEqual(document.sha256, hashlib.sha256(b'%PDF-1.4').hexdigest())
+        self.assertIn(document.sha256, document.file.name)
+
+    def test_accel_redirect_is_quoted(self):
+        url = self.upload('見積.pdf', b'%PDF-1.4', 'application/pdf')
+        document = Document.objects.get()
+        # store_media_as_blobs で移行する前の名前
+        FileSystemStorage().save('customers/1/名刺 1.pdf', ContentFile(b'%PDF-1.4'))
+        Document.objects.filter(pk=document.pk).update(file='customers/1/名刺 1.pdf')
+        with mock.patch('core.downloads.OFFLOAD', 'nginx'):
+            response, _ = self.download(url)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/customers/1/%E5%90%8D%E5%88%BA%201.pdf')
+
+    def test_authenticated_user_must_own_the_url(self):
+        url = self.upload('見積.pdf', b'%PDF-1.4', 'application/pdf')
+        other = User.objects.create_user('other', 'other@example.com', 'password')
+        token = Token.objects.create(user=other)
+
+        session = APIClient()
+        session.force_login(other)
+        self.assertEqual(session.get(url).status_code, 404)
+        self.assertEqual(APIClient().get(url, HTTP_AUTHORIZATION=f'Token {token.key}').status_code, 404)
+        self.assertEqual(APIClient().get(url, HTTP_AUTHORIZATION='Token invalid').status_code, 404)
+        session.force_login(self.user)
+        self.assertEqual(session.get(url).status_code, 200)
+        # 未認証（imgタグ）はURLだけで開ける
+        self.assertEqual(self.download(url)[0].status_code, 200)
+
+    def test_url_expires_after_the_next_period(self):
+        url = self.upload('見積.pdf', b'%PDF-1.4', 'application/pdf')
+        period = downloads.URL_VALID_HOURS * 3600
+        now = time.time()
+        with mock.patch('core.downloads.time.time', return_value=now + period):
+            self.assertEqual(self.download(url)[0].status_code, 200)
+        with mock.patch('core.downloads.time.time', return_value=now + period * 2):
+            self.assertEqual(self.download(url)[0].status_code, 404)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class DocumentMetadataTests(TestCase):
+    """既存の書類のメタデータを backfill_document_metadata で記録し直せること"""
+
+    METADATA = ('size', 'content_type', 'sha256', 'width', 'height')
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('owner', 'owner@example.com', 'password')
+        self.customer = Customer.objects.create(created_by=self.user, name='顧客')
+
+    def metadata(self, document):
+        return Document.objects.filter(pk=document.pk).values(*self.METADATA, 'updated_at').get()
+
+    def run_command(self, *args):
+        out, err = io.StringIO(), io.StringIO()
+        call_command('backfill_document_metadata', *args, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def test_backfill_restores_metadata(self):
+        buffer = io.BytesIO()
+        Image.new('RGB', (40, 30), 'white').save(buffer, format='PNG')
+        image = Document.objects.create(
+            customer=self.customer, title='名刺', file=SimpleUploadedFile('名刺.png', buffer.getvalue(), 'image/png'),
+        )
+        pdf = Document.objects.create(
+            customer=self.customer, title='見積', file=SimpleUploadedFile('見積.pdf', b'%PDF-1.4', 'application/pdf'),
+        )
+        expected = {document.pk: self.metadata(document) for document in (image, pdf)}
+        self.assertEqual(
+            {key: expected[image.pk][key] for key in self.METADATA},
+            {
+                'size': len(buffer.getvalue()), 'content_type': 'image/png',
+                'sha256': hashlib.sha256(buffer.getvalue()).hexdigest(), 'width': 40, 'height': 30,
+            },
+        )
+        self.assertEqual((expected[pdf.pk]['width'], expected[pdf.pk]['content_type']), (None, 'application/pdf'))
+
+        Document.objects.update(size=None, content_type='', sha256='', width=None, height=None)
+        # ファイルが無い書類は読み飛ばす
+        Document.objects.create(customer=self.customer, title='消失', file='customers/1/gone.pdf')
+        out, err = self.run_command()
+        self.assertIn('2件', out)
+        self.assertIn('gone.pdf', err)
+        # 更新日時は変えずに元の値に戻る
+        for document in (image, pdf):
+            self.assertEqual(self.metadata(document), expected[document.pk])
+
+        # 記録済みの書類は --all を付けたときだけ計算し直す
+        Document.objects.filter(pk=pdf.pk).update(size=1)
+        self.run_command()
+        self.assertEqual(self.metadata(pdf)['size'], 1)
+        self.run_command('--all')
+        self.assertEqual(self.metadata(pdf), expected[pdf.pk])
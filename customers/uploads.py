@@ -0,0 +1,169 @@
+import hashlib
+import os
+import tempfile
+from datetime import timedelta
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+from .models import Document, UploadSession, UploadChunk
+
+
+UPLOAD_SESSION_DIR = getattr(
+    settings, 'UPLOAD_SESSION_DIR', os.path.join(tempfile.gettempdir(), 'reang-net-uploads')
+)
+MAX_UPLOAD_SIZE = getattr(settings, 'MAX_UPLOAD_SIZE', 2 * 1024 ** 3)
+DEFAULT_CHUNK_SIZE = 5 * 1024 ** 2
+MIN_CHUNK_SIZE = 256 * 1024
+MAX_CHUNK_SIZE = 50 * 1024 ** 2
+SESSION_LIFETIME = timedelta(hours=24)
+# リクエスト本文を読み込む単位（アップロード1件あたりのメモリ使用量の上限になる）
+READ_SIZE = 64 * 1024
+
+
+class ChunkError(Exception):
+    """チャンクを受け付けられない場合のエラー"""
+
+
+class SessionExpired(ChunkError):
+    """有効期限を過ぎた（一時ファイルが無い）セッション"""
+
+
+class SessionFile(File):
+    """一時ファイルをそのままストレージへ移動させるためのラッパー"""
+
+    def temporary_file_path(self):
+        return self.file.name
+
+
+def session_path(session):
+    return os.path.join(UPLOAD_SESSION_DIR, f'{session.pk}.part')
+
+
+def live_session_files():
+    """セッションが残っている一時ファイルの名前（孤立ファイルの掃除で使う）"""
+    return {f'{pk}.part' for pk in UploadSession.objects.values_list('pk', flat=True).iterator()}
+
+
+def check_expiry(session, now=None):
+    """期限切れのセッションにはチャンクもcommitも受け付けない（削除は次の掃除で行う）"""
+    if session.expires_at <= (now or timezone.now()):
+        raise SessionExpired('upload session has expired')
+
+
+def create_session(user, **fields):
+    session = UploadSession.objects.create(
+        created_by=user,
+        expires_at=timezone.now() + SESSION_LIFETIME,
+        **fields
+    )
+    os.makedirs(UPLOAD_SESSION_DIR, exist_ok=True)
+    # 全体サイズの空ファイルを先に作り、チャンクは順不同で各位置に書き込む
+    with open(session_path(session), 'wb') as part:
+        part.truncate(session.total_size)
+    return session
+
+
+def write_chunk(session, index, stream, length, expected_sha256=None):
+    """リクエスト本文を少しずつ読みながら一時ファイルに書き込み、SHA-256を返す"""
+    check_expiry(session)
+    if not 0 <= index < session.chunk_count:
+        raise ChunkError(f'chunk index must be between 0 and {session.chunk_count - 1}')
+    expected_length = session.chunk_length(index)
+    if length != expected_length:
+        raise ChunkError(f'chunk {index} must be {expected_length} bytes')
+
+    # 再送で上書きする間に失敗しても受信済みとして残らないよう、先に記録を消す
+    UploadChunk.objects.filter(session=session, index=index).delete()
+    digest = hashlib.sha256()
+    remaining = length
+    try:
+        part = open(session_path(session), 'r+b')
+    except FileNotFoundError:
+        raise SessionExpired('upload session has expired')
+    with part:
+        part.seek(index * session.chunk_size)
+        while remaining:
+            data = stream.read(min(READ_SIZE, remaining))
+            if not data:
+                raise ChunkError('request body ended before the chunk was complete')
+            digest.update(data)
+            part.write(data)
+            remaining -= len(data)
+
+    sha256 = digest.hexdigest()
+    if expected_sha256 and expected_sha256.lower() != sha256:
+        raise ChunkError('chunk checksum mismatch')
+
+    UploadChunk.objects.update_or_create(
+        session=session,
+        index=index,
+        defaults={'size': length, 'sha256': sha256}
+    )
+    return sha256
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as part:
+        for data in iter(lambda: part.read(READ_SIZE), b''):
+            digest.update(data)
+    return digest.hexdigest()
+
+
+def commit_session(session):
+    """全チャンクが揃っていれば書類として登録する（登録済みなら同じ書類を返す）"""
+    with transaction.atomic():
+        session = UploadSession.objects.select_for_update().get(pk=session.pk)
+        if session.status == 'committed':
+            return session.document
+        check_expiry(session)
+
+        received = session.chunks.count()
+        if received != session.chunk_count:
+            raise ChunkError(f'{session.chunk_count - received} chunks are missing')
+
+        path = session_path(session)
+        if not os.path.exists(path):
+            raise SessionExpired('upload session has expired')
+        if session.sha256 and file_sha256(path) != session.sha256.lower():
+            raise ChunkError('file checksum mismatch')
+
+        document = Document(
+            customer=session.customer,
+            category=session.category,
+            title=session.title,
+            description=session.description,
+        )
+        with open(path, 'rb') as part:
+            # 保存時のシグナルでファイル情報を記録し、一時ファイルはストレージへ移動する
+            document.file = SessionFile(part, name=session.filename)
+            document.save()
+
+        session.status = 'committed'
+        session.document = document
+        session.save(update_fields=['status', 'document', 'updated_at'])
+        session.chunks.all().delete()
+
+    discard_file(session)
+    return document
+
+
+def discard_file(session):
+    try:
+        os.remove(session_path(session))
+    except FileNotFoundError:
+        pass
+
+
+def delete_expired_sessions(user=None, now=None):
+    """期限切れのセッションと一時ファイルを削除し、件数を返す"""
+    expired = UploadSession.objects.filter(expires_at__lt=now or timezone.now())
+    if user is not None:
+        expired = expired.filter(created_by=user)
+    count = 0
+    for session in expired.iterator():
+        discard_file(session)
+        session.delete()
+        count += 1
+    return count
@@ -1,10 +1,11 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import CustomerViewSet, DocumentViewSet
+from .views import CustomerViewSet, DocumentViewSet, UploadSessionViewSet
 
 router = DefaultRouter()
 router.register(r'customers', CustomerViewSet, basename='customer')
 router.register(r'documents', DocumentViewSet, basename='document')
+router.register(r'upload-sessions', UploadSessionViewSet, basename='upload-session')
 
 urlpatterns = [
     path('', include(router.urls)),
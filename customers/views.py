@@ -1,10 +1,12 @@
-from rest_framework import viewsets, filters, status
+from rest_framework import viewsets, mixins, filters, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
-from django.db.models import Q
-from .models import Customer, Document
-from .serializers import CustomerListSerializer, CustomerDetailSerializer, DocumentSerializer
+from django.db import transaction
+from core.conditional import conditional
+from .models import Customer, Document, UploadSession
+from . import search, uploads
+from .serializers import CustomerListSerializer, CustomerDetailSerializer, DocumentSerializer, UploadSessionSerializer
 
 
 class CustomerViewSet(viewsets.ModelViewSet):
@@ -21,24 +23,51 @@ class CustomerViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         queryset = Customer.objects.filter(created_by=self.request.user)
-        search = self.request.query_params.get('search', None)
+        query = self.request.query_params.get('search', None)
         
-        if search:
-            queryset = queryset.filter(
-                Q(name__icontains=search) |
-                Q(name_kana__icontains=search) |
-                Q(company_name__icontains=search) |
-                Q(email__icontains=search) |
-                Q(phone__icontains=search) |
-                Q(mobile__icontains=search)
-            )
+        if query:
+            # かな・全角半角・電話番号の区切りを無視して検索し、一致度順に並べる
+            queryset = search.search(queryset, self.request.user, query)
         
+        # 書類一覧は行ごとに問い合わせずまとめて取得する（一覧の書類数は document_count 列）
+        if self.action == 'retrieve':
+            queryset = queryset.prefetch_related('documents')
         return queryset
 
+    @property
+    def keyset_ordering(self):
+        if self.request and search.query_terms(self.request.query_params.get('search')):
+            return ['-search_rank', '-created_at']
+        return None
+
+    @transaction.atomic
     def perform_create(self, serializer):
         """ 顧客作成時に自動でcreated_byをセット """
         serializer.save(created_by=self.request.user)
 
+    # 保存・削除と利用量・件数の更新を同じトランザクションで行う
+    @transaction.atomic
+    def perform_update(self, serializer):
+        serializer.save()
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        instance.delete()
+
+    @conditional(lambda view, request: [
+        view.filter_queryset(view.get_queryset()),
+        Document.objects.filter(customer__created_by=request.user),
+    ])
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @conditional(lambda view, request, pk=None: [
+        view.get_queryset().filter(pk=pk),
+        Document.objects.filter(customer__created_by=request.user, customer_id=pk),
+    ])
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
     @action(detail=True, methods=['post'], url_path='upload-business-card')
     def upload_business_card(self, request, pk=None):
         """名刺画像をアップロード"""
@@ -49,7 +78,8 @@ class CustomerViewSet(viewsets.ModelViewSet):
         if 'back' in request.FILES:
             customer.business_card_back = request.FILES['back']
         
-        customer.save()
+        with transaction.atomic():
+            customer.save()
         serializer = self.get_serializer(customer)
         return Response(serializer.data)
 
@@ -73,4 +103,83 @@ class DocumentViewSet(viewsets.ModelViewSet):
         if category:
             queryset = queryset.filter(category=category)
         
-        return queryset
\ No newline at end of file
+        return queryset
+
+    @transaction.atomic
+    def perform_create(self, serializer):
+        serializer.save()
+
+    @transaction.atomic
+    def perform_update(self, serializer):
+        serializer.save()
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        instance.delete()
+
+
+class UploadSessionViewSet(
+    mixins.CreateModelMixin,
+    mixins.RetrieveModelMixin,
+    mixins.ListModelMixin,
+    mixins.DestroyModelMixin,
+    viewsets.GenericViewSet
+):
+    """
+    大きな書類の分割アップロード
+    セッション作成 → チャンクをPUT（順不同・再送可） → commit で書類として登録
+    """
+    serializer_class = UploadSessionSerializer
+
+    def get_queryset(self):
+        return UploadSession.objects.filter(created_by=self.request.user)
+
+    def perform_create(self, serializer):
+        uploads.delete_expired_sessions(user=self.request.user)
+        serializer.instance = uploads.create_session(self.request.user, **serializer.validated_data)
+
+    def perform_destroy(self, instance):
+        uploads.discard_file(instance)
+        instance.delete()
+
+    @action(detail=True, methods=['put'], url_path=r'chunks/(?P<index>\d+)')
+    def chunk(self, request, pk=None, index=None):
+        """チャンクを受信（本文はそのままのバイト列。X-Chunk-SHA256 を付けると検証する）"""
+        session = self.get_object()
+        if session.status != 'open':
+            return Response({'error': 'upload session is already committed'}, status=status.HTTP_409_CONFLICT)
+        
+        try:
+            length = int(request.META.get('CONTENT_LENGTH') or 0)
+            # request.data を使わず本文を少しずつ読み込む
+            sha256 = uploads.write_chunk(
+                session, int(index), request, length, request.headers.get('X-Chunk-SHA256')
+            )
+        except ValueError:
+            return Response({'error': 'invalid Content-Length'}, status=status.HTTP_400_BAD_REQUEST)
+        except uploads.SessionExpired as e:
+            return Response({'error': str(e)}, status=status.HTTP_410_GONE)
+        except uploads.ChunkError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        return Response({
+            'index': int(index),
+            'size': length,
+            'sha256': sha256,
+            'received': session.chunks.count(),
+            'chunk_count': session.chunk_count,
+        })
+
+    @action(detail=True, methods=['post'])
+    def commit(self, request, pk=None):
+        """全チャンクが揃ったセッションを書類として登録"""
+        session = self.get_object()
+        try:
+            document = uploads.commit_session(session)
+        except uploads.SessionExpired as e:
+            return Response({'error': str(e)}, status=status.HTTP_410_GONE)
+        except uploads.ChunkError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        serializer = DocumentSerializer(document, context=self.get_serializer_context())
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import ExpenseCategory, PaymentMethod, Expense, RecurringExpense
+from .models import ExpenseCategory, PaymentMethod, Expense, RecurringExpense, ExpenseMonthlyRollup
 
 
 @admin.register(ExpenseCategory)
@@ -32,4 +32,11 @@ class RecurringExpenseAdmin(admin.ModelAdmin):
     list_display = ['name', 'amount', 'expense_type', 'frequency', 'day_of_month', 'is_active', 'created_by']
     list_filter = ['expense_type', 'frequency', 'is_active', 'created_by']
     search_fields = ['name']
-    ordering = ['day_of_month', 'name']
\ No newline at end of file
+    ordering = ['day_of_month', 'name']
+
+
+@admin.register(ExpenseMonthlyRollup)
+class ExpenseMonthlyRollupAdmin(admin.ModelAdmin):
+    list_display = ['year', 'month', 'expense_type', 'category', 'payment_method', 'total', 'count', 'created_by']
+    list_filter = ['expense_type', 'year', 'created_by']
+    ordering = ['-year', '-month']
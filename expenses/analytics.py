@@ -0,0 +1,162 @@
+from datetime import timedelta
+import numpy as np
+from .models import ExpenseCategory, Expense
+
+
+# 移動平均の期間（日次は7日、週次は4週、月次は3ヶ月）
+ROLLING_WINDOWS = {'daily': 7, 'weekly': 4, 'monthly': 3}
+PERCENTILES = (50, 75, 90, 95, 99)
+EXPENSE_TYPES = [value for value, _ in Expense.EXPENSE_TYPE_CHOICES]
+
+
+def load_columns(queryset):
+    """(日付, 金額, カテゴリID, 区分) の列を1クエリでNumPy配列に読み込む"""
+    rows = list(queryset.order_by().values_list('date', 'amount', 'category_id', 'expense_type'))
+    if not rows:
+        return {
+            'date': np.array([], dtype='datetime64[D]'),
+            'amount': np.array([], dtype=np.int64),
+            'category': np.array([], dtype=np.int64),
+            'expense_type': np.array([], dtype=np.int64),
+        }
+    dates, amounts, categories, expense_types = zip(*rows)
+    type_codes = {value: code for code, value in enumerate(EXPENSE_TYPES)}
+    return {
+        'date': np.array(dates, dtype='datetime64[D]'),
+        'amount': np.array(amounts, dtype=np.int64),
+        # 未分類は -1
+        'category': np.array([-1 if c is None else c for c in categories], dtype=np.int64),
+        'expense_type': np.array([type_codes[t] for t in expense_types], dtype=np.int64),
+    }
+
+
+def bucket_sums(index, amounts, length):
+    """インデックスごとの金額合計（範囲外は捨てる）"""
+    inside = (index >= 0) & (index < length)
+    sums = np.bincount(index[inside], weights=amounts[inside], minlength=length)
+    return np.rint(sums).astype(np.int64)
+
+
+def rolling_mean(values, window):
+    """直近window期間の平均（先頭は揃っている期間だけで平均）"""
+    sums = np.cumsum(values, dtype=np.float64)
+    sums[window:] = sums[window:] - sums[:-window]
+    counts = np.minimum(np.arange(1, len(values) + 1), window)
+    return np.round(sums / counts, 1)
+
+
+def percentiles(values):
+    if not len(values):
+        return {f'p{p}': None for p in PERCENTILES} | {'mean': None, 'max': None}
+    points = np.percentile(values, PERCENTILES)
+    result = {f'p{p}': round(float(v), 1) for p, v in zip(PERCENTILES, points)}
+    result['mean'] = round(float(values.mean()), 1)
+    result['max'] = int(values.max())
+    return result
+
+
+def monday_of(days):
+    """datetime64[D] の配列をその週の月曜日に揃える（1970-01-01は木曜）"""
+    offsets = (days.astype(np.int64) + 3) % 7
+    return days - offsets.astype('timedelta64[D]')
+
+
+def analyze(user, start, end, expense_type=None):
+    """[start, end) の支出を集計する
+
+    前年比と期間先頭の移動平均のため、1年前からまとめて読み込んで計算する
+    """
+    load_start = start.replace(year=start.year - 1)
+    queryset = Expense.objects.filter(created_by=user, date__gte=load_start, date__lt=end)
+    if expense_type:
+        queryset = queryset.filter(expense_type=expense_type)
+    columns = load_columns(queryset)
+    dates, amounts = columns['date'], columns['amount']
+
+    start64 = np.datetime64(start, 'D')
+    end64 = np.datetime64(end, 'D')
+    current = dates >= start64
+
+    # 日次（読み込み開始日からの通し番号で集計し、期間分を切り出す）
+    load64 = np.datetime64(load_start, 'D')
+    offset = int((start64 - load64).astype(np.int64))
+    day_count = int((end64 - load64).astype(np.int64))
+    daily = bucket_sums((dates - load64).astype(np.int64), amounts, day_count)
+    daily_rolling = rolling_mean(daily, ROLLING_WINDOWS['daily'])
+
+    # 週次（月曜始まり）
+    first_week = monday_of(np.array([start64]))[0]
+    load_week = monday_of(np.array([load64]))[0]
+    week_offset = int((first_week - load_week).astype(np.int64)) // 7
+    week_count = int((end64 - 1 - load_week).astype(np.int64)) // 7 + 1
+    weekly = bucket_sums((monday_of(dates) - load_week).astype(np.int64) // 7, amounts, week_count)
+    weekly_rolling = rolling_mean(weekly, ROLLING_WINDOWS['weekly'])
+
+    # 月次（読み込み開始月から。12ヶ月前の値がそのまま前年同月になる）
+    load_month = load64.astype('datetime64[M]')
+    month_count = int(((end64 - 1).astype('datetime64[M]') - load_month).astype(np.int64)) + 1
+    monthly = bucket_sums((dates.astype('datetime64[M]') - load_month).astype(np.int64), amounts, month_count)
+    monthly_rolling = rolling_mean(monthly, ROLLING_WINDOWS['monthly'])
+    previous_year = monthly[:-12]
+    monthly, monthly_rolling = monthly[12:], monthly_rolling[12:]
+    yoy_delta = monthly - previous_year
+    with np.errstate(divide='ignore', invalid='ignore'):
+        yoy_rate = np.where(previous_year > 0, np.round(yoy_delta / previous_year * 100, 1), np.nan)
+    months = np.arange(month_count - 12) + (load_month + 12)
+
+    # 以降は対象期間のみ
+    amounts_now = amounts[current]
+    total = int(amounts_now.sum())
+    type_totals = np.bincount(columns['expense_type'][current], weights=amounts_now, minlength=len(EXPENSE_TYPES))
+
+    category_ids, inverse = np.unique(columns['category'][current], return_inverse=True)
+    category_totals = np.rint(np.bincount(inverse, weights=amounts_now)).astype(np.int64)
+    category_counts = np.bincount(inverse)
+    order = np.argsort(-category_totals, kind='stable')
+    names = dict(
+        ExpenseCategory.objects.filter(id__in=category_ids[category_ids >= 0].tolist()).values_list('id', 'name')
+    )
+
+    daily_now = daily[offset:]
+    return {
+        'start_date': start.isoformat(),
+        'end_date': (end - timedelta(days=1)).isoformat(),
+        'total': total,
+        'count': int(current.sum()),
+        'by_expense_type': {
+            expense_type: int(round(value)) for expense_type, value in zip(EXPENSE_TYPES, type_totals)
+        },
+        'daily': {
+            'dates': np.arange(start64, end64).astype(str).tolist(),
+            'totals': daily_now.tolist(),
+            'rolling_average': daily_rolling[offset:].tolist(),
+        },
+        'weekly': {
+            'weeks': (np.arange(week_count - week_offset) * 7 + first_week).astype(str).tolist(),
+            'totals': weekly[week_offset:].tolist(),
+            'rolling_average': weekly_rolling[week_offset:].tolist(),
+        },
+        'monthly': {
+            'months': months.astype(str).tolist(),
+            'totals': monthly.tolist(),
+            'rolling_average': monthly_rolling.tolist(),
+            'previous_year': previous_year.tolist(),
+            'yoy_delta': yoy_delta.tolist(),
+            'yoy_rate': [None if np.isnan(rate) else float(rate) for rate in yoy_rate],
+        },
+        'by_category': [
+            {
+                'id': None if category_ids[i] < 0 else int(category_ids[i]),
+                'name': names.get(int(category_ids[i]), '未分類'),
+                'total': int(category_totals[i]),
+                'count': int(category_counts[i]),
+                'share': round(float(category_totals[i]) / total * 100, 1) if total else 0,
+            }
+            for i in order
+        ],
+        'percentiles': {
+            'transaction': percentiles(amounts_now),
+            # 支出があった日の合計額
+            'daily': percentiles(daily_now[daily_now > 0]),
+        },
+    }
@@ -4,4 +4,7 @@ from django.apps import AppConfig
 class ExpensesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'expenses'
-    verbose_name = '支出管理'
\ No newline at end of file
+    verbose_name = '支出管理'
+
+    def ready(self):
+        from . import downloads, signals  # noqa: F401
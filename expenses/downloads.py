@@ -0,0 +1,12 @@
+from core import downloads
+from .models import Expense
+
+
+def resolve_receipt(owner_id, pk):
+    expense = Expense.objects.filter(pk=pk, created_by_id=owner_id).only('receipt_image').first()
+    if expense is None:
+        return None
+    return {'file': expense.receipt_image}
+
+
+downloads.register('receipt', resolve_receipt)
@@ -0,0 +1,52 @@
+import csv
+import json
+from rest_framework import renderers
+
+
+EXPORT_FIELDS = [
+    'id', 'date', 'amount', 'expense_type', 'expense_type_display',
+    'category', 'category_name', 'category_icon',
+    'payment_method', 'payment_method_name', 'payment_method_icon',
+    'description', 'memo', 'receipt_image_url',
+    'recurring_expense', 'created_at', 'updated_at'
+]
+
+
+class ExpenseCSVRenderer(renderers.BaseRenderer):
+    """?format=csv 用（本体はStreamingHttpResponseで返し、エラー時のみ使われる）"""
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data, ensure_ascii=False).encode(self.charset)
+
+
+class ExpenseNDJSONRenderer(ExpenseCSVRenderer):
+    """?format=ndjson 用"""
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+
+
+class Echo:
+    """csv.writer 用の書き込み先（書いた行をそのまま返す）"""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(rows):
+    """CSVを1行ずつ生成（Excelで文字化けしないようBOM付き）"""
+    writer = csv.DictWriter(Echo(), fieldnames=EXPORT_FIELDS, restval='', extrasaction='ignore')
+    yield '\ufeff' + writer.writeheader()
+    for row in rows:
+        yield writer.writerow({
+            key: '' if value is None else value
+            for key, value in row.items()
+        })
+
+
+def stream_ndjson(rows):
+    """NDJSON（1行1レコードのJSON）を生成"""
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False) + '\n'
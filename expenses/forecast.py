@@ -0,0 +1,101 @@
+import numpy as np
+from django.db.models import Min, Sum
+from .models import Expense, RecurringExpense
+from .recurring import month_range
+
+
+MAX_FORECAST_MONTHS = 36
+MAX_HISTORY_MONTHS = 24
+EXPENSE_TYPES = [value for value, _ in RecurringExpense.EXPENSE_TYPE_CHOICES]
+
+
+def add_months(day, months):
+    """月初日に月数を足す"""
+    index = day.year * 12 + day.month - 1 + months
+    return day.replace(year=index // 12, month=index % 12 + 1, day=1)
+
+
+def recurring_matrix(user, month_numbers):
+    """有効な固定費を (区分, 月) の金額行列に展開する（頻度ごとにまとめて計算）"""
+    totals = np.zeros((len(EXPENSE_TYPES), len(month_numbers)), dtype=np.int64)
+    counts = np.zeros(len(month_numbers), dtype=np.int64)
+    items = list(RecurringExpense.objects.filter(created_by=user, is_active=True))
+    if not items:
+        return totals, counts
+
+    type_codes = {value: code for code, value in enumerate(EXPENSE_TYPES)}
+    amounts = np.array([item.amount for item in items], dtype=np.int64)
+    types = np.array([type_codes[item.expense_type] for item in items], dtype=np.int64)
+    yearly = np.array([item.frequency == 'yearly' for item in items])
+    billing_months = np.array([item.billing_month if item.frequency == 'yearly' else 0 for item in items])
+
+    # 毎月: 区分ごとの合計を全月に足す
+    monthly = ~yearly
+    totals += np.bincount(types[monthly], weights=amounts[monthly], minlength=len(EXPENSE_TYPES)).astype(np.int64)[:, None]
+    counts += int(monthly.sum())
+
+    # 毎年: (区分, 支払月) の表を作り、予測月の月番号で引く
+    by_month = np.zeros((len(EXPENSE_TYPES), 13), dtype=np.int64)
+    np.add.at(by_month, (types[yearly], billing_months[yearly]), amounts[yearly])
+    totals += by_month[:, month_numbers]
+    counts += np.bincount(billing_months[yearly], minlength=13)[month_numbers]
+    return totals, counts
+
+
+def variable_average(user, start, end):
+    """[start, end) の固定費以外の支出の月平均（区分別）
+
+    データが期間の途中から始まる場合は、最初の支出の月から平均する
+    """
+    rows = list(
+        Expense.objects.filter(
+            created_by=user, recurring_expense__isnull=True, date__gte=start, date__lt=end
+        ).values('expense_type').annotate(total=Sum('amount'), first=Min('date')).order_by()
+    )
+    averages = np.zeros(len(EXPENSE_TYPES), dtype=np.int64)
+    if not rows:
+        return averages
+    first = min(row['first'] for row in rows)
+    months = (end.year * 12 + end.month) - (first.year * 12 + first.month)
+    type_codes = {value: code for code, value in enumerate(EXPENSE_TYPES)}
+    for row in rows:
+        averages[type_codes[row['expense_type']]] = round(row['total'] / months)
+    return averages
+
+
+def forecast(user, start, months, history_months):
+    """start の月から months ヶ月分の支出見込み（行は作成しない）
+
+    固定費の展開と、直前 history_months ヶ月の変動費の平均を合算する
+    """
+    last = add_months(start, months - 1)
+    month_starts = month_range(start.year, start.month, last.year, last.month)
+    month_numbers = np.array([day.month for day in month_starts], dtype=np.int64)
+
+    recurring, occurrences = recurring_matrix(user, month_numbers)
+    variable = variable_average(user, add_months(start, -history_months), start)
+    projected = recurring + variable[:, None]
+
+    result = []
+    for i, day in enumerate(month_starts):
+        by_type = dict(zip(EXPENSE_TYPES, projected[:, i].tolist()))
+        result.append({
+            'year': day.year,
+            'month': day.month,
+            'recurring_total': int(recurring[:, i].sum()),
+            'recurring_count': int(occurrences[i]),
+            'variable_total': int(variable.sum()),
+            'personal_total': by_type.get('personal', 0),
+            'business_total': by_type.get('business', 0),
+            'total': int(projected[:, i].sum()),
+        })
+
+    return {
+        'start_year': start.year,
+        'start_month': start.month,
+        'months': months,
+        'history_months': history_months,
+        'variable_average': dict(zip(EXPENSE_TYPES, variable.tolist())),
+        'forecast': result,
+        'total': int(projected.sum()),
+    }
@@ -0,0 +1,231 @@
+import codecs
+import csv
+import re
+from collections import Counter
+from datetime import datetime
+from django.db import transaction
+from accounts import usage
+from core.cache import bump_version
+from .models import ExpenseCategory, PaymentMethod, Expense
+from . import rollups
+
+
+IMPORT_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 100
+
+# 列名の別名（先に見つかったものを使う）。カード・銀行明細の一般的な列名も受け付ける
+COLUMN_ALIASES = {
+    'date': ('date', '日付', '利用日', 'ご利用日', '取引日'),
+    'amount': ('amount', '金額', '利用金額', 'ご利用金額', '支払金額', 'お支払金額'),
+    'description': ('description', '内容', '摘要', '利用店名', 'ご利用店名', 'ご利用先'),
+    'expense_type': ('expense_type', '区分'),
+    'category': ('category_name', 'カテゴリ'),
+    'payment_method': ('payment_method_name', '支払方法'),
+    'memo': ('memo', 'メモ', '備考'),
+}
+DATE_FORMATS = ('%Y-%m-%d', '%Y/%m/%d', '%Y.%m.%d', '%Y年%m月%d日')
+AMOUNT_STRIP = re.compile(r'[,，¥￥円\s]')
+
+
+class ImportFormatError(Exception):
+    """CSV全体を読み込めない場合のエラー"""
+
+
+def detect_encoding(upload):
+    """UTF-8（BOM付き含む）として読めなければShift_JIS（CP932）とみなす"""
+    head = next(upload.chunks(), b'')
+    upload.seek(0)
+    if head.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    try:
+        codecs.getincrementaldecoder('utf-8')().decode(head, final=False)
+    except UnicodeDecodeError:
+        return 'cp932'
+    return 'utf-8'
+
+
+def parse_date(value):
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, date_format).date()
+        except ValueError:
+            continue
+    raise ValueError(f'日付の形式が正しくありません: {value}')
+
+
+def parse_amount(value):
+    try:
+        amount = int(AMOUNT_STRIP.sub('', value))
+    except ValueError:
+        raise ValueError(f'金額が数値ではありません: {value}')
+    if amount <= 0:
+        raise ValueError(f'金額は1以上で指定してください: {value}')
+    return amount
+
+
+class ExpenseImporter:
+    """明細CSVをバッチ単位で検証・一括登録する"""
+
+    def __init__(self, user, default_expense_type='personal', dry_run=False):
+        self.user = user
+        self.default_expense_type = default_expense_type
+        self.dry_run = dry_run
+        self.expense_types = dict(Expense.EXPENSE_TYPE_CHOICES)
+        self.expense_type_labels = {label: value for value, label in Expense.EXPENSE_TYPE_CHOICES}
+        self.categories = {}
+        self.payment_methods = {}
+        self.created = 0
+        self.skipped = 0
+        self.errors = []
+        self.error_count = 0
+        self.unresolved = {'category': set(), 'payment_method': set()}
+        # この取り込みで登録した (日付, 金額, 内容) の件数
+        self.imported = Counter()
+
+    def iter_lines(self, upload, encoding):
+        for line in upload:
+            yield line.decode(encoding)
+
+    def resolve_columns(self, header):
+        columns = {}
+        for field, aliases in COLUMN_ALIASES.items():
+            for alias in aliases:
+                if alias in header:
+                    columns[field] = alias
+                    break
+        missing = [field for field in ('date', 'amount', 'description') if field not in columns]
+        if missing:
+            raise ImportFormatError(f'必須の列がありません: {", ".join(missing)}')
+        return columns
+
+    def add_error(self, line_number, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line_number, 'error': message})
+
+    def parse_row(self, line_number, row, columns):
+        def value(field):
+            column = columns.get(field)
+            return (row.get(column) or '').strip() if column else ''
+
+        try:
+            expense_type = value('expense_type') or self.default_expense_type
+            expense_type = self.expense_type_labels.get(expense_type, expense_type)
+            if expense_type not in self.expense_types:
+                raise ValueError(f'区分が正しくありません: {expense_type}')
+            description = value('description')
+            if not description:
+                raise ValueError('内容が空です')
+            return {
+                'date': parse_date(value('date')),
+                'amount': parse_amount(value('amount')),
+                'description': description[:200],
+                'expense_type': expense_type,
+                'category': value('category'),
+                'payment_method': value('payment_method'),
+                'memo': value('memo'),
+            }
+        except ValueError as e:
+            self.add_error(line_number, str(e))
+            return None
+
+    def resolve_names(self, cache, model, names, kind):
+        """バッチ内の未解決の名前をまとめて1クエリで引く"""
+        unknown = {name for name in names if name and name not in cache}
+        if unknown:
+            found = dict(
+                model.objects.filter(created_by=self.user, name__in=unknown).values_list('name', 'id')
+            )
+            for name in unknown:
+                cache[name] = found.get(name)
+                if name not in found:
+                    self.unresolved[kind].add(name)
+
+    def existing_fingerprints(self, rows):
+        """バッチと同じ (日付, 金額, 内容) の既存支出を件数つきで取得
+
+        (所有者, 日付) のインデックスで日付だけで絞り、金額・内容はバッチの組と突き合わせる。
+        この取り込みで先に作成した行は既存に含めない（ファイル内の同じ明細はすべて登録する）
+        """
+        fingerprints = {(row['date'], row['amount'], row['description']) for row in rows}
+        existing = Counter(
+            fingerprint
+            for fingerprint in Expense.objects.filter(
+                created_by=self.user,
+                date__in={row['date'] for row in rows}
+            ).values_list('date', 'amount', 'description').iterator()
+            if fingerprint in fingerprints
+        )
+        existing.subtract(self.imported)
+        return existing
+
+    def import_batch(self, rows):
+        if not rows:
+            return
+        self.resolve_names(self.categories, ExpenseCategory, {row['category'] for row in rows}, 'category')
+        self.resolve_names(self.payment_methods, PaymentMethod, {row['payment_method'] for row in rows}, 'payment_method')
+
+        existing = self.existing_fingerprints(rows)
+        new_expenses = []
+        for row in rows:
+            fingerprint = (row['date'], row['amount'], row['description'])
+            if existing[fingerprint] > 0:
+                # 同じ明細を再取り込みした場合は既存の件数分だけ読み飛ばす
+                existing[fingerprint] -= 1
+                self.skipped += 1
+                continue
+            self.imported[fingerprint] += 1
+            new_expenses.append(Expense(
+                created_by=self.user,
+                date=row['date'],
+                amount=row['amount'],
+                expense_type=row['expense_type'],
+                category_id=self.categories.get(row['category']),
+                payment_method_id=self.payment_methods.get(row['payment_method']),
+                description=row['description'],
+                memo=row['memo'],
+            ))
+
+        if self.dry_run:
+            self.created += len(new_expenses)
+            return
+        with transaction.atomic():
+            created = Expense.objects.bulk_create(new_expenses)
+            rollups.apply_created(created)
+            usage.add(self.user.id, expense_count=len(created))
+            bump_version('expenses', self.user.id)
+        self.created += len(created)
+
+    def run(self, upload, encoding=None):
+        encoding = encoding or detect_encoding(upload)
+        try:
+            reader = csv.DictReader(self.iter_lines(upload, encoding))
+            header = reader.fieldnames or []
+        except (UnicodeDecodeError, csv.Error) as e:
+            raise ImportFormatError(f'CSVを読み込めません: {e}')
+        columns = self.resolve_columns([name.strip() for name in header])
+        reader.fieldnames = [name.strip() for name in header]
+
+        batch = []
+        try:
+            for row in reader:
+                parsed = self.parse_row(reader.line_num, row, columns)
+                if parsed:
+                    batch.append(parsed)
+                if len(batch) >= IMPORT_BATCH_SIZE:
+                    self.import_batch(batch)
+                    batch = []
+        except (UnicodeDecodeError, csv.Error) as e:
+            # 途中で読めなくなった場合はそこまでの行を取り込んで終了する
+            self.add_error(reader.line_num, f'以降の行を読み込めません: {e}')
+        self.import_batch(batch)
+
+        return {
+            'created': self.created,
+            'skipped_duplicates': self.skipped,
+            'error_count': self.error_count,
+            'errors': self.errors,
+            'unresolved_categories': sorted(self.unresolved['category'])[:MAX_REPORTED_ERRORS],
+            'unresolved_payment_methods': sorted(self.unresolved['payment_method'])[:MAX_REPORTED_ERRORS],
+            'dry_run': self.dry_run,
+        }
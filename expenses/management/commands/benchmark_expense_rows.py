@@ -0,0 +1,97 @@
+import time
+from datetime import date, timedelta
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory
+from expenses.models import ExpenseCategory, PaymentMethod, Expense
+from expenses.rows import ExpenseRowBuilder
+from expenses.serializers import ExpenseSerializer
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'ExpenseSerializer と values() ベースの高速パスの1行あたりのコストを比較します（データはロールバック）'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            default='1000,10000,100000',
+            help='計測する件数（カンマ区切り）'
+        )
+        parser.add_argument(
+            '--receipt-every',
+            type=int,
+            default=0,
+            help='N件ごとにレシート画像のパスを設定（0なら設定しない）'
+        )
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['sizes'].split(',')]
+        try:
+            with transaction.atomic():
+                self.run(sizes, options['receipt_every'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, sizes, receipt_every):
+        user = get_user_model().objects.create_user(username='__benchmark__', password=None)
+        categories = [
+            ExpenseCategory.objects.create(created_by=user, name=f'カテゴリ{i}')
+            for i in range(10)
+        ]
+        methods = [
+            PaymentMethod.objects.create(created_by=user, name=f'支払方法{i}')
+            for i in range(5)
+        ]
+        request = APIRequestFactory().get('/api/expenses/expenses/')
+        request.user = user
+        renderer = JSONRenderer()
+
+        self.stdout.write(f'{"rows":>8} {"serializer µs/row":>18} {"fast path µs/row":>17} {"speedup":>8} identical')
+        created = 0
+        for size in sorted(sizes):
+            Expense.objects.bulk_create(
+                [
+                    Expense(
+                        created_by=user,
+                        date=date(2020, 1, 1) + timedelta(days=i % 2000),
+                        amount=100 + i % 5000,
+                        expense_type='business' if i % 3 == 0 else 'personal',
+                        category=categories[i % 10] if i % 7 else None,
+                        payment_method=methods[i % 5] if i % 4 else None,
+                        description=f'明細 {i}',
+                        receipt_image=(
+                            f'expenses/{user.id}/receipts/{i}.jpg'
+                            if receipt_every and i % receipt_every == 0 else None
+                        ),
+                    )
+                    for i in range(created, size)
+                ],
+                batch_size=2000
+            )
+            created = size
+            queryset = Expense.objects.filter(created_by=user)
+
+            started = time.perf_counter()
+            serialized = ExpenseSerializer(
+                queryset.select_related('category', 'payment_method'),
+                many=True,
+                context={'request': request}
+            ).data
+            serializer_elapsed = time.perf_counter() - started
+
+            started = time.perf_counter()
+            rows = list(ExpenseRowBuilder(request).iter_rows(queryset))
+            fast_elapsed = time.perf_counter() - started
+
+            identical = renderer.render(serialized) == renderer.render(rows)
+            self.stdout.write(
+                f'{size:>8} {serializer_elapsed / size * 1e6:>18.1f} {fast_elapsed / size * 1e6:>17.1f} '
+                f'{serializer_elapsed / fast_elapsed:>7.1f}x {identical}'
+            )
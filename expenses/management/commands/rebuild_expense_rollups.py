@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from expenses.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = '支出テーブルから月次集計（ExpenseMonthlyRollup）を作り直します'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            type=int,
+            action='append',
+            dest='user_ids',
+            help='対象ユーザーID（複数指定可、省略時は全ユーザー）'
+        )
+
+    def handle(self, *args, **options):
+        count = rebuild_rollups(user_ids=options['user_ids'])
+        self.stdout.write(self.style.SUCCESS(f'{count}件の集計行を作成しました'))
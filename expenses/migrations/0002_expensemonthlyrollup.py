@@ -0,0 +1,74 @@
+# Generated by Django 5.2.3 on 2026-10-17 12:43
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import ExtractMonth, ExtractYear
+
+
+def build_rollups(apps, schema_editor):
+    """既存の支出から月次集計を作成"""
+    Expense = apps.get_model('expenses', 'Expense')
+    ExpenseMonthlyRollup = apps.get_model('expenses', 'ExpenseMonthlyRollup')
+
+    grouped = Expense.objects.annotate(
+        rollup_year=ExtractYear('date'),
+        rollup_month=ExtractMonth('date')
+    ).values(
+        'created_by_id', 'rollup_year', 'rollup_month',
+        'expense_type', 'category_id', 'payment_method_id'
+    ).annotate(
+        rollup_total=Sum('amount'),
+        rollup_count=Count('id')
+    ).order_by()
+
+    ExpenseMonthlyRollup.objects.bulk_create(
+        [
+            ExpenseMonthlyRollup(
+                created_by_id=row['created_by_id'],
+                year=row['rollup_year'],
+                month=row['rollup_month'],
+                expense_type=row['expense_type'],
+                category_id=row['category_id'],
+                payment_method_id=row['payment_method_id'],
+                total=row['rollup_total'],
+                count=row['rollup_count'],
+            )
+            for row in grouped
+        ],
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExpenseMonthlyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveSmallIntegerField(verbose_name='年')),
+                ('month', models.PositiveSmallIntegerField(verbose_name='月')),
+                ('expense_type', models.CharField(choices=[('personal', '個人'), ('business', '会社')], max_length=20, verbose_name='区分')),
+                ('total', models.BigIntegerField(default=0, verbose_name='合計金額')),
+                ('count', models.IntegerField(default=0, verbose_name='件数')),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='expenses.expensecategory', verbose_name='カテゴリ')),
+                ('created_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='expense_rollups', to=settings.AUTH_USER_MODEL, verbose_name='作成者')),
+                ('payment_method', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='expenses.paymentmethod', verbose_name='支払方法')),
+            ],
+            options={
+                'verbose_name': '支出月次集計',
+                'verbose_name_plural': '支出月次集計',
+                'ordering': ['year', 'month'],
+                'indexes': [models.Index(fields=['created_by', 'year', 'month'], name='expense_rollup_user_month')],
+                'constraints': [models.UniqueConstraint(fields=('created_by', 'year', 'month', 'expense_type', 'category', 'payment_method'), name='unique_expense_rollup_key', nulls_distinct=False)],
+            },
+        ),
+        migrations.RunPython(build_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.3 on 2026-10-17 12:45
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_generated_for(apps, schema_editor):
+    """固定費から生成済みの支出に対象月を設定（同じ月の重複は古い1件のみ）"""
+    Expense = apps.get_model('expenses', 'Expense')
+    seen = set()
+    updated = []
+    rows = Expense.objects.filter(
+        recurring_expense__isnull=False
+    ).order_by('id').only('id', 'recurring_expense_id', 'date')
+    for expense in rows.iterator():
+        month_start = expense.date.replace(day=1)
+        key = (expense.recurring_expense_id, month_start)
+        if key in seen:
+            continue
+        seen.add(key)
+        expense.generated_for = month_start
+        updated.append(expense)
+    Expense.objects.bulk_update(updated, ['generated_for'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0002_expensemonthlyrollup'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='expense',
+            name='generated_for',
+            field=models.DateField(blank=True, null=True, verbose_name='生成対象月'),
+        ),
+        migrations.AddField(
+            model_name='recurringexpense',
+            name='month_of_year',
+            field=models.PositiveSmallIntegerField(blank=True, null=True, verbose_name='支払月'),
+        ),
+        migrations.RunPython(fill_generated_for, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='expense',
+            constraint=models.UniqueConstraint(fields=('recurring_expense', 'generated_for'), name='unique_recurring_expense_month'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.3 on 2026-10-17 13:08
+
+import core.storage
+import expenses.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0004_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='expense',
+            name='receipt_image',
+            field=models.ImageField(blank=True, null=True, storage=core.storage.BlobStorage(), upload_to=expenses.models.receipt_image_path, verbose_name='レシート画像'),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.3 on 2026-10-17 13:34
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+KEY_FIELDS = ('created_by_id', 'year', 'month', 'expense_type', 'category_id', 'payment_method_id')
+
+
+def merge_duplicate_rollups(apps, schema_editor):
+    """NULLを含むキーで重複した集計行を1行にまとめる"""
+    ExpenseMonthlyRollup = apps.get_model('expenses', 'ExpenseMonthlyRollup')
+    duplicates = ExpenseMonthlyRollup.objects.values(*KEY_FIELDS).annotate(
+        rows=Count('id'), keep=Min('id'), merged_total=Sum('total'), merged_count=Sum('count')
+    ).filter(rows__gt=1).order_by()
+
+    for row in list(duplicates):
+        key = {field: row[field] for field in KEY_FIELDS}
+        ExpenseMonthlyRollup.objects.filter(**key).exclude(pk=row['keep']).delete()
+        ExpenseMonthlyRollup.objects.filter(pk=row['keep']).update(
+            total=row['merged_total'], count=row['merged_count']
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0005_receipt_blob_storage'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_rollups, migrations.RunPython.noop),
+        migrations.RemoveConstraint(
+            model_name='expensemonthlyrollup',
+            name='unique_expense_rollup_key',
+        ),
+        migrations.AddConstraint(
+            model_name='expensemonthlyrollup',
+            constraint=models.UniqueConstraint(fields=('created_by', 'year', 'month', 'expense_type', 'category', 'payment_method'), name='unique_expense_rollup_key'),
+        ),
+        migrations.AddConstraint(
+            model_name='expensemonthlyrollup',
+            constraint=models.UniqueConstraint(condition=models.Q(('category__isnull', True), ('payment_method__isnull', False)), fields=('created_by', 'year', 'month', 'expense_type', 'payment_method'), name='unique_expense_rollup_no_category'),
+        ),
+        migrations.AddConstraint(
+            model_name='expensemonthlyrollup',
+            constraint=models.UniqueConstraint(condition=models.Q(('category__isnull', False), ('payment_method__isnull', True)), fields=('created_by', 'year', 'month', 'expense_type', 'category'), name='unique_expense_rollup_no_payment'),
+        ),
+        migrations.AddConstraint(
+            model_name='expensemonthlyrollup',
+            constraint=models.UniqueConstraint(condition=models.Q(('category__isnull', True), ('payment_method__isnull', True)), fields=('created_by', 'year', 'month', 'expense_type'), name='unique_expense_rollup_unclassified'),
+        ),
+    ]
@@ -1,6 +1,10 @@
-from django.db import models
+from django.db import models, transaction
 from django.conf import settings
+from django.utils import timezone
+from datetime import date
+import calendar
 import os
+from core.storage import blob_storage
 
 
 def receipt_image_path(instance, filename):
@@ -98,6 +102,7 @@ class Expense(models.Model):
     receipt_image = models.ImageField(
         'レシート画像',
         upload_to=receipt_image_path,
+        storage=blob_storage,
         blank=True,
         null=True
     )
@@ -111,6 +116,8 @@ class Expense(models.Model):
         related_name='generated_expenses',
         verbose_name='固定費'
     )
+    # 固定費から生成した対象月（月初日）。同じ固定費・同じ月の二重生成をDBで防ぐ
+    generated_for = models.DateField('生成対象月', null=True, blank=True)
     
     # 管理情報
     created_at = models.DateTimeField('作成日', auto_now_add=True)
@@ -120,10 +127,24 @@ class Expense(models.Model):
         verbose_name = '支出'
         verbose_name_plural = '支出'
         ordering = ['-date', '-created_at']
+        indexes = [
+            models.Index(fields=['created_by', 'date'], name='expense_user_date'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recurring_expense', 'generated_for'],
+                name='unique_recurring_expense_month'
+            ),
+        ]
 
     def __str__(self):
         return f'{self.date} - {self.description} ({self.amount}円)'
 
+    def save(self, *args, **kwargs):
+        # 月次集計（signals.py）の更新と同じトランザクションで保存する
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
 
 class RecurringExpense(models.Model):
     """固定費モデル"""
@@ -168,6 +189,7 @@ class RecurringExpense(models.Model):
     # 繰り返し設定
     frequency = models.CharField('頻度', max_length=20, choices=FREQUENCY_CHOICES, default='monthly')
     day_of_month = models.PositiveSmallIntegerField('支払日', default=1)  # 1-31
+    month_of_year = models.PositiveSmallIntegerField('支払月', null=True, blank=True)  # 毎年の場合（未設定なら登録月）
     
     # ステータス
     is_active = models.BooleanField('有効', default=True)
@@ -183,4 +205,90 @@ class RecurringExpense(models.Model):
         ordering = ['day_of_month', 'name']
 
     def __str__(self):
-        return f'{self.name} ({self.amount}円/{self.get_frequency_display()})'
\ No newline at end of file
+        return f'{self.name} ({self.amount}円/{self.get_frequency_display()})'
+
+    @property
+    def billing_month(self):
+        """毎年の固定費の支払月"""
+        if self.month_of_year:
+            return self.month_of_year
+        if self.created_at:
+            return timezone.localtime(self.created_at).month
+        return timezone.localdate().month
+
+    def occurs_in(self, year, month):
+        """指定月に支払が発生するか"""
+        if self.frequency == 'yearly':
+            return month == self.billing_month
+        return True
+
+    def date_for(self, year, month):
+        """指定月の支払日（月末を超える日は月末日）"""
+        last_day = calendar.monthrange(year, month)[1]
+        return date(year, month, min(self.day_of_month, last_day))
+
+
+class ExpenseMonthlyRollup(models.Model):
+    """支出の月次集計モデル（支出の保存・削除と同じトランザクションで更新）"""
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='expense_rollups',
+        verbose_name='作成者'
+    )
+    year = models.PositiveSmallIntegerField('年')
+    month = models.PositiveSmallIntegerField('月')
+    expense_type = models.CharField('区分', max_length=20, choices=Expense.EXPENSE_TYPE_CHOICES)
+    # カテゴリ・支払方法の削除時は行ごと消し、signals側でユーザー単位に再集計する
+    category = models.ForeignKey(
+        ExpenseCategory,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name='カテゴリ'
+    )
+    payment_method = models.ForeignKey(
+        PaymentMethod,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name='支払方法'
+    )
+    total = models.BigIntegerField('合計金額', default=0)
+    count = models.IntegerField('件数', default=0)
+
+    class Meta:
+        verbose_name = '支出月次集計'
+        verbose_name_plural = '支出月次集計'
+        ordering = ['year', 'month']
+        # NULL同士は一意制約で重複とみなされない（nulls_distinct は SQLite / PostgreSQL 14 以前で無効）ため、
+        # カテゴリ・支払方法が NULL の組み合わせごとに部分一意制約を付ける
+        constraints = [
+            models.UniqueConstraint(
+                fields=['created_by', 'year', 'month', 'expense_type', 'category', 'payment_method'],
+                name='unique_expense_rollup_key',
+            ),
+            models.UniqueConstraint(
+                fields=['created_by', 'year', 'month', 'expense_type', 'payment_method'],
+                condition=models.Q(category__isnull=True, payment_method__isnull=False),
+                name='unique_expense_rollup_no_category',
+            ),
+            models.UniqueConstraint(
+                fields=['created_by', 'year', 'month', 'expense_type', 'category'],
+                condition=models.Q(category__isnull=False, payment_method__isnull=True),
+                name='unique_expense_rollup_no_payment',
+            ),
+            models.UniqueConstraint(
+                fields=['created_by', 'year', 'month', 'expense_type'],
+                condition=models.Q(category__isnull=True, payment_method__isnull=True),
+                name='unique_expense_rollup_unclassified',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['created_by', 'year', 'month'], name='expense_rollup_user_month'),
+        ]
+
+    def __str__(self):
+        return f'{self.year}/{self.month} {self.get_expense_type_display()} ({self.total}円/{self.count}件)'
\ No newline at end of file
@@ -0,0 +1,94 @@
+from datetime import date
+from django.db import IntegrityError, transaction
+from accounts import usage
+from core.cache import bump_version
+from .models import Expense, RecurringExpense
+from . import rollups
+
+
+MAX_GENERATE_MONTHS = 36
+
+
+def month_range(start_year, start_month, end_year, end_month):
+    """開始月〜終了月（両端含む）の月初日リスト"""
+    months = []
+    year, month = start_year, start_month
+    while (year, month) <= (end_year, end_month):
+        months.append(date(year, month, 1))
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return months
+
+
+def _generate(user, months):
+    recurring_expenses = list(
+        RecurringExpense.objects.filter(
+            created_by=user, is_active=True
+        ).select_related('category', 'payment_method')
+    )
+    if not recurring_expenses or not months:
+        return []
+
+    # 生成済みの (固定費, 対象月) を1クエリで取得
+    generated = set(
+        Expense.objects.filter(
+            recurring_expense__in=recurring_expenses,
+            generated_for__in=months
+        ).values_list('recurring_expense_id', 'generated_for')
+    )
+
+    new_expenses = []
+    last_dates = {}
+    for recurring in recurring_expenses:
+        for month_start in months:
+            if not recurring.occurs_in(month_start.year, month_start.month):
+                continue
+            if (recurring.id, month_start) in generated:
+                continue
+            expense_date = recurring.date_for(month_start.year, month_start.month)
+            new_expenses.append(Expense(
+                created_by=user,
+                date=expense_date,
+                amount=recurring.amount,
+                expense_type=recurring.expense_type,
+                category=recurring.category,
+                payment_method=recurring.payment_method,
+                description=recurring.name,
+                recurring_expense=recurring,
+                generated_for=month_start
+            ))
+            last_dates[recurring.id] = max(expense_date, last_dates.get(recurring.id, expense_date))
+
+    if not new_expenses:
+        return []
+
+    created = Expense.objects.bulk_create(new_expenses)
+    rollups.apply_created(created)
+    usage.add(user.id, expense_count=len(created))
+
+    # 最終生成日をまとめて更新（過去月の生成では戻さない）
+    updated = []
+    for recurring in recurring_expenses:
+        last_date = last_dates.get(recurring.id)
+        if last_date and (recurring.last_generated_date is None or last_date > recurring.last_generated_date):
+            recurring.last_generated_date = last_date
+            updated.append(recurring)
+    RecurringExpense.objects.bulk_update(updated, ['last_generated_date'])
+    # bulk_create/bulk_update はシグナルを送らないため、キャッシュのバージョンを直接進める
+    bump_version('expenses', user.id)
+
+    return created
+
+
+def generate_recurring_expenses(user, months, retries=3):
+    """固定費から指定月分の支出をまとめて生成し、作成した支出を返す
+
+    同時実行で一意制約に当たった場合は、生成済みを読み直してやり直す
+    """
+    for attempt in range(retries):
+        try:
+            with transaction.atomic():
+                return _generate(user, months)
+        except IntegrityError:
+            if attempt == retries - 1:
+                raise
+    return []
@@ -0,0 +1,104 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import ExtractMonth, ExtractYear
+from .models import Expense, ExpenseMonthlyRollup
+
+
+ROLLUP_FIELDS = ('created_by_id', 'date', 'expense_type', 'category_id', 'payment_method_id', 'amount')
+
+
+def rollup_snapshot(expense):
+    """集計キーと金額をdictで取得"""
+    return {field: getattr(expense, field) for field in ROLLUP_FIELDS}
+
+
+def _rollup_key(snapshot):
+    return {
+        'created_by_id': snapshot['created_by_id'],
+        'year': snapshot['date'].year,
+        'month': snapshot['date'].month,
+        'expense_type': snapshot['expense_type'],
+        'category_id': snapshot['category_id'],
+        'payment_method_id': snapshot['payment_method_id'],
+    }
+
+
+def _apply(key, total, count):
+    """1つの集計行に差分を加算（行が無ければ作成）"""
+    if not total and not count:
+        return
+    rows = ExpenseMonthlyRollup.objects.filter(**key)
+    if rows.update(total=F('total') + total, count=F('count') + count):
+        return
+    try:
+        with transaction.atomic():
+            ExpenseMonthlyRollup.objects.create(**key, total=total, count=count)
+    except IntegrityError:
+        # 同時に作成された場合は加算でやり直す
+        rows.update(total=F('total') + total, count=F('count') + count)
+
+
+def _apply_deltas(changes):
+    """(スナップショット, 符号) の列を集計キーごとにまとめて反映"""
+    deltas = {}
+    for snapshot, sign in changes:
+        key = tuple(sorted(_rollup_key(snapshot).items()))
+        total, count = deltas.get(key, (0, 0))
+        deltas[key] = (total + sign * snapshot['amount'], count + sign)
+
+    for key, (total, count) in deltas.items():
+        _apply(dict(key), total, count)
+
+
+def apply_change(before=None, after=None):
+    """支出の作成・更新・削除を集計に反映（呼び出し側のトランザクション内で実行）"""
+    _apply_deltas(
+        (snapshot, sign)
+        for snapshot, sign in ((before, -1), (after, 1))
+        if snapshot is not None
+    )
+
+
+def apply_created(expenses):
+    """まとめて作成した支出（bulk_create等）を集計に反映"""
+    _apply_deltas((rollup_snapshot(expense), 1) for expense in expenses)
+
+
+def rebuild_rollups(user_ids=None):
+    """支出テーブルから集計を作り直す（user_ids未指定なら全ユーザー）"""
+    expenses = Expense.objects.all()
+    rollups = ExpenseMonthlyRollup.objects.all()
+    if user_ids is not None:
+        expenses = expenses.filter(created_by_id__in=user_ids)
+        rollups = rollups.filter(created_by_id__in=user_ids)
+
+    grouped = expenses.annotate(
+        rollup_year=ExtractYear('date'),
+        rollup_month=ExtractMonth('date')
+    ).values(
+        'created_by_id', 'rollup_year', 'rollup_month',
+        'expense_type', 'category_id', 'payment_method_id'
+    ).annotate(
+        rollup_total=Sum('amount'),
+        rollup_count=Count('id')
+    ).order_by()
+
+    with transaction.atomic():
+        rollups.delete()
+        created = ExpenseMonthlyRollup.objects.bulk_create(
+            (
+                ExpenseMonthlyRollup(
+                    created_by_id=row['created_by_id'],
+                    year=row['rollup_year'],
+                    month=row['rollup_month'],
+                    expense_type=row['expense_type'],
+                    category_id=row['category_id'],
+                    payment_method_id=row['payment_method_id'],
+                    total=row['rollup_total'],
+                    count=row['rollup_count'],
+                )
+                for row in grouped.iterator()
+            ),
+            batch_size=1000
+        )
+    return len(created)
@@ -0,0 +1,104 @@
+from django.utils import timezone
+from core import downloads
+from .models import ExpenseCategory, PaymentMethod, Expense
+
+
+VALUES_FIELDS = (
+    'id', 'date', 'amount', 'expense_type', 'category_id', 'payment_method_id',
+    'description', 'memo', 'receipt_image', 'recurring_expense_id',
+    'created_at', 'updated_at'
+)
+
+ROW_CHUNK_SIZE = 2000
+
+
+class ExpenseRowBuilder:
+    """values() の行からExpenseSerializerと同じ形のdictを作る読み取り専用の高速パス
+
+    カテゴリ・支払方法はリクエストごとに1回だけ読み込んだdictから引き、
+    DRFのフィールド処理を通さずに出力する（出力内容はExpenseSerializerと同一）
+    """
+
+    def __init__(self, request, with_derivatives=True):
+        self.request = request
+        self.with_derivatives = with_derivatives
+        self.categories = {
+            pk: (name, icon)
+            for pk, name, icon in ExpenseCategory.objects.filter(
+                created_by=request.user
+            ).values_list('id', 'name', 'icon')
+        }
+        self.payment_methods = {
+            pk: (name, icon)
+            for pk, name, icon in PaymentMethod.objects.filter(
+                created_by=request.user
+            ).values_list('id', 'name', 'icon')
+        }
+        self.expense_types = dict(Expense.EXPENSE_TYPE_CHOICES)
+        self.timezone = timezone.get_current_timezone()
+
+    def datetime(self, value):
+        if not value:
+            return None
+        value = value.astimezone(self.timezone).isoformat()
+        if value.endswith('+00:00'):
+            value = value[:-6] + 'Z'
+        return value
+
+    def lookup(self, cache, model, pk):
+        """(名前, アイコン) を取得（他ユーザーのマスタを参照している行だけ個別に読む）"""
+        if pk not in cache:
+            cache[pk] = model.objects.values_list('name', 'icon').get(pk=pk)
+        return cache[pk]
+
+    def receipt_download_url(self, pk, name):
+        if not name:
+            return None
+        return downloads.signed_url('receipt', pk, self.request.user.pk, self.request)
+
+    def receipt_urls(self, pk, name):
+        return downloads.derivative_urls('receipt', pk, self.request.user.pk, name, self.request)
+
+    def build(self, row):
+        # 関連が無い場合、ExpenseSerializerは *_name / *_icon のキー自体を出力しない
+        data = {
+            'id': row['id'],
+            'date': row['date'].isoformat(),
+            'amount': row['amount'],
+            'expense_type': row['expense_type'],
+            'expense_type_display': self.expense_types.get(row['expense_type'], row['expense_type']),
+            'category': row['category_id'],
+        }
+        if row['category_id'] is not None:
+            data['category_name'], data['category_icon'] = self.lookup(
+                self.categories, ExpenseCategory, row['category_id']
+            )
+        data['payment_method'] = row['payment_method_id']
+        if row['payment_method_id'] is not None:
+            data['payment_method_name'], data['payment_method_icon'] = self.lookup(
+                self.payment_methods, PaymentMethod, row['payment_method_id']
+            )
+        data.update({
+            'description': row['description'],
+            'memo': row['memo'],
+            'receipt_image_url': self.receipt_download_url(row['id'], row['receipt_image']),
+        })
+        if self.with_derivatives:
+            data['receipt_image_urls'] = self.receipt_urls(row['id'], row['receipt_image'])
+        data.update({
+            'recurring_expense': row['recurring_expense_id'],
+            'created_at': self.datetime(row['created_at']),
+            'updated_at': self.datetime(row['updated_at']),
+        })
+        return data
+
+    def iter_rows(self, queryset):
+        """チャンク単位でDBから読み出しながら1行ずつ返す"""
+        for row in queryset.values(*VALUES_FIELDS).iterator(chunk_size=ROW_CHUNK_SIZE):
+            yield self.build(row)
+
+    def build_instance(self, expense):
+        """モデルインスタンス（bulk_create直後など）から同じ形のdictを作る"""
+        row = {field: getattr(expense, field) for field in VALUES_FIELDS}
+        row['receipt_image'] = expense.receipt_image.name
+        return self.build(row)
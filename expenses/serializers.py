@@ -1,4 +1,5 @@
 from rest_framework import serializers
+from core import downloads
 from .models import ExpenseCategory, PaymentMethod, Expense, RecurringExpense
 
 
@@ -28,6 +29,7 @@ class ExpenseSerializer(serializers.ModelSerializer):
     payment_method_icon = serializers.CharField(source='payment_method.icon', read_only=True)
     expense_type_display = serializers.CharField(source='get_expense_type_display', read_only=True)
     receipt_image_url = serializers.SerializerMethodField()
+    receipt_image_urls = serializers.SerializerMethodField()
     
     class Meta:
         model = Expense
@@ -35,18 +37,24 @@ class ExpenseSerializer(serializers.ModelSerializer):
             'id', 'date', 'amount', 'expense_type', 'expense_type_display',
             'category', 'category_name', 'category_icon',
             'payment_method', 'payment_method_name', 'payment_method_icon',
-            'description', 'memo', 'receipt_image', 'receipt_image_url',
+            'description', 'memo', 'receipt_image', 'receipt_image_url', 'receipt_image_urls',
             'recurring_expense', 'created_at', 'updated_at'
         ]
         read_only_fields = ['id', 'created_at', 'updated_at']
+        # レシート画像は署名付きの receipt_image_url / receipt_image_urls で返す
+        extra_kwargs = {'receipt_image': {'write_only': True}}
     
     def get_receipt_image_url(self, obj):
+        """所有者だけが開ける署名付きのダウンロードURL"""
         if obj.receipt_image:
-            request = self.context.get('request')
-            if request:
-                return request.build_absolute_uri(obj.receipt_image.url)
-            return obj.receipt_image.url
+            return downloads.signed_url('receipt', obj.pk, obj.created_by_id, self.context.get('request'))
         return None
+    
+    def get_receipt_image_urls(self, obj):
+        """サイズ別（thumb/medium）のレシート画像URL"""
+        return downloads.derivative_urls(
+            'receipt', obj.pk, obj.created_by_id, obj.receipt_image.name, self.context.get('request')
+        )
 
 
 class ExpenseCreateUpdateSerializer(serializers.ModelSerializer):
@@ -60,6 +68,7 @@ class ExpenseCreateUpdateSerializer(serializers.ModelSerializer):
             'description', 'memo', 'receipt_image'
         ]
         read_only_fields = ['id']
+        extra_kwargs = {'receipt_image': {'write_only': True}}
 
 
 class RecurringExpenseSerializer(serializers.ModelSerializer):
@@ -77,11 +86,21 @@ class RecurringExpenseSerializer(serializers.ModelSerializer):
             'id', 'name', 'amount', 'expense_type', 'expense_type_display',
             'category', 'category_name', 'category_icon',
             'payment_method', 'payment_method_name', 'payment_method_icon',
-            'frequency', 'frequency_display', 'day_of_month',
+            'frequency', 'frequency_display', 'day_of_month', 'month_of_year',
             'is_active', 'last_generated_date', 'created_at', 'updated_at'
         ]
         read_only_fields = ['id', 'last_generated_date', 'created_at', 'updated_at']
 
+    def validate_day_of_month(self, value):
+        if not 1 <= value <= 31:
+            raise serializers.ValidationError('支払日は1〜31で指定してください')
+        return value
+
+    def validate_month_of_year(self, value):
+        if value is not None and not 1 <= value <= 12:
+            raise serializers.ValidationError('支払月は1〜12で指定してください')
+        return value
+
 
 class ExpenseSummarySerializer(serializers.Serializer):
     """支出サマリーシリアライザー"""
@@ -0,0 +1,59 @@
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from accounts import usage
+from core import cache, images, storage
+from .models import ExpenseCategory, PaymentMethod, Expense, RecurringExpense
+from . import rollups
+
+
+images.register(Expense, 'receipt_image')
+# 容量の計算で元のファイルのサイズを使うので、参照の解除（storage）より先に登録する
+usage.register_count(Expense, 'expense_count')
+usage.register_files(Expense, receipt_image='receipt_bytes')
+storage.register(Expense, 'receipt_image')
+
+for model in (Expense, RecurringExpense, ExpenseCategory, PaymentMethod):
+    cache.register(model)
+
+
+def _deleted_directly(origin, *models):
+    """ユーザー削除などのカスケードではなく、対象モデル自身の削除かどうか"""
+    return isinstance(origin, models) or getattr(origin, 'model', None) in models
+
+
+@receiver(pre_save, sender=Expense)
+def remember_expense_before_save(sender, instance, raw=False, **kwargs):
+    """更新前の集計キーを保持"""
+    instance._rollup_before = None
+    if raw or instance._state.adding or instance.pk is None:
+        return
+    previous = Expense.objects.filter(pk=instance.pk).values(*rollups.ROLLUP_FIELDS).first()
+    instance._rollup_before = previous
+
+
+@receiver(post_save, sender=Expense)
+def update_rollup_on_save(sender, instance, raw=False, **kwargs):
+    """支出の作成・更新を月次集計に反映"""
+    if raw:
+        return
+    rollups.apply_change(
+        before=getattr(instance, '_rollup_before', None),
+        after=rollups.rollup_snapshot(instance)
+    )
+
+
+@receiver(post_delete, sender=Expense)
+def update_rollup_on_delete(sender, instance, origin=None, **kwargs):
+    """支出の削除を月次集計に反映"""
+    if not _deleted_directly(origin, Expense):
+        return
+    rollups.apply_change(before=rollups.rollup_snapshot(instance))
+
+
+@receiver(post_delete, sender=ExpenseCategory)
+@receiver(post_delete, sender=PaymentMethod)
+def rebuild_rollup_on_master_delete(sender, instance, origin=None, **kwargs):
+    """カテゴリ・支払方法の削除で未分類に移った支出を再集計"""
+    if not _deleted_directly(origin, ExpenseCategory, PaymentMethod):
+        return
+    rollups.rebuild_rollups(user_ids=[instance.created_by_id])
@@ -1,3 +1,628 @@
-from django.test import TestCase
+import codecs
+import csv
+import io
+import json
+import shutil
+import tempfile
+from datetime import date, datetime, timezone as dt_timezone
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import ExtractMonth, ExtractYear
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from unittest import mock
+from PIL import Image
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+from core import images
+from accounts.models import User
+from .models import ExpenseCategory, PaymentMethod, Expense, ExpenseMonthlyRollup, RecurringExpense
+from .exports import EXPORT_FIELDS
+from .forecast import MAX_FORECAST_MONTHS, forecast
+from .imports import ExpenseImporter, ImportFormatError
+from .serializers import ExpenseSerializer
+from .recurring import MAX_GENERATE_MONTHS, generate_recurring_expenses, month_range
+from . import rollups
 
-# Create your tests here.
+
+class ExpenseRollupTests(TestCase):
+    """月次集計が支出の作成・更新・削除・カテゴリ削除の後も支出テーブルの集計と一致すること"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('owner', 'owner@example.com', 'password')
+        self.food = ExpenseCategory.objects.create(created_by=self.user, name='食費')
+        self.card = PaymentMethod.objects.create(created_by=self.user, name='カード')
+
+    def add(self, day, amount, **fields):
+        fields.setdefault('expense_type', 'personal')
+        return Expense.objects.create(created_by=self.user, date=day, amount=amount, description='x', **fields)
+
+    def assertRollupMatches(self):
+        keys = ('year', 'month', 'expense_type', 'category_id', 'payment_method_id')
+        expected = {
+            tuple(row[key] for key in keys): (row['total'], row['count'])
+            for row in Expense.objects.filter(created_by=self.user).annotate(
+                year=ExtractYear('date'), month=ExtractMonth('date')
+            ).values(*keys).annotate(total=Sum('amount'), count=Count('id')).order_by()
+        }
+        actual = {
+            tuple(row[key] for key in keys): (row['total'], row['count'])
+            for row in ExpenseMonthlyRollup.objects.filter(created_by=self.user, count__gt=0).values(*keys, 'total', 'count')
+        }
+        self.assertEqual(actual, expected)
+
+    def test_deltas_follow_changes(self):
+        lunch = self.add(date(2026, 1, 5), 800, category=self.food, payment_method=self.card)
+        self.add(date(2026, 1, 6), 1200)
+        self.add(date(2026, 1, 7), 300)
+        self.assertRollupMatches()
+        self.assertEqual(ExpenseMonthlyRollup.objects.filter(category=None, payment_method=None).count(), 1)
+
+        lunch.amount = 900
+        lunch.date = date(2026, 2, 1)
+        lunch.category = None
+        lunch.save()
+        self.assertRollupMatches()
+
+        lunch.delete()
+        self.assertRollupMatches()
+
+        self.add(date(2026, 3, 1), 500, category=self.food)
+        self.food.delete()
+        self.assertRollupMatches()
+
+    def test_rebuild_matches_deltas(self):
+        self.add(date(2026, 1, 5), 800, category=self.food)
+        self.add(date(2026, 1, 6), 1200, payment_method=self.card)
+        self.add(date(2026, 1, 7), 300)
+        rollups.rebuild_rollups(user_ids=[self.user.pk])
+        self.assertRollupMatches()
+
+    def test_null_keys_are_unique(self):
+        # カテゴリ・支払方法が NULL の集計行も1キー1行に限られる（作成の競合は加算でやり直す）
+        self.add(date(2026, 1, 6), 1200)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            ExpenseMonthlyRollup.objects.create(
+                created_by=self.user, year=2026, month=1, expense_type='personal', total=1, count=1
+            )
+
+
+class RecurringGenerationTests(TestCase):
+    """固定費からの生成が重複せず、まとめて・やり直しても同じ結果になること"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('owner', 'owner@example.com', 'password')
+        self.rent = RecurringExpense.objects.create(
+            created_by=self.user, name='家賃', amount=80000, expense_type='personal', day_of_month=31
+        )
+
+    def generated(self, recurring):
+        return list(Expense.objects.filter(recurring_expense=recurring).order_by('date').values_list('date', flat=True))
+
+    def test_rerun_is_idempotent(self):
+        months = month_range(2026, 1, 2026, 3)
+        self.assertEqual(len(generate_recurring_expenses(self.user, months)), 3)
+        self.assertEqual(generate_recurring_expenses(self.user, months), [])
+        # 月末を超える支払日は月末日にする
+        self.assertEqual(self.generated(self.rent), [date(2026, 1, 31), date(2026, 2, 28), date(2026, 3, 31)])
+        self.rent.refresh_from_db()
+        self.assertEqual(self.rent.last_generated_date, date(2026, 3, 31))
+
+    def test_backfill_max_months(self):
+        months = month_range(2024, 1, 2026, 12)
+        self.assertEqual(len(months), MAX_GENERATE_MONTHS)
+        generate_recurring_expenses(self.user, month_range(2025, 6, 2025, 6))
+        created = generate_recurring_expenses(self.user, months)
+        self.assertEqual(len(created), MAX_GENERATE_MONTHS - 1)
+        self.assertEqual(Expense.objects.filter(recurring_expense=self.rent).count(), MAX_GENERATE_MONTHS)
+        rollup = ExpenseMonthlyRollup.objects.get(year=2025, month=6)
+        self.assertEqual((rollup.total, rollup.count), (80000, 1))
+
+    def test_yearly_without_month_uses_registration_month(self):
+        insurance = RecurringExpense.objects.create(
+            created_by=self.user, name='保険', amount=30000, expense_type='personal', frequency='yearly', day_of_month=10
+        )
+        month = timezone.localtime(insurance.created_at).month
+        generate_recurring_expenses(self.user, month_range(2025, 1, 2026, 12))
+        self.assertEqual(self.generated(insurance), [date(2025, month, 10), date(2026, month, 10)])
+
+        insurance.month_of_year = 4
+        insurance.save()
+        Expense.objects.filter(recurring_expense=insurance).delete()
+        generate_recurring_expenses(self.user, month_range(2026, 1, 2026, 12))
+        self.assertEqual(self.generated(insurance), [date(2026, 4, 10)])
+
+    def test_retries_after_concurrent_insert(self):
+        months = month_range(2026, 1, 2026, 2)
+        bulk_create = Expense.objects.bulk_create
+        calls = []
+
+        def concurrent_then_retry(objs, *args, **kwargs):
+            # 1回目は他のリクエストが先に1か月分を作成して一意制約に当たった状態にする
+            calls.append(len(objs))
+            if len(calls) == 1:
+                bulk_create([objs[0]])
+                raise IntegrityError
+            return bulk_create(objs, *args, **kwargs)
+
+        with mock.patch.object(Expense.objects, 'bulk_create', side_effect=concurrent_then_retry):
+            created = generate_recurring_expenses(self.user, months)
+        self.assertEqual(calls, [2, 2])
+        self.assertEqual(len(created), 2)
+        self.assertEqual(len(self.generated(self.rent)), 2)
+
+
+class YearlySummaryTests(TestCase):
+    """年間サマリー（複数年の範囲指定・範囲の検証・日付指定時の支出からの集計）"""
+
+    URL = '/api/expenses/expenses/yearly_summary/'
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('owner', 'owner@example.com', 'password')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        for day, amount, expense_type in (
+            (date(2024, 3, 10), 1000, 'personal'),
+            (date(2025, 12, 1), 200, 'personal'),
+            (date(2025, 12, 31), 500, 'business'),
+            (date(2026, 1, 1), 300, 'personal'),
+        ):
+            Expense.objects.create(
+                created_by=self.user, date=day, amount=amount, expense_type=expense_type, description='x',
+            )
+
+    def get(self, **params):
+        return self.client.get(self.URL, params)
+
+    def test_single_year(self):
+        data = self.get(year=2025).json()
+        self.assertEqual((data['year'], data['year_total'], data['year_business_total']), (2025, 700, 500))
+        self.assertEqual(data['monthly_data'][11], {
+            'month': 12, 'month_label': '12月', 'total': 700, 'personal_total': 200, 'business_total': 500,
+        })
+
+    def test_multi_year_range(self):
+        data = self.get(start_year=2024, end_year=2026).json()
+        self.assertEqual((data['start_year'], data['end_year'], data['total']), (2024, 2026, 2000))
+        self.assertEqual([year['year'] for year in data['years']], [2024, 2025, 2026])
+        self.assertEqual([year['year_total'] for year in data['years']], [1000, 700, 300])
+        self.assertEqual(data['years'][0]['monthly_data'][2]['personal_total'], 1000)
+        self.assertEqual(data['years'][2]['monthly_data'][0]['total'], 300)
+        # 年の間の空の年も12ヶ月分を返す
+        self.assertEqual(self.get(start_year=2023, end_year=2023).json()['years'][0]['year_total'], 0)
+
+    def test_invalid_ranges(self):
+        self.assertEqual(self.get(start_year=2026, end_year=2024).status_code, 400)
+        self.assertEqual(self.get(start_year=2000, end_year=2020).status_code, 400)
+        self.assertEqual(self.get(start_year='x').status_code, 400)
+        data = self.get(start_year=2001, end_year=2020).json()
+        self.assertEqual(len(data['years']), 20)
+
+    def test_date_range_reads_expenses(self):
+        # 日付範囲は月単位の集計テーブルでは表せないので、支出から集計する
+        data = self.get(start_year=2025, end_year=2026, start_date='2025-12-15', end_date='2026-01-31').json()
+        self.assertEqual([year['year_total'] for year in data['years']], [500, 300])
+        self.assertEqual(data['years'][0]['monthly_data'][11]['business_total'], 500)
+
+        data = self.get(year=2025, start_date='2025-12-15', expense_type='personal').json()
+        self.assertEqual(data['year_total'], 0)
+
+
+class AnalyticsTests(TestCase):
+    """NumPyでの集計結果（推移・移動平均・前年比・構成比・パーセンタイル）を固定のデータで確認"""
+
+    URL = '/api/expenses/expenses/analytics/'
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('owner', 'owner@example.com', 'password')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.food = ExpenseCategory.objects.create(created_by=self.user, name='食費')
+        self.transport = ExpenseCategory.objects.create(created_by=self.user, name='交通費')
+        for day, amount, expense_type, category in (
+            (date(2025, 1, 10), 1000, 'personal', self.food),
+            (date(2026, 1, 5), 600, 'personal', self.food),
+            (date(2026, 1, 6), 300, 'business', None),
+            (date(2026, 1, 6), 100, 'personal', self.food),
+            (date(2026, 2, 1), 2000, 'personal', self.transport),
+        ):
+            Expense.objects.create(
+                created_by=self.user, date=day, amount=amount, expense_type=expense_type,
+                category=category, description='x',
+            )
+
+    def get(self, **params):
+        response = self.client.get(self.URL, {'start_year': 2026, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_figures(self):
+        data = self.get()
+        self.assertEqual((data['start_date'], data['end_date']), ('2026-01-01', '2026-12-31'))
+        self.assertEqual((data['total'], data['count']), (3000, 4))
+        self.assertEqual(data['by_expense_type'], {'personal': 2700, 'business': 300})
+
+        daily = data['daily']
+        self.assertEqual(len(daily['dates']), 365)
+        self.assertEqual(daily['dates'][4], '2026-01-05')
+        self.assertEqual((daily['totals'][4], daily['totals'][5], daily['totals'][31]), (600, 400, 2000))
+        self.assertEqual(sum(daily['totals']), 3000)
+        self.assertEqual((daily['rolling_average'][4], daily['rolling_average'][5]), (85.7, 142.9))
+
+        weekly = data['weekly']
+        # 月曜始まり（1月1日を含む週から）
+        self.assertEqual(weekly['weeks'][:2], ['2025-12-29', '2026-01-05'])
+        self.assertEqual(weekly['totals'][:5], [0, 1000, 0, 0, 2000])
+        self.assertEqual(weekly['rolling_average'][4], 750.0)
+
+        monthly = data['monthly']
+        self.assertEqual(monthly['months'][:2], ['2026-01', '2026-02'])
+        self.assertEqual(monthly['totals'][:3], [1000, 2000, 0])
+        self.assertEqual(monthly['previous_year'][:2], [1000, 0])
+        self.assertEqual(monthly['yoy_delta'][:2], [0, 2000])
+        self.assertEqual(monthly['yoy_rate'][:2], [0.0, None])
+        self.assertEqual(monthly['rolling_average'][:3], [333.3, 1000.0, 1000.0])
+
+        self.assertEqual(data['by_category'], [
+            {'id': self.transport.pk, 'name': '交通費', 'total': 2000, 'count': 1, 'share': 66.7},
+            {'id': self.food.pk, 'name': '食費', 'total': 700, 'count': 2, 'share': 23.3},
+            {'id': None, 'name': '未分類', 'total': 300, 'count': 1, 'share': 10.0},
+        ])
+        self.assertEqual(data['percentiles']['transaction'], {
+            'p50': 450.0, 'p75': 950.0, 'p90': 1580.0, 'p95': 1790.0, 'p99': 1958.0, 'mean': 750.0, 'max': 2000,
+        })
+        self.assertEqual(data['percentiles']['daily']['p50'], 600.0)
+        self.assertEqual(data['percentiles']['daily']['mean'], 1000.0)
+
+    def test_expense_type_filter(self):
+        data = self.get(expense_type='business')
+        self.assertEqual((data['total'], data['by_expense_type']), (300, {'personal': 0, 'business': 300}))
+        self.assertEqual(data['monthly']['yoy_rate'][0], None)
+        self.assertEqual(self.client.get(self.URL, {'expense_type': 'x'}).status_code, 400)
+
+    def test_empty(self):
+        data = self.get(start_year=2030)
+        self.assertEqual((data['total'], data['count'], data['by_category']), (0, 0, []))
+        self.assertEqual(data['monthly']['totals'], [0] * 12)
+        self.assertEqual(data['monthly']['yoy_rate'], [None] * 12)
+        self.assertEqual(set(data['daily']['totals']), {0})
+        self.assertEqual(set(data['percentiles']['transaction'].values()), {None})
+        self.assertEqual(set(data['percentiles']['daily'].values()), {None})
+
+
+class ForecastTests(TestCase):
+    """支出見込み（固定費の月次・年次の展開、変動費の平均、期間の端の扱い）"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('owner', 'owner@example.com', 'password')
+        self.rent = RecurringExpense.objects.create(
+            created_by=self.user, name='家賃', amount=80000, expense_type='personal',
+        )
+        RecurringExpense.objects.create(
+            created_by=self.user, name='保険', amount=12000, expense_type='business', frequency='yearly', month_of_year=5,
+        )
+        RecurringExpense.objects.create(
+            created_by=self.user, name='解約済み', amount=999, expense_type='personal', is_active=False,
+        )
+
+    def add(self, day, amount, expense_type='personal', **fields):
+        Expense.objects.create(
+            created_by=self.user, date=day, amount=amount, expense_type=expense_type, description='x', **fields
+        )
+
+    def test_recurring_expansion(self):
+        result = forecast(self.user, date(2026, 3, 1), 14, 3)
+        rows = result['forecast']
+        self.assertEqual((rows[0]['year'], rows[0]['month']), (2026, 3))
+        self.assertEqual((rows[-1]['year'], rows[-1]['month']), (2027, 4))
+        # 年次は支払月だけ、停止中の固定費は含めない
+        self.assertEqual(
+            [(row['recurring_total'], row['recurring_count']) for row in rows[:4]],
+            [(80000, 1), (80000, 1), (92000, 2), (80000, 1)],
+        )
+        self.assertEqual([row['business_total'] for row in rows].count(12000), 1)
+        self.assertEqual(result['total'], 80000 * 14 + 12000)
+
+        # 期間の最後の月まで展開し、その後の月は含めない
+        self.assertEqual(forecast(self.user, date(2026, 6, 1), 12, 3)['forecast'][-1]['recurring_total'], 92000)
+        self.assertEqual(forecast(self.user, date(2026, 6, 1), 11, 3)['total'], 80000 * 11)
+
+    def test_variable_average(self):
+        self.add(date(2025, 11, 30), 5000)
+        self.add(date(2026, 1, 10), 3000)
+        self.add(date(2026, 2, 10), 600, 'business')
+        self.add(date(2026, 2, 20), 1500)
+        # 予測の開始月以降・固定費から生成した支出は平均に含めない
+        self.add(date(2026, 3, 1), 9999)
+        self.add(date(2026, 2, 1), 80000, recurring_expense=self.rent)
+
+        result = forecast(self.user, date(2026, 3, 1), 2, 3)
+        # 支出は1月からなので (3000 + 1500) / 2ヶ月
+        self.assertEqual(result['variable_average'], {'personal': 2250, 'business': 300})
+        first = result['forecast'][0]
+        self.assertEqual(
+            (first['variable_total'], first['personal_total'], first['business_total'], first['total']),
+            (2550, 82250, 300, 82550),
+        )
+
+        result = forecast(self.user, date(2026, 3, 1), 1, 4)
+        self.assertEqual(result['variable_average'], {'personal': 2375, 'business': 150})
+
+    def test_api_validation(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        url = '/api/expenses/recurring/forecast/'
+        self.assertEqual(client.get(url, {'months': 0}).status_code, 400)
+        self.assertEqual(client.get(url, {'months': MAX_FORECAST_MONTHS + 1}).status_code, 400)
+        self.assertEqual(client.get(url, {'history_months': 'x'}).status_code, 400)
+        data = client.get(url, {'months': 3}).json()
+        self.assertEqual(len(data['forecast']), 3)
+        self.assertEqual(data['variable_average'], {'personal': 0, 'business': 0})
+
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def image_file(name='receipt.png', size=(40, 30)):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, 'white').save(buffer, format='PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class ReceiptDerivativeTests(TestCase):
+    """派生画像はアップロード時（無ければ開かれたとき）に作り、一覧の読み出しではファイルを確認・作成しないこと"""
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('owner', 'owner@example.com', 'password')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_list_does_not_touch_images(self):
+        expense = Expense.objects.create(
+            created_by=self.user, date=date(2026, 1, 5), amount=800, expense_type='personal',
+            description='x', receipt_image=image_file(),
+        )
+        field_file = expense.receipt_image
+        self.assertEqual(images.missing_derivatives(field_file), [])
+
+        storage = field_file.storage
+        for size in images.DERIVATIVE_SIZES:
+            storage.delete(images.derivative_name(field_file.name, size))
+        with mock.patch.object(Image, 'open', side_effect=AssertionError('decoded in list')):
+            response = self.client.get('/api/expenses/expenses/')
+        self.assertEqual(response.status_code, 200)
+        urls = response.json()[0]['receipt_image_urls']
+        self.assertEqual(set(urls), set(images.DERIVATIVE_SIZES))
+        self.assertEqual(images.missing_derivatives(field_file), list(images.DERIVATIVE_SIZES))
+
+        # 無い派生画像は開かれたときに作る（派生画像も署名付きURLで認証なしに開ける）
+        response = APIClient().get(urls['thumb'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], f'image/{images.DERIVATIVE_EXTENSION}')
+        response.close()
+        self.assertEqual(images.missing_derivatives(field_file), ['medium'])
+
+        call_command('generate_image_derivatives', stdout=io.StringIO())
+        self.assertEqual(images.missing_derivatives(field_file), [])
+
+    def test_missing_derivative_falls_back_to_original(self):
+        expense = Expense.objects.create(
+            created_by=self.user, date=date(2026, 1, 5), amount=800, expense_type='personal',
+            description='x', receipt_image=image_file(),
+        )
+        field_file = expense.receipt_image
+        field_file.storage.delete(images.derivative_name(field_file.name, 'thumb'))
+        url = self.client.get('/api/expenses/expenses/').json()[0]['receipt_image_urls']['thumb']
+
+        with mock.patch.object(Image, 'open', side_effect=OSError('broken')), self.assertLogs('core.images', 'WARNING'):
+            response = APIClient().get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/png')
+        response.close()
+        self.assertEqual(images.missing_derivatives(field_file), ['thumb'])
+
+    def test_media_paths_are_not_exposed(self):
+        Expense.objects.create(
+            created_by=self.user, date=date(2026, 1, 5), amount=800, expense_type='personal',
+            description='x', receipt_image=image_file(),
+        )
+        row = self.client.get('/api/expenses/expenses/').json()[0]
+        self.assertNotIn('receipt_image', row)
+        self.assertNotIn('/media/', str(row))
+        self.assertTrue(row['receipt_image_url'].startswith('http://testserver/api/files/'))
+
+
+class ExpenseImportTests(TestCase):
+    """明細CSVの取り込み（重複の読み飛ばし・文字コード判定・途中で読めない行）"""
+
+    HEADER = '利用日,利用店名,利用金額\n'
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('owner', 'owner@example.com', 'password')
+
+    def run_import(self, text, encoding='utf-8', **kwargs):
+        content = text if isinstance(text, bytes) else text.encode(encoding)
+        return ExpenseImporter(self.user, **kwargs).run(SimpleUploadedFile('statement.csv', content))
+
+    def test_duplicates_are_counted(self):
+        rows = '2026/01/05,コンビニ,500\n2026/01/05,コンビニ,500\n2026/01/05,書店,500\n2026/01/06,コンビニ,1200\n'
+        # バッチの境目をまたいでも、ファイル内の同じ明細はすべて登録する
+        with mock.patch('expenses.imports.IMPORT_BATCH_SIZE', 1):
+            result = self.run_import(self.HEADER + rows)
+        self.assertEqual((result['created'], result['skipped_duplicates']), (4, 0))
+
+        # 再取り込みでは既存の件数分だけ読み飛ばし、増えた1件だけ登録する
+        result = self.run_import(self.HEADER + rows + '2026/01/05,コンビニ,500\n')
+        self.assertEqual((result['created'], result['skipped_duplicates']), (1, 4))
+        self.assertEqual(Expense.objects.filter(description='コンビニ', amount=500).count(), 3)
+        self.assertEqual(ExpenseMonthlyRollup.objects.get().count, 5)
+
+    def test_dry_run_creates_nothing(self):
+        result = self.run_import(self.HEADER + '2026/01/05,コンビニ,500\n', dry_run=True)
+        self.assertEqual(result['created'], 1)
+        self.assertFalse(Expense.objects.exists())
+
+    def test_cp932_is_detected(self):
+        result = self.run_import(self.HEADER + '2026年1月5日,喫茶店,"1,200円"\n', encoding='cp932')
+        self.assertEqual(result['created'], 1)
+        expense = Expense.objects.get()
+        self.assertEqual((expense.description, expense.amount, expense.date), ('喫茶店', 1200, date(2026, 1, 5)))
+
+    def test_invalid_rows_and_decode_error(self):
+        content = (self.HEADER + '2026/01/05,コンビニ,500\n2026/13/01,書店,300\n2026/01/06,駅,-1\n2026/01/07,パン屋,300\n').encode('utf-8')
+        # 途中からUTF-8として読めない行がある場合は、その前までを取り込む
+        upload = SimpleUploadedFile('statement.csv', content + b'2026/01/08,\x82\xa0,100\n2026/01/09,x,1\n')
+        result = ExpenseImporter(self.user).run(upload, encoding='utf-8')
+        self.assertEqual(result['created'], 2)
+        self.assertEqual([error['line'] for error in result['errors'][:2]], [3, 4])
+        self.assertIn('以降の行を読み込めません', result['errors'][-1]['error'])
+        self.assertEqual(result['error_count'], 3)
+
+    def test_missing_columns(self):
+        with self.assertRaises(ImportFormatError):
+            self.run_import('日付,メモ\n2026/01/05,x\n')
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class ExpenseRowBuilderTests(TestCase):
+    """values() から組み立てた一覧がExpenseSerializerと同じJSONのバイト列になること"""
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('owner', 'owner@example.com', 'password')
+        self.other = User.objects.create_user('other', 'other@example.com', 'password')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+        food = ExpenseCategory.objects.create(created_by=self.user, name='食費', icon='🍙')
+        card = PaymentMethod.objects.create(created_by=self.user, name='カード')
+        foreign = ExpenseCategory.objects.create(created_by=self.other, name='他人のカテゴリ')
+        rent = RecurringExpense.objects.create(created_by=self.user, name='家賃', amount=80000, expense_type='personal')
+
+        Expense.objects.create(
+            created_by=self.user, date=date(2026, 1, 5), amount=800, expense_type='personal',
+            category=food, payment_method=card, description='昼食', memo='メモ\n"引用"', receipt_image=image_file(),
+        )
+        Expense.objects.create(
+            created_by=self.user, date=date(2026, 1, 6), amount=2 ** 31 - 1, expense_type='business',
+            description='null FK', recurring_expense=rent,
+        )
+        # 他のユーザーのマスタを参照している行（個別に読む経路）
+        Expense.objects.create(
+            created_by=self.user, date=date(2026, 1, 7), amount=1, expense_type='personal',
+            category=foreign, description='x', receipt_image='',
+        )
+        # マイクロ秒が0の日時・UTCの深夜（現地時間では翌日）
+        Expense.objects.filter(description='x').update(
+            created_at=timezone.make_aware(datetime(2026, 1, 7, 23, 30), dt_timezone.utc),
+        )
+
+    def serializer_bytes(self):
+        request = APIRequestFactory().get('/api/expenses/expenses/')
+        force_authenticate(request, self.user)
+        queryset = Expense.objects.filter(created_by=self.user).select_related('category', 'payment_method')
+        data = ExpenseSerializer(queryset, many=True, context={'request': Request(request)}).data
+        return JSONRenderer().render(data)
+
+    def assertSameBytes(self):
+        response = self.client.get('/api/expenses/expenses/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, self.serializer_bytes())
+
+    def test_list_matches_serializer(self):
+        self.assertSameBytes()
+
+    @override_settings(TIME_ZONE='UTC')
+    def test_list_matches_serializer_in_utc(self):
+        self.assertSameBytes()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class ExpenseExportTests(TestCase):
+    """CSV・NDJSONのストリーミング出力（ヘッダー行・値・BOM・署名付きの領収書URL）"""
+
+    URL = '/api/expenses/expenses/export/'
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('owner', 'owner@example.com', 'password')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        food = ExpenseCategory.objects.create(created_by=self.user, name='食費', icon='🍙')
+        self.with_receipt = Expense.objects.create(
+            created_by=self.user, date=date(2026, 1, 5), amount=800, expense_type='personal',
+            category=food, description='昼食, "定食"', memo='改行\nあり', receipt_image=image_file(),
+        )
+        Expense.objects.create(
+            created_by=self.user, date=date(2026, 1, 6), amount=1200, expense_type='business', description='交通費',
+        )
+
+    def export(self, export_format):
+        response = self.client.get(self.URL, {'format': export_format})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertIn(f'.{export_format}"', response['Content-Disposition'])
+        return response, b''.join(response.streaming_content)
+
+    def test_csv(self):
+        response, body = self.export('csv')
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        # Excelで開けるようBOM付きのUTF-8
+        self.assertTrue(body.startswith(codecs.BOM_UTF8))
+        reader = csv.reader(io.StringIO(body.decode('utf-8-sig'), newline=''))
+        self.assertEqual(next(reader), EXPORT_FIELDS)
+        rows = {row['id']: row for row in csv.DictReader(io.StringIO(body.decode('utf-8-sig'), newline=''))}
+        self.assertEqual(len(rows), 2)
+
+        row = rows[str(self.with_receipt.pk)]
+        self.assertEqual(
+            (row['date'], row['amount'], row['expense_type_display'], row['category_name'], row['description'], row['memo']),
+            ('2026-01-05', '800', '個人', '食費', '昼食, "定食"', '改行\nあり'),
+        )
+        self.assertTrue(row['receipt_image_url'].startswith('http://testserver/api/files/'))
+        response = APIClient().get(row['receipt_image_url'])
+        self.assertEqual(response.status_code, 200)
+        response.close()
+
+        other = next(row for pk, row in rows.items() if pk != str(self.with_receipt.pk))
+        self.assertEqual((other['category'], other['receipt_image_url']), ('', ''))
+
+    def test_ndjson(self):
+        response, body = self.export('ndjson')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson; charset=utf-8')
+        lines = body.decode('utf-8').splitlines()
+        self.assertEqual(len(lines), 2)
+        rows = {row['id']: row for row in map(json.loads, lines)}
+        row = rows[self.with_receipt.pk]
+        self.assertEqual((row['amount'], row['description']), (800, '昼食, "定食"'))
+        self.assertNotIn('receipt_image', row)
+        self.assertEqual(set(row['receipt_image_urls']), set(images.DERIVATIVE_SIZES))
+        self.assertTrue(row['receipt_image_url'].startswith('http://testserver/api/files/'))
+        self.assertIsNone(rows[next(pk for pk in rows if pk != self.with_receipt.pk)]['receipt_image_url'])
@@ -3,17 +3,28 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
+from rest_framework.renderers import JSONRenderer, BrowsableAPIRenderer
+from django.db import transaction
+from django.http import StreamingHttpResponse
 from django.db.models import Sum, Q
-from django.db.models.functions import TruncMonth
+from django.db.models.functions import ExtractMonth, ExtractYear
 from django.utils import timezone
 from datetime import datetime, date
 from dateutil.relativedelta import relativedelta
-from .models import ExpenseCategory, PaymentMethod, Expense, RecurringExpense
+from core.cache import cached_response
+from core.dates import date_range_filter, month_bounds, years_bounds
+from .models import ExpenseCategory, PaymentMethod, Expense, RecurringExpense, ExpenseMonthlyRollup
 from .serializers import (
     ExpenseCategorySerializer, PaymentMethodSerializer,
     ExpenseSerializer, ExpenseCreateUpdateSerializer,
     RecurringExpenseSerializer
 )
+from .recurring import MAX_GENERATE_MONTHS, month_range, generate_recurring_expenses
+from .imports import ExpenseImporter, ImportFormatError
+from .exports import ExpenseCSVRenderer, ExpenseNDJSONRenderer, stream_csv, stream_ndjson
+from .rows import VALUES_FIELDS, ExpenseRowBuilder
+from .analytics import analyze
+from .forecast import MAX_FORECAST_MONTHS, MAX_HISTORY_MONTHS, add_months, forecast
 
 
 class ExpenseCategoryViewSet(viewsets.ModelViewSet):
@@ -73,124 +84,270 @@ class ExpenseViewSet(viewsets.ModelViewSet):
         if end_date:
             queryset = queryset.filter(date__lte=end_date)
         if year and month:
-            queryset = queryset.filter(date__year=year, date__month=month)
+            queryset = queryset.filter(**date_range_filter('date', year, month))
         elif year:
-            queryset = queryset.filter(date__year=year)
+            queryset = queryset.filter(**date_range_filter('date', year))
         
         return queryset.select_related('category', 'payment_method')
 
+    # 保存・削除と月次集計・利用量の更新を同じトランザクションで行う
+    @transaction.atomic
     def perform_create(self, serializer):
         serializer.save(created_by=self.request.user)
 
+    @transaction.atomic
+    def perform_update(self, serializer):
+        serializer.save()
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        instance.delete()
+
+    def list(self, request, *args, **kwargs):
+        """一覧はExpenseSerializerを通さず values() から直接組み立てる"""
+        queryset = self.filter_queryset(self.get_queryset()).values(*VALUES_FIELDS)
+        builder = ExpenseRowBuilder(request)
+        
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response([builder.build(row) for row in page])
+        return Response([builder.build(row) for row in queryset])
+
+    SUMMARY_VALUES = (
+        'expense_type',
+        'category__id', 'category__name', 'category__icon', 'category__color',
+        'payment_method__id', 'payment_method__name', 'payment_method__icon',
+    )
+    YEARLY_SUMMARY_VALUES = ('year', 'month', 'expense_type')
+    MAX_SUMMARY_YEARS = 20
+
+    def get_summary_rows(self, fields, start_year, end_year=None, month=None):
+        """サマリー用の集計行を取得（期間指定がなければ月次集計テーブルを読む）"""
+        params = self.request.query_params
+        end_year = end_year or start_year
+
+        if params.get('start_date') or params.get('end_date'):
+            # 日付範囲は月単位の集計では表せないので支出から集計
+            if month:
+                start, end = month_bounds(start_year, month)
+            else:
+                start, end = years_bounds(start_year, end_year)
+            queryset = self.get_queryset().filter(date__gte=start, date__lt=end)
+            return queryset.annotate(
+                year=ExtractYear('date'),
+                month=ExtractMonth('date')
+            ).values(*fields).annotate(
+                total=Sum('amount')
+            ).order_by()
+
+        queryset = ExpenseMonthlyRollup.objects.filter(
+            created_by=self.request.user,
+            year__gte=start_year,
+            year__lte=end_year,
+            count__gt=0
+        )
+        if month:
+            queryset = queryset.filter(month=month)
+
+        expense_type = params.get('expense_type')
+        category = params.get('category')
+        payment_method = params.get('payment_method')
+        if expense_type:
+            queryset = queryset.filter(expense_type=expense_type)
+        if category:
+            queryset = queryset.filter(category_id=category)
+        if payment_method:
+            queryset = queryset.filter(payment_method_id=payment_method)
+
+        return queryset.values(*fields).annotate(
+            total=Sum('total')
+        ).order_by()
+
     @action(detail=False, methods=['get'])
+    @cached_response('expenses')
     def summary(self, request):
         """月別サマリーを取得"""
         year = request.query_params.get('year', timezone.now().year)
         month = request.query_params.get('month', timezone.now().month)
         
-        queryset = self.get_queryset().filter(date__year=year, date__month=month)
+        totals = {'personal': 0, 'business': 0}
+        by_category = {}
+        by_payment_method = {}
         
-        # 合計
-        totals = queryset.aggregate(
-            total=Sum('amount'),
-            personal_total=Sum('amount', filter=Q(expense_type='personal')),
-            business_total=Sum('amount', filter=Q(expense_type='business'))
-        )
-        
-        # カテゴリ別
-        by_category = queryset.values(
-            'category__id', 'category__name', 'category__icon', 'category__color'
-        ).annotate(
-            total=Sum('amount')
-        ).order_by('-total')
-        
-        # 支払方法別
-        by_payment_method = queryset.values(
-            'payment_method__id', 'payment_method__name', 'payment_method__icon'
-        ).annotate(
-            total=Sum('amount')
-        ).order_by('-total')
+        for row in self.get_summary_rows(self.SUMMARY_VALUES, year, month=month):
+            totals[row['expense_type']] = totals.get(row['expense_type'], 0) + row['total']
+            
+            # カテゴリ別
+            category = by_category.setdefault(row['category__id'], {
+                'id': row['category__id'],
+                'name': row['category__name'] or '未分類',
+                'icon': row['category__icon'] or '📁',
+                'color': row['category__color'] or 'gray',
+                'total': 0
+            })
+            category['total'] += row['total']
+            
+            # 支払方法別
+            payment_method = by_payment_method.setdefault(row['payment_method__id'], {
+                'id': row['payment_method__id'],
+                'name': row['payment_method__name'] or '未設定',
+                'icon': row['payment_method__icon'] or '💳',
+                'total': 0
+            })
+            payment_method['total'] += row['total']
         
         return Response({
             'year': int(year),
             'month': int(month),
-            'total': totals['total'] or 0,
-            'personal_total': totals['personal_total'] or 0,
-            'business_total': totals['business_total'] or 0,
-            'by_category': [
-                {
-                    'id': item['category__id'],
-                    'name': item['category__name'] or '未分類',
-                    'icon': item['category__icon'] or '📁',
-                    'color': item['category__color'] or 'gray',
-                    'total': item['total']
-                }
-                for item in by_category
-            ],
-            'by_payment_method': [
-                {
-                    'id': item['payment_method__id'],
-                    'name': item['payment_method__name'] or '未設定',
-                    'icon': item['payment_method__icon'] or '💳',
-                    'total': item['total']
-                }
-                for item in by_payment_method
-            ]
+            'total': sum(totals.values()),
+            'personal_total': totals['personal'],
+            'business_total': totals['business'],
+            'by_category': sorted(by_category.values(), key=lambda item: -item['total']),
+            'by_payment_method': sorted(by_payment_method.values(), key=lambda item: -item['total'])
         })
 
     @action(detail=False, methods=['get'])
+    @cached_response('expenses')
     def yearly_summary(self, request):
-        """年間サマリーを取得（月別推移）"""
-        year = request.query_params.get('year', timezone.now().year)
+        """年間サマリーを取得（月別推移）
+
+        start_year/end_year を指定すると複数年分をまとめて返す（1クエリ）
+        """
+        params = request.query_params
+        year = params.get('year', timezone.now().year)
+        multi_year = 'start_year' in params or 'end_year' in params
         
-        queryset = self.get_queryset().filter(date__year=year)
+        try:
+            start_year = int(params.get('start_year', year))
+            end_year = int(params.get('end_year', start_year))
+        except (TypeError, ValueError):
+            return Response({'error': 'year must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
         
-        # 月別集計
-        monthly_data = queryset.annotate(
-            month=TruncMonth('date')
-        ).values('month').annotate(
-            total=Sum('amount'),
-            personal_total=Sum('amount', filter=Q(expense_type='personal')),
-            business_total=Sum('amount', filter=Q(expense_type='business'))
-        ).order_by('month')
+        if end_year < start_year or end_year - start_year >= self.MAX_SUMMARY_YEARS:
+            return Response(
+                {'error': f'end_year must be between start_year and start_year + {self.MAX_SUMMARY_YEARS - 1}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        # 年・月・区分ごとの合計を1クエリで取得し、(年, 月) で引けるようにする
+        monthly_totals = {}
+        for row in self.get_summary_rows(self.YEARLY_SUMMARY_VALUES, start_year, end_year):
+            month_totals = monthly_totals.setdefault((row['year'], row['month']), {})
+            month_totals[row['expense_type']] = month_totals.get(row['expense_type'], 0) + row['total']
         
+        years = [
+            self._build_yearly_summary(y, monthly_totals)
+            for y in range(start_year, end_year + 1)
+        ]
+        
+        if not multi_year:
+            return Response(years[0])
+        return Response({
+            'start_year': start_year,
+            'end_year': end_year,
+            'years': years,
+            'total': sum(item['year_total'] for item in years),
+        })
+
+    @action(detail=False, methods=['get'])
+    @cached_response('expenses')
+    def analytics(self, request):
+        """推移・移動平均・前年比・カテゴリ構成比・パーセンタイルをまとめて取得
+
+        start_year〜end_year（既定は今年）の支出を列ごとにNumPy配列へ読み込んで計算する
+        """
+        params = request.query_params
+        try:
+            start_year = int(params.get('start_year', timezone.now().year))
+            end_year = int(params.get('end_year', start_year))
+        except (TypeError, ValueError):
+            return Response({'error': 'year must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        if end_year < start_year or end_year - start_year >= self.MAX_SUMMARY_YEARS:
+            return Response(
+                {'error': f'end_year must be between start_year and start_year + {self.MAX_SUMMARY_YEARS - 1}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        expense_type = params.get('expense_type')
+        if expense_type and expense_type not in dict(Expense.EXPENSE_TYPE_CHOICES):
+            return Response({'error': 'invalid expense_type'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        start, end = years_bounds(start_year, end_year)
+        return Response(analyze(request.user, start, end, expense_type=expense_type))
+
+    def _build_yearly_summary(self, year, monthly_totals):
+        """1年分の月別推移と年間合計を組み立てる"""
         # 12ヶ月分のデータを作成
         result = []
         for m in range(1, 13):
-            month_date = date(int(year), m, 1)
-            month_data = next(
-                (item for item in monthly_data if item['month'] and item['month'].month == m),
-                None
-            )
+            month_totals = monthly_totals.get((year, m), {})
             result.append({
                 'month': m,
                 'month_label': f'{m}月',
-                'total': month_data['total'] if month_data else 0,
-                'personal_total': month_data['personal_total'] if month_data else 0,
-                'business_total': month_data['business_total'] if month_data else 0,
+                'total': sum(month_totals.values()),
+                'personal_total': month_totals.get('personal', 0),
+                'business_total': month_totals.get('business', 0),
             })
         
-        # 年間合計
-        year_totals = queryset.aggregate(
-            total=Sum('amount'),
-            personal_total=Sum('amount', filter=Q(expense_type='personal')),
-            business_total=Sum('amount', filter=Q(expense_type='business'))
+        return {
+            'year': year,
+            'monthly_data': result,
+            'year_total': sum(item['total'] for item in result),
+            'year_personal_total': sum(item['personal_total'] for item in result),
+            'year_business_total': sum(item['business_total'] for item in result),
+        }
+
+    @action(detail=False, methods=['post'], url_path='import', parser_classes=[MultiPartParser, FormParser])
+    def import_csv(self, request):
+        """カード・銀行明細CSVから支出を一括登録
+
+        (日付, 金額, 内容) が既存の支出と一致する行は重複として読み飛ばす。
+        dry_run=true の場合は検証と件数の確認のみ行う
+        """
+        upload = request.FILES.get('file')
+        if not upload:
+            return Response({'error': 'file is required'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        expense_type = request.data.get('expense_type', 'personal')
+        if expense_type not in dict(Expense.EXPENSE_TYPE_CHOICES):
+            return Response({'error': 'invalid expense_type'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        importer = ExpenseImporter(
+            request.user,
+            default_expense_type=expense_type,
+            dry_run=str(request.data.get('dry_run', '')).lower() in ('1', 'true')
         )
+        try:
+            result = importer.run(upload, encoding=request.data.get('encoding') or None)
+        except (ImportFormatError, LookupError) as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         
-        return Response({
-            'year': int(year),
-            'monthly_data': result,
-            'year_total': year_totals['total'] or 0,
-            'year_personal_total': year_totals['personal_total'] or 0,
-            'year_business_total': year_totals['business_total'] or 0,
-        })
+        return Response(result, status=status.HTTP_200_OK if importer.dry_run else status.HTTP_201_CREATED)
 
-    @action(detail=False, methods=['get'])
+    @action(
+        detail=False,
+        methods=['get'],
+        renderer_classes=[JSONRenderer, BrowsableAPIRenderer, ExpenseCSVRenderer, ExpenseNDJSONRenderer]
+    )
     def export(self, request):
-        """CSV出力用データを取得"""
-        queryset = self.get_queryset()
-        serializer = ExpenseSerializer(queryset, many=True, context={'request': request})
-        return Response(serializer.data)
+        """CSV出力用データを取得
+
+        ?format=csv / ?format=ndjson はチャンク単位で読み出しながらストリーミングで返す
+        """
+        export_format = request.accepted_renderer.format
+        if export_format not in ('csv', 'ndjson'):
+            return Response(list(ExpenseRowBuilder(request).iter_rows(self.get_queryset())))
+        
+        # CSVにはサイズ別URLの列が無いので派生画像は扱わない
+        rows = ExpenseRowBuilder(request, with_derivatives=export_format != 'csv').iter_rows(self.get_queryset())
+        if export_format == 'csv':
+            response = StreamingHttpResponse(stream_csv(rows), content_type='text/csv; charset=utf-8')
+        else:
+            response = StreamingHttpResponse(stream_ndjson(rows), content_type='application/x-ndjson; charset=utf-8')
+        filename = f'expenses_{timezone.localdate():%Y%m%d}.{export_format}'
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
 
 
 class RecurringExpenseViewSet(viewsets.ModelViewSet):
@@ -208,48 +365,61 @@ class RecurringExpenseViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['post'])
     def generate(self, request):
-        """固定費から支出を生成"""
+        """固定費から支出を生成
+
+        year/month の月（end_year/end_month を指定するとその月まで）の分をまとめて生成する
+        """
         today = timezone.now().date()
-        year = request.data.get('year', today.year)
-        month = request.data.get('month', today.month)
-        
-        recurring_expenses = self.get_queryset().filter(is_active=True)
-        created_expenses = []
-        
-        for recurring in recurring_expenses:
-            # 対象月の日付を計算
-            try:
-                expense_date = date(int(year), int(month), min(recurring.day_of_month, 28))
-            except ValueError:
-                expense_date = date(int(year), int(month), 28)
-            
-            # 既に生成済みかチェック
-            existing = Expense.objects.filter(
-                created_by=request.user,
-                recurring_expense=recurring,
-                date__year=year,
-                date__month=month
-            ).exists()
-            
-            if not existing:
-                expense = Expense.objects.create(
-                    created_by=request.user,
-                    date=expense_date,
-                    amount=recurring.amount,
-                    expense_type=recurring.expense_type,
-                    category=recurring.category,
-                    payment_method=recurring.payment_method,
-                    description=recurring.name,
-                    recurring_expense=recurring
-                )
-                created_expenses.append(expense)
-                
-                # 最終生成日を更新
-                recurring.last_generated_date = expense_date
-                recurring.save()
-        
-        serializer = ExpenseSerializer(created_expenses, many=True, context={'request': request})
+        try:
+            year = int(request.data.get('year', today.year))
+            month = int(request.data.get('month', today.month))
+            end_year = int(request.data.get('end_year', year))
+            end_month = int(request.data.get('end_month', month))
+        except (TypeError, ValueError):
+            return Response({'error': 'year/month must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        span = (end_year * 12 + end_month) - (year * 12 + month) + 1
+        if not 1 <= span <= MAX_GENERATE_MONTHS:
+            return Response(
+                {'error': f'month range must be 1 to {MAX_GENERATE_MONTHS} months'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            months = month_range(year, month, end_year, end_month)
+        except ValueError:
+            return Response({'error': 'invalid year/month'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        created_expenses = generate_recurring_expenses(request.user, months)
+        
+        builder = ExpenseRowBuilder(request)
         return Response({
             'message': f'{len(created_expenses)}件の支出を生成しました',
-            'created': serializer.data
-        })
\ No newline at end of file
+            'created': [builder.build_instance(expense) for expense in created_expenses]
+        })
+
+    @action(detail=False, methods=['get'])
+    @cached_response('expenses')
+    def forecast(self, request):
+        """今後の支出見込み（固定費の展開 + 直近の変動費の月平均）
+
+        months ヶ月分（既定12）を来月から、history_months ヶ月（既定3）の平均で計算する
+        """
+        try:
+            months = int(request.query_params.get('months', 12))
+            history_months = int(request.query_params.get('history_months', 3))
+        except (TypeError, ValueError):
+            return Response({'error': 'months must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        if not 1 <= months <= MAX_FORECAST_MONTHS:
+            return Response(
+                {'error': f'months must be between 1 and {MAX_FORECAST_MONTHS}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not 1 <= history_months <= MAX_HISTORY_MONTHS:
+            return Response(
+                {'error': f'history_months must be between 1 and {MAX_HISTORY_MONTHS}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        start = add_months(timezone.localdate().replace(day=1), 1)
+        return Response(forecast(request.user, start, months, history_months))
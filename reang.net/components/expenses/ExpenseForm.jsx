@@ -20,7 +20,7 @@ const ExpenseForm = ({ onSubmit, onCancel, onDelete, initialData = null, isEdit
   useEffect(() => {
     fetchOptions()
     if (initialData?.receipt_image_url) {
-      setPreviewImage(initialData.receipt_image_url)
+      setPreviewImage(initialData.receipt_image_urls?.medium || initialData.receipt_image_url)
     }
   }, [])
 
@@ -302,7 +302,7 @@ const CustomerDetail = () => {
               <p className="text-sm text-gray-500 mb-2">表面</p>
               {customer.business_card_front_url ? (
                 <img
-                  src={customer.business_card_front_url}
+                  src={customer.business_card_front_urls?.medium || customer.business_card_front_url}
                   alt="名刺（表）"
                   className="w-full rounded-lg border"
                 />
@@ -327,7 +327,7 @@ const CustomerDetail = () => {
               <p className="text-sm text-gray-500 mb-2">裏面</p>
               {customer.business_card_back_url ? (
                 <img
-                  src={customer.business_card_back_url}
+                  src={customer.business_card_back_urls?.medium || customer.business_card_back_url}
                   alt="名刺（裏）"
                   className="w-full rounded-lg border"
                 />
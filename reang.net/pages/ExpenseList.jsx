@@ -284,7 +284,7 @@ const ExpenseList = () => {
                   {/* レシートアイコン */}
                   {expense.receipt_image_url && (
                     <button
-                      onClick={(e) => handleReceiptClick(e, expense.receipt_image_url)}
+                      onClick={(e) => handleReceiptClick(e, expense.receipt_image_urls?.medium || expense.receipt_image_url)}
                       className="flex-shrink-0 text-gray-400 hover:text-blue-500"
                     >
                       🧾
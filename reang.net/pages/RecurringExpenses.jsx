@@ -26,6 +26,7 @@ const RecurringExpenses = () => {
     payment_method: '',
     frequency: 'monthly',
     day_of_month: 1,
+    month_of_year: '',
     is_active: true,
   })
 
@@ -59,6 +60,7 @@ const RecurringExpenses = () => {
       payment_method: '',
       frequency: 'monthly',
       day_of_month: 1,
+      month_of_year: '',
       is_active: true,
     })
     setEditingExpense(null)
@@ -74,6 +76,7 @@ const RecurringExpenses = () => {
         payment_method: expense.payment_method || '',
         frequency: expense.frequency,
         day_of_month: expense.day_of_month,
+        month_of_year: expense.month_of_year || '',
         is_active: expense.is_active,
       })
       setEditingExpense(expense)
@@ -103,6 +106,9 @@ const RecurringExpenses = () => {
       ...formData,
       amount: parseInt(formData.amount, 10),
       day_of_month: parseInt(formData.day_of_month, 10),
+      month_of_year: formData.frequency === 'yearly' && formData.month_of_year
+        ? parseInt(formData.month_of_year, 10)
+        : null,
       category: formData.category || null,
       payment_method: formData.payment_method || null,
     }
@@ -354,6 +360,26 @@ const RecurringExpenses = () => {
             </div>
           </div>
 
+          {/* 支払月（毎年の場合） */}
+          {formData.frequency === 'yearly' && (
+            <div>
+              <label className="block text-sm font-medium text-gray-700 mb-1">
+                支払月
+              </label>
+              <select
+                name="month_of_year"
+                value={formData.month_of_year}
+                onChange={handleChange}
+                className="w-full border border-gray-300 rounded-lg px-3 py-2.5 sm:py-2 focus:outline-none focus:ring-2 focus:ring-blue-500"
+              >
+                <option value="">登録月</option>
+                {[...Array(12)].map((_, i) => (
+                  <option key={i + 1} value={i + 1}>{i + 1}月</option>
+                ))}
+              </select>
+            </div>
+          )}
+
           {/* カテゴリ */}
           <div>
             <label className="block text-sm font-medium text-gray-700 mb-1">
@@ -21,9 +21,34 @@ const authFetch = async (url, options = {}) => {
   })
 }
 
-// タスク一覧を取得
-export const getTasks = async () => {
-  const response = await authFetch(`${API_BASE_URL}/tasks/`)
+// タスク一覧を取得（status / priority はカンマ区切り、ordering は '-priority' など）
+export const getTasks = async (params = {}) => {
+  const queryParams = new URLSearchParams()
+
+  if (params.status) queryParams.append('status', params.status)
+  if (params.priority) queryParams.append('priority', params.priority)
+  if (params.due_from) queryParams.append('due_from', params.due_from)
+  if (params.due_to) queryParams.append('due_to', params.due_to)
+  if (params.overdue) queryParams.append('overdue', 'true')
+  if (params.search) queryParams.append('search', params.search)
+  if (params.ordering) queryParams.append('ordering', params.ordering)
+
+  const queryString = queryParams.toString()
+  const response = await authFetch(`${API_BASE_URL}/tasks/${queryString ? `?${queryString}` : ''}`)
+  if (!response.ok) throw new Error('タスクの取得に失敗しました')
+  return response.json()
+}
+
+// カンバン用にステータスごとの件数と先頭 limit 件を取得（続きは各列の next を取得する）
+export const getTaskBoard = async (limit = 20) => {
+  const response = await authFetch(`${API_BASE_URL}/tasks/board/?limit=${limit}`)
+  if (!response.ok) throw new Error('タスクの取得に失敗しました')
+  return response.json()
+}
+
+// カンバンの列の続きを取得
+export const getTaskBoardColumn = async (nextUrl) => {
+  const response = await authFetch(nextUrl)
   if (!response.ok) throw new Error('タスクの取得に失敗しました')
   return response.json()
 }
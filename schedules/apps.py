@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class SchedulesConfig(AppConfig):
     name = 'schedules'
+
+    def ready(self):
+        from . import signals  # noqa: F401
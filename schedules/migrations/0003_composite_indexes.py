@@ -0,0 +1,20 @@
+# Generated by Django 5.2.3 on 2026-10-17 12:46
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0003_composite_indexes'),
+        ('schedules', '0002_schedule_owner'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='schedule',
+            index=models.Index(fields=['owner', 'date', 'start_time'], name='schedule_owner_date'),
+        ),
+    ]
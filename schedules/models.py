@@ -46,6 +46,9 @@ class Schedule(models.Model):
         verbose_name = 'スケジュール'
         verbose_name_plural = 'スケジュール'
         ordering = ['date', 'start_time']
+        indexes = [
+            models.Index(fields=['owner', 'date', 'start_time'], name='schedule_owner_date'),
+        ]
 
     def __str__(self):
         return f'{self.date} - {self.title}'
\ No newline at end of file
@@ -5,7 +5,7 @@ from customers.serializers import CustomerListSerializer
 
 class ScheduleSerializer(serializers.ModelSerializer):
     customer_name = serializers.SerializerMethodField()
-    owner = serializers.ReadOnlyField(source='owner.id')
+    owner = serializers.ReadOnlyField(source='owner_id')
 
     class Meta:
         model = Schedule
@@ -17,6 +17,9 @@ class ScheduleSerializer(serializers.ModelSerializer):
         }
 
     def get_customer_name(self, obj):
+        # 一覧・カレンダーではクエリセットで annotate した顧客名を使う
+        if hasattr(obj, 'customer_name'):
+            return obj.customer_name
         if obj.customer:
             return obj.customer.name
         return None
\ No newline at end of file
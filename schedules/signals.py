@@ -0,0 +1,5 @@
+from core import cache
+from .models import Schedule
+
+
+cache.register(Schedule, 'owner_id')
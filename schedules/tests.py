@@ -1,3 +1,57 @@
+from datetime import date
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from accounts.models import User
+from customers.models import Customer
+from tasks.models import Task
+from .models import Schedule
 
-# Create your tests here.
+
+class ScheduleQueryCountTests(TestCase):
+    """スケジュール・タスクの一覧系のクエリ数が件数に依存しないこと"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('owner', 'owner@example.com', 'password')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.day = date(2026, 4, 1)
+
+    def add_rows(self, count):
+        with self.captureOnCommitCallbacks(execute=True):
+            for i in range(count):
+                customer = Customer.objects.create(created_by=self.user, name=f'顧客{i}')
+                Schedule.objects.create(owner=self.user, title=f'予定{i}', date=self.day, customer=customer)
+                Task.objects.create(owner=self.user, title=f'タスク{i}', due_date=self.day)
+
+    def assert_constant(self, url, params=None):
+        self.add_rows(2)
+        with CaptureQueriesContext(connection) as few:
+            self.assertEqual(self.client.get(url, params).status_code, 200)
+        self.add_rows(10)
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(few), len(many))
+        return response.json()
+
+    def test_calendar(self):
+        data = self.assert_constant('/api/schedules/calendar/', {'start_date': self.day, 'end_date': self.day})
+        self.assertEqual(len(data['schedules']), 12)
+        self.assertTrue(all(item['customer_name'] for item in data['schedules']))
+        self.assertEqual(len(data['tasks']), 12)
+
+    def test_daily(self):
+        data = self.assert_constant('/api/schedules/daily/', {'date': self.day})
+        self.assertEqual(len(data['schedules']), 12)
+
+    def test_schedule_list(self):
+        data = self.assert_constant('/api/schedules/')
+        self.assertEqual(data[0]['owner'], self.user.id)
+
+    def test_task_list(self):
+        data = self.assert_constant('/api/tasks/')
+        self.assertEqual(len(data), 12)
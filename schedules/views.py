@@ -1,14 +1,20 @@
 from rest_framework import viewsets
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from django.db.models import Q
+from django.db.models import F, Q
 from datetime import datetime, timedelta
+from core.cache import cached_response
 from .models import Schedule
 from .serializers import ScheduleSerializer
 from tasks.models import Task
 from tasks.serializers import TaskSerializer
 
 
+def with_customer_name(queryset):
+    """顧客名をJOINで取得（シリアライザが行ごとに顧客を読み込まないように）"""
+    return queryset.annotate(customer_name=F('customer__name'))
+
+
 class ScheduleViewSet(viewsets.ModelViewSet):
     serializer_class = ScheduleSerializer
 
@@ -23,6 +29,9 @@ class ScheduleViewSet(viewsets.ModelViewSet):
         if end_date:
             queryset = queryset.filter(date__lte=end_date)
         
+        # 更新時は変更後の顧客名を返すため、読み取りのときだけ付ける
+        if self.action in ('list', 'retrieve'):
+            queryset = with_customer_name(queryset)
         return queryset
 
     def perform_create(self, serializer):
@@ -30,6 +39,7 @@ class ScheduleViewSet(viewsets.ModelViewSet):
         serializer.save(owner=self.request.user)
 
     @action(detail=False, methods=['get'], url_path='calendar')
+    @cached_response('schedules', 'tasks', 'customers')
     def calendar(self, request):
         """カレンダー表示用"""
         start_date = request.query_params.get('start_date')
@@ -38,11 +48,11 @@ class ScheduleViewSet(viewsets.ModelViewSet):
         if not start_date or not end_date:
             return Response({'error': 'start_date and end_date are required'}, status=400)
         
-        schedules = Schedule.objects.filter(
+        schedules = with_customer_name(Schedule.objects.filter(
             owner=self.request.user,
             date__gte=start_date,
             date__lte=end_date
-        )
+        ))
         schedule_data = ScheduleSerializer(schedules, many=True).data
         
         tasks = Task.objects.filter(
@@ -65,10 +75,10 @@ class ScheduleViewSet(viewsets.ModelViewSet):
         if not date:
             return Response({'error': 'date is required'}, status=400)
         
-        schedules = Schedule.objects.filter(
+        schedules = with_customer_name(Schedule.objects.filter(
             owner=self.request.user,
             date=date
-        ).order_by('start_time')
+        )).order_by('start_time')
         schedule_data = ScheduleSerializer(schedules, many=True).data
         
         tasks = Task.objects.filter(
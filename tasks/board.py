@@ -0,0 +1,73 @@
+from django.db.models import Count, F, Window
+from django.db.models.functions import RowNumber
+from rest_framework.exceptions import ValidationError
+from core.pagination import KeysetPagination
+from .filters import priority_rank
+from .models import Task
+
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 200
+# ボード上の並び順（優先度の高い順 → 期限の近い順（期限なしは末尾）→ 新しい順）
+BOARD_ORDERING = [('priority_rank', True), ('due_date', False), ('created_at', True), ('id', True)]
+
+
+def _order_by():
+    return [
+        F(field).desc(nulls_last=True) if descending else F(field).asc(nulls_last=True)
+        for field, descending in BOARD_ORDERING
+    ]
+
+
+def parse_limit(value):
+    if not value:
+        return DEFAULT_LIMIT
+    try:
+        limit = int(value)
+    except ValueError:
+        raise ValidationError({'limit': 'limit must be an integer'})
+    return max(1, min(limit, MAX_LIMIT))
+
+
+def load_board(queryset, limit):
+    """ステータスごとに先頭 limit 件と件数を返す
+
+    ROW_NUMBER() / COUNT() OVER (PARTITION BY status) を付けて行番号で絞るので、
+    完了が何千件あっても1クエリで各列の先頭だけを読む
+    """
+    partition = [F('status')]
+    rows = queryset.annotate(priority_rank=priority_rank()).annotate(
+        row_number=Window(RowNumber(), partition_by=partition, order_by=_order_by()),
+        column_count=Window(Count('id'), partition_by=partition),
+    ).filter(row_number__lte=limit).order_by('status', 'row_number')
+
+    columns = {status: {'count': 0, 'tasks': []} for status, _ in Task.STATUS_CHOICES}
+    for task in rows:
+        column = columns[task.status]
+        column['count'] = task.column_count
+        column['tasks'].append(task)
+    return columns
+
+
+def load_column(queryset, status, limit, cursor=None):
+    """1列の続き（カーソルより後ろ）を limit 件読み、(タスク, 次のカーソル) を返す"""
+    paginator = KeysetPagination()
+    queryset = queryset.filter(status=status).annotate(priority_rank=priority_rank()).order_by(*_order_by())
+    if cursor:
+        values = paginator.decode_cursor(cursor)
+        if not isinstance(values, list) or len(values) != len(BOARD_ORDERING):
+            raise ValidationError({'cursor': paginator.invalid_cursor_message})
+        queryset = queryset.filter(paginator.after_cursor(BOARD_ORDERING, values))
+
+    tasks = list(queryset[:limit + 1])
+    if len(tasks) <= limit:
+        return tasks, None
+    tasks = tasks[:limit]
+    return tasks, next_cursor(tasks[-1])
+
+
+def next_cursor(task):
+    paginator = KeysetPagination()
+    return paginator.encode_cursor([
+        paginator._cursor_value(getattr(task, field)) for field, _ in BOARD_ORDERING
+    ])
@@ -0,0 +1,93 @@
+from datetime import date
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from .models import Task
+
+
+STATUSES = {value for value, _ in Task.STATUS_CHOICES}
+PRIORITIES = [value for value, _ in Task.PRIORITY_CHOICES]
+OPEN_STATUSES = ('todo', 'in_progress')
+# ordering に指定できる列（priority は low < medium < high の順位で並べる）
+ORDERING_FIELDS = {
+    'due_date': 'due_date',
+    'priority': 'priority_rank',
+    'status': 'status',
+    'title': 'title',
+    'created_at': 'created_at',
+    'updated_at': 'updated_at',
+}
+TRUE_VALUES = ('1', 'true', 'yes')
+
+
+def _choices(params, name, allowed):
+    """カンマ区切りの値を選択肢の中から取り出す"""
+    values = [value.strip() for value in params.get(name, '').split(',') if value.strip()]
+    invalid = [value for value in values if value not in allowed]
+    if invalid:
+        raise ValidationError({name: f"invalid value: {', '.join(invalid)}"})
+    return values
+
+
+def _date(params, name):
+    value = params.get(name)
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ValidationError({name: f'{name} must be a date (YYYY-MM-DD)'})
+
+
+def priority_rank():
+    return Case(
+        *[When(priority=value, then=Value(rank)) for rank, value in enumerate(PRIORITIES)],
+        output_field=IntegerField(),
+    )
+
+
+def filter_tasks(queryset, params):
+    """クエリパラメーターで絞り込む
+
+    status / priority はカンマ区切りで複数指定でき、(所有者, ステータス, 期限)・
+    (所有者, 優先度) のインデックスで検索する
+    """
+    statuses = _choices(params, 'status', STATUSES)
+    priorities = _choices(params, 'priority', PRIORITIES)
+    due_from = _date(params, 'due_from')
+    due_to = _date(params, 'due_to')
+
+    if statuses:
+        queryset = queryset.filter(status__in=statuses)
+    if priorities:
+        queryset = queryset.filter(priority__in=priorities)
+    if due_from:
+        queryset = queryset.filter(due_date__gte=due_from)
+    if due_to:
+        queryset = queryset.filter(due_date__lte=due_to)
+    if params.get('overdue', '').lower() in TRUE_VALUES:
+        # 期限切れ = 未完了で期限が今日より前
+        queryset = queryset.filter(status__in=OPEN_STATUSES, due_date__lt=timezone.localdate())
+
+    for term in params.get('search', '').split():
+        queryset = queryset.filter(Q(title__icontains=term) | Q(description__icontains=term))
+    return queryset
+
+
+def ordering(params):
+    """ordering=due_date,-priority のような指定を並び順のリストにする（指定が無ければNone）"""
+    fields = []
+    for value in params.get('ordering', '').split(','):
+        value = value.strip()
+        if not value:
+            continue
+        name = value.lstrip('-')
+        if name not in ORDERING_FIELDS:
+            raise ValidationError({'ordering': f'cannot order by {name}'})
+        fields.append(('-' if value.startswith('-') else '') + ORDERING_FIELDS[name])
+    if not fields:
+        return None
+    # 同じ値の行の順序が変わらないよう、作成日時とIDで並べる
+    if not any(field.lstrip('-') == 'created_at' for field in fields):
+        fields.append('-created_at')
+    return fields
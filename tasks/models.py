@@ -33,6 +33,13 @@ class Task(models.Model):
         verbose_name = 'タスク'
         verbose_name_plural = 'タスク'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['owner', 'due_date'], name='task_owner_due_date'),
+            models.Index(fields=['owner', 'created_at'], name='task_owner_created_at'),
+            # 一覧の絞り込み（ステータス＋期限範囲・期限切れ、優先度）用
+            models.Index(fields=['owner', 'status', 'due_date'], name='task_owner_status_due'),
+            models.Index(fields=['owner', 'priority'], name='task_owner_priority'),
+        ]
 
     def __str__(self):
         return self.title
\ No newline at end of file
@@ -3,7 +3,7 @@ from .models import Task
 
 
 class TaskSerializer(serializers.ModelSerializer):
-    owner = serializers.ReadOnlyField(source='owner.id')
+    owner = serializers.ReadOnlyField(source='owner_id')
 
     class Meta:
         model = Task
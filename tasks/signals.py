@@ -0,0 +1,7 @@
+from accounts import usage
+from core import cache
+from .models import Task
+
+
+cache.register(Task, 'owner_id')
+usage.register_count(Task, 'task_count', owner='owner_id')
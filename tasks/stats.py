@@ -0,0 +1,90 @@
+import numpy as np
+from django.utils import timezone
+from .models import Task
+
+
+STATUSES = [value for value, _ in Task.STATUS_CHOICES]
+PRIORITIES = [value for value, _ in Task.PRIORITY_CHOICES]
+DONE = STATUSES.index('done')
+LEAD_TIME_PERCENTILES = (50, 90)
+
+
+def load_columns(queryset):
+    """(作成日時, ステータス, 優先度, 完了日時, 期限) を1クエリで読み込み、NumPy配列にする
+
+    月はDBではなくここで現地時間に変換する（created_at__month のような変換をDBでしない）
+    """
+    rows = list(queryset.order_by().values_list('created_at', 'status', 'priority', 'completed_at', 'due_date'))
+    status_codes = {value: code for code, value in enumerate(STATUSES)}
+    priority_codes = {value: code for code, value in enumerate(PRIORITIES)}
+    month, status, priority, lead_hours, due, on_time = [], [], [], [], [], []
+    for created_at, task_status, task_priority, completed_at, due_date in rows:
+        month.append(timezone.localtime(created_at).month)
+        status.append(status_codes[task_status])
+        priority.append(priority_codes[task_priority])
+        finished = task_status == 'done' and completed_at is not None
+        lead_hours.append((completed_at - created_at).total_seconds() / 3600 if finished else np.nan)
+        due.append(finished and due_date is not None)
+        on_time.append(finished and due_date is not None and timezone.localdate(completed_at) <= due_date)
+    return {
+        'month': np.array(month, dtype=np.int64),
+        'status': np.array(status, dtype=np.int64),
+        'priority': np.array(priority, dtype=np.int64),
+        'lead_hours': np.array(lead_hours, dtype=np.float64),
+        'due': np.array(due, dtype=bool),
+        'on_time': np.array(on_time, dtype=bool),
+    }
+
+
+def status_counts(columns):
+    """(ステータス, 月) ごとの件数の行列（列は1〜12月、0列目は未使用）"""
+    index = columns['status'] * 13 + columns['month']
+    return np.bincount(index, minlength=len(STATUSES) * 13).reshape(len(STATUSES), 13)
+
+
+def on_time_counts(columns):
+    """月ごとの (期限付きで完了した件数, 期限内に完了した件数)"""
+    due = np.bincount(columns['month'][columns['due']], minlength=13)
+    on_time = np.bincount(columns['month'][columns['on_time']], minlength=13)
+    return due, on_time
+
+
+def rate(part, whole):
+    return round(part / whole * 100, 1) if whole > 0 else 0
+
+
+def lead_time(columns):
+    """優先度ごとの完了までの時間（時間単位の中央値・p90）"""
+    result = {}
+    for code, value in enumerate(PRIORITIES):
+        hours = columns['lead_hours'][(columns['priority'] == code) & ~np.isnan(columns['lead_hours'])]
+        hours = hours[hours >= 0]
+        stats = {'count': int(len(hours))}
+        points = np.percentile(hours, LEAD_TIME_PERCENTILES) if len(hours) else [None] * len(LEAD_TIME_PERCENTILES)
+        for p, point in zip(LEAD_TIME_PERCENTILES, points):
+            key = 'median_hours' if p == 50 else f'p{p}_hours'
+            stats[key] = None if point is None else round(float(point), 1)
+        result[value] = stats
+    return result
+
+
+def summarize(columns, months):
+    """指定月ごとの件数・達成率・期限内完了率と、期間全体の完了までの時間"""
+    counts = status_counts(columns)
+    due, on_time = on_time_counts(columns)
+    data = []
+    for month in months:
+        total = int(counts[:, month].sum())
+        done = int(counts[DONE, month])
+        item = {'month': month, 'total': total}
+        item.update({value: int(counts[code, month]) for code, value in enumerate(STATUSES)})
+        item['completion_rate'] = rate(done, total)
+        item['on_time_rate'] = rate(int(on_time[month]), int(due[month]))
+        data.append(item)
+
+    due_total, on_time_total = int(due[months].sum()), int(on_time[months].sum())
+    return {
+        'data': data,
+        'lead_time': lead_time(columns),
+        'on_time': {'due': due_total, 'on_time': on_time_total, 'rate': rate(on_time_total, due_total)},
+    }
@@ -1,3 +1,160 @@
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from unittest import mock
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from accounts.models import User
+from .models import Task
 
-# Create your tests here.
+
+class TaskStatsTests(TestCase):
+    """タスクの月別・年別の集計が1クエリで、現地時間の月ごとに集計されること"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('owner', 'owner@example.com', 'password')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def add_task(self, created_at, status='todo', priority='medium', lead=None, due_date=None):
+        task = Task.objects.create(owner=self.user, title='t', status=status, priority=priority, due_date=due_date)
+        completed_at = created_at + lead if lead is not None else None
+        # created_at は auto_now_add なので update() で書き換える
+        Task.objects.filter(pk=task.pk).update(created_at=created_at, completed_at=completed_at)
+
+    def local(self, *args):
+        return timezone.make_aware(datetime(*args))
+
+    def get(self, url, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(queries), 1)
+        return response.json()
+
+    def test_yearly_stats(self):
+        # 現地時間の3月1日 0:30 は UTC では2月になるが、3月として数える
+        self.add_task(self.local(2026, 3, 1, 0, 30), 'done', 'high', timedelta(hours=10), date(2026, 3, 1))
+        self.add_task(self.local(2026, 3, 10), 'done', 'high', timedelta(hours=30), date(2026, 3, 10))
+        self.add_task(self.local(2026, 3, 20), 'in_progress')
+        self.add_task(self.local(2026, 7, 1), 'todo', 'low')
+        self.add_task(self.local(2025, 12, 31, 23), 'done', 'low', timedelta(hours=1))
+
+        data = self.get('/api/tasks/stats/yearly/', year=2026)
+        march = data['data'][2]
+        self.assertEqual((march['total'], march['done'], march['in_progress']), (3, 2, 1))
+        self.assertEqual(march['completion_rate'], 66.7)
+        self.assertEqual(march['on_time_rate'], 50.0)
+        self.assertEqual(data['data'][6]['todo'], 1)
+        self.assertEqual(sum(item['total'] for item in data['data']), 4)
+        self.assertEqual(data['lead_time']['high'], {'count': 2, 'median_hours': 20.0, 'p90_hours': 28.0})
+        self.assertEqual(data['lead_time']['low']['count'], 0)
+        self.assertEqual(data['on_time'], {'due': 2, 'on_time': 1, 'rate': 50.0})
+
+    def test_monthly_stats(self):
+        self.add_task(self.local(2026, 3, 5), 'done', 'medium', timedelta(hours=4))
+        self.add_task(self.local(2026, 3, 6))
+
+        data = self.get('/api/tasks/stats/monthly/', year=2026, month=3)
+        self.assertEqual((data['total'], data['done'], data['todo'], data['completion_rate']), (2, 1, 1, 50.0))
+        self.assertEqual(data['lead_time']['medium']['median_hours'], 4.0)
+
+
+class TaskListFilterTests(TestCase):
+    """一覧の絞り込み・検索・並び替えとカーソルページネーション"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('owner', 'owner@example.com', 'password')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        today = timezone.localdate()
+        self.add('請求書を送る', 'todo', 'high', today - timedelta(days=2), '山田様あて')
+        self.add('見積作成', 'in_progress', 'low', today + timedelta(days=3))
+        self.add('議事録', 'done', 'medium', today - timedelta(days=5))
+        self.add('名刺整理', 'todo', 'medium')
+
+    def add(self, title, status, priority, due_date=None, description=''):
+        return Task.objects.create(
+            owner=self.user, title=title, status=status, priority=priority,
+            due_date=due_date, description=description,
+        )
+
+    def titles(self, **params):
+        response = self.client.get('/api/tasks/', params)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        return [item['title'] for item in (data['results'] if isinstance(data, dict) else data)]
+
+    def test_filters(self):
+        self.assertEqual(set(self.titles(status='todo,in_progress')), {'請求書を送る', '見積作成', '名刺整理'})
+        self.assertEqual(self.titles(priority='high'), ['請求書を送る'])
+        self.assertEqual(self.titles(overdue='true'), ['請求書を送る'])
+        today = timezone.localdate()
+        self.assertEqual(
+            set(self.titles(due_from=today - timedelta(days=5), due_to=today)), {'請求書を送る', '議事録'}
+        )
+        self.assertEqual(self.titles(search='山田'), ['請求書を送る'])
+        self.assertEqual(self.client.get('/api/tasks/', {'status': 'closed'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/tasks/', {'ordering': 'owner'}).status_code, 400)
+
+    def test_overdue_uses_local_date(self):
+        Task.objects.all().delete()
+        self.add('昨日まで', 'todo', 'medium', date(2026, 3, 9))
+        self.add('今日まで', 'in_progress', 'medium', date(2026, 3, 10))
+        # 日本時間では3月10日 1:00（UTCではまだ3月9日）
+        now = datetime(2026, 3, 9, 16, 0, tzinfo=dt_timezone.utc)
+        with mock.patch('django.utils.timezone.now', return_value=now):
+            self.assertEqual(self.titles(overdue='true'), ['昨日まで'])
+            response = self.client.get('/api/tasks/overdue/')
+        self.assertEqual([item['title'] for item in response.json()], ['昨日まで'])
+
+    def test_ordering_and_cursor(self):
+        self.assertEqual(self.titles(ordering='due_date'), ['議事録', '請求書を送る', '見積作成', '名刺整理'])
+        self.assertEqual(self.titles(ordering='-priority,title')[0], '請求書を送る')
+
+        response = self.client.get('/api/tasks/', {'ordering': '-priority', 'page_size': 2})
+        first = response.json()
+        second = self.client.get(first['next']).json()
+        titles = [item['title'] for item in first['results'] + second['results']]
+        self.assertEqual(titles[0], '請求書を送る')
+        self.assertEqual(titles[-1], '見積作成')
+        self.assertEqual(len(set(titles)), 4)
+
+
+class TaskBoardTests(TestCase):
+    """カンバンの各列が1クエリで件数と先頭N件を返し、続きをカーソルで読めること"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('owner', 'owner@example.com', 'password')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        for i in range(5):
+            Task.objects.create(owner=self.user, title=f'done{i}', status='done', due_date=date(2026, 1, 1 + i))
+        Task.objects.create(owner=self.user, title='urgent', status='todo', priority='high')
+        Task.objects.create(owner=self.user, title='later', status='todo', priority='low', due_date=date(2026, 1, 1))
+
+    def test_board_and_column_cursor(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/tasks/board/', {'limit': 2})
+        self.assertEqual(response.status_code, 200)
+        # 検証子の集計 + ボード本体
+        self.assertEqual(len(queries), 2)
+        columns = {column['status']: column for column in response.json()['columns']}
+        self.assertEqual([task['title'] for task in columns['todo']['tasks']], ['urgent', 'later'])
+        self.assertIsNone(columns['todo']['next'])
+        self.assertEqual((columns['in_progress']['count'], columns['in_progress']['tasks']), (0, []))
+        self.assertEqual(columns['done']['count'], 5)
+        self.assertEqual([task['title'] for task in columns['done']['tasks']], ['done0', 'done1'])
+
+        titles = []
+        url = columns['done']['next']
+        while url:
+            data = self.client.get(url).json()
+            titles += [task['title'] for task in data['tasks']]
+            url = data['next']
+        self.assertEqual(titles, ['done2', 'done3', 'done4'])
@@ -1,11 +1,15 @@
 from rest_framework import viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+from django.db.models import F
 from django.utils import timezone
-from django.db.models import Count, Q
-from django.db.models.functions import TruncMonth
-from datetime import datetime, timedelta
+from core.cache import cached_response
+from core.conditional import conditional
+from core.dates import local_datetime_bounds
 from .models import Task
+from . import board, filters, stats
 from .serializers import TaskSerializer
 
 
@@ -16,6 +20,37 @@ class TaskViewSet(viewsets.ModelViewSet):
         """ ログインユーザーのタスクのみ返す """
         return Task.objects.filter(owner=self.request.user)
 
+    def filter_queryset(self, queryset):
+        """ 一覧の絞り込み・検索・並び替え """
+        if self.action != 'list':
+            return queryset
+        params = self.request.query_params
+        queryset = filters.filter_tasks(queryset, params)
+        ordering = self.keyset_ordering
+        if ordering:
+            if any(field.lstrip('-') == 'priority_rank' for field in ordering):
+                queryset = queryset.annotate(priority_rank=filters.priority_rank())
+            # 期限なしは昇順・降順とも末尾に並べる（カーソルページネーションと同じ）
+            queryset = queryset.order_by(*[
+                F(field[1:]).desc(nulls_last=True) if field.startswith('-') else F(field).asc(nulls_last=True)
+                for field in ordering
+            ])
+        return queryset
+
+    @property
+    def keyset_ordering(self):
+        if self.request and self.action == 'list':
+            return filters.ordering(self.request.query_params)
+        return None
+
+    @conditional(lambda view, request: [view.filter_queryset(view.get_queryset())])
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @conditional(lambda view, request, pk=None: [view.get_queryset().filter(pk=pk)])
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
     def perform_create(self, serializer):
         """ タスク作成時に自動でownerをセット """
         serializer.save(owner=self.request.user)
@@ -31,73 +66,107 @@ class TaskViewSet(viewsets.ModelViewSet):
         else:
             serializer.save()
 
+    def stats_columns(self, year, month=None):
+        # 作成日時の範囲で絞り、集計は1回読み込んだ列から行う
+        start, end = local_datetime_bounds(year, month)
+        return stats.load_columns(Task.objects.filter(
+            owner=self.request.user,
+            created_at__gte=start,
+            created_at__lt=end
+        ))
+
     @action(detail=False, methods=['get'], url_path='stats/monthly')
+    @cached_response('tasks')
     def monthly_stats(self, request):
-        """月別タスク達成率"""
-        year = request.query_params.get('year', timezone.now().year)
-        month = request.query_params.get('month', timezone.now().month)
-        
-        year = int(year)
-        month = int(month)
-        
-        # 指定月のタスクを取得
-        tasks = Task.objects.filter(
-            owner=self.request.user,
-            created_at__year=year,
-            created_at__month=month
-        )
+        """月別タスク達成率・完了までの時間・期限内完了率（1クエリ）"""
+        year = int(request.query_params.get('year', timezone.now().year))
+        month = int(request.query_params.get('month', timezone.now().month))
         
-        total = tasks.count()
-        done = tasks.filter(status='done').count()
-        in_progress = tasks.filter(status='in_progress').count()
-        todo = tasks.filter(status='todo').count()
+        summary = stats.summarize(self.stats_columns(year, month), [month])
+        data = summary['data'][0]
         
         return Response({
             'year': year,
             'month': month,
-            'total': total,
-            'done': done,
-            'in_progress': in_progress,
-            'todo': todo,
-            'completion_rate': round((done / total * 100), 1) if total > 0 else 0
+            'total': data['total'],
+            'done': data['done'],
+            'in_progress': data['in_progress'],
+            'todo': data['todo'],
+            'completion_rate': data['completion_rate'],
+            'lead_time': summary['lead_time'],
+            'on_time': summary['on_time'],
         })
 
     @action(detail=False, methods=['get'], url_path='stats/yearly')
+    @cached_response('tasks')
     def yearly_stats(self, request):
-        """年別月ごとタスク達成率"""
-        year = request.query_params.get('year', timezone.now().year)
-        year = int(year)
+        """年別月ごとタスク達成率・完了までの時間・期限内完了率（1クエリ）"""
+        year = int(request.query_params.get('year', timezone.now().year))
         
-        monthly_data = []
-        for month in range(1, 13):
-            tasks = Task.objects.filter(
-                owner=self.request.user,
-                created_at__year=year,
-                created_at__month=month
-            )
-            total = tasks.count()
-            done = tasks.filter(status='done').count()
-            
-            monthly_data.append({
-                'month': month,
-                'total': total,
-                'done': done,
-                'completion_rate': round((done / total * 100), 1) if total > 0 else 0
-            })
+        summary = stats.summarize(self.stats_columns(year), list(range(1, 13)))
         
         return Response({
             'year': year,
-            'data': monthly_data
+            'data': summary['data'],
+            'lead_time': summary['lead_time'],
+            'on_time': summary['on_time'],
         })
 
+    def board_queryset(self):
+        # status で列を絞り、他の条件は一覧と同じ
+        return filters.filter_tasks(self.get_queryset(), self.request.query_params)
+
+    def column_data(self, status, tasks, next_cursor, count=None):
+        data = {
+            'status': status,
+            'label': dict(Task.STATUS_CHOICES)[status],
+            'tasks': self.get_serializer(tasks, many=True).data,
+            'next': None,
+        }
+        if count is not None:
+            data['count'] = count
+        if next_cursor:
+            url = replace_query_param(self.request.build_absolute_uri(), 'column', status)
+            data['next'] = replace_query_param(url, 'cursor', next_cursor)
+        return data
+
+    @action(detail=False, methods=['get'])
+    @conditional(lambda view, request: [view.board_queryset()])
+    def board(self, request):
+        """カンバン表示用。ステータスごとの件数と先頭 limit 件（1クエリ）
+
+        column（と next の cursor）を指定するとその列の続きだけを返す
+        """
+        limit = board.parse_limit(request.query_params.get('limit'))
+        queryset = self.board_queryset()
+
+        column = request.query_params.get('column')
+        if column:
+            if column not in filters.STATUSES:
+                raise ValidationError({'column': f'invalid value: {column}'})
+            tasks, next_cursor = board.load_column(queryset, column, limit, request.query_params.get('cursor'))
+            return Response(self.column_data(column, tasks, next_cursor))
+
+        columns = board.load_board(queryset, limit)
+        return Response({'columns': [
+            self.column_data(
+                status,
+                data['tasks'],
+                board.next_cursor(data['tasks'][-1]) if data['count'] > len(data['tasks']) else None,
+                data['count'],
+            )
+            for status, data in columns.items()
+        ]})
+
     @action(detail=False, methods=['get'], url_path='overdue')
     def overdue_tasks(self, request):
         """期限切れタスク"""
-        today = timezone.now().date()
+        # 一覧の overdue=true と同じく現地時間の今日を基準にする
+        today = timezone.localdate()
         overdue = Task.objects.filter(
             owner=self.request.user,
             due_date__lt=today,
-            status__in=['todo', 'in_progress']
+            status__in=filters.OPEN_STATUSES
         ).order_by('due_date')
         
         serializer = self.get_serializer(overdue, many=True)